@@ -25,11 +25,69 @@ import pickle
 import importlib
 import gc
 import difflib
+import io
+import multiprocessing
+import types
+import collections
 #from pygmo import *
 #from pygmo.util import *
 import psutil
 
 
+# (explorer, starting design tuple) the breadth workers explore from. Set right before the workers are
+# forked, so they inherit it (with the explorer's database) instead of receiving a copy per neighbour.
+_breadth_explorer = None
+
+
+# the (fast) C pickler, falling back to dill only for what it can not serialize, i.e., the lambdas in the
+# designs' stats (dill alone is several times slower than simulating the design). The objects in shared
+# (the designs the branch started from) are sent as references and resolved by _DesignUnpickler.
+class _DesignPickler(pickle.Pickler):
+    def __init__(self, file, shared):
+        super().__init__(file, -1)
+        self.shared = {id(obj): idx for idx, obj in enumerate(shared)}
+
+    def persistent_id(self, obj):
+        return self.shared.get(id(obj))
+
+    def reducer_override(self, obj):
+        if isinstance(obj, types.FunctionType) and obj.__name__ == "<lambda>":
+            return dill.loads, (dill.dumps(obj),)
+        return NotImplemented
+
+
+class _DesignUnpickler(pickle.Unpickler):
+    def __init__(self, file, shared):
+        super().__init__(file)
+        self.shared = shared
+
+    def persistent_load(self, idx):
+        return self.shared[idx]
+
+
+def _dumps_designs(obj, shared):
+    buffer = io.BytesIO()
+    _DesignPickler(buffer, shared).dump(obj)
+    return buffer.getvalue()
+
+
+def _loads_designs(data, shared):
+    return _DesignUnpickler(io.BytesIO(data), shared).load()
+
+
+# ------------------------------
+# Functionality:
+#       breadth worker entry point: explore one breadth branch given its move descriptor
+# ------------------------------
+def _explore_breadth_branch(move_descriptor):
+    explorer, des_tup = _breadth_explorer
+    try:
+        return _dumps_designs(explorer.explore_breadth_branch(des_tup, *move_descriptor), des_tup)
+    except SystemExit:
+        # the serial flow exits here. A worker that exits would never answer, so report it instead
+        raise RuntimeError("breadth branch " + str(move_descriptor[0]) + " failed to generate a neighbour")
+
+
 class Counters():
     def __init__(self):
         self.krnel_rnk_to_consider = 0
@@ -64,6 +122,83 @@ class Counters():
     #    self.found_any_improvement = self.found_any_improvement or improvement
 
 
+# ------------------------------
+# Functionality:
+#   bounded cache of the simulated designs, keyed by their SOC design code (see get_SOC_design_code), so that designs
+#   revisited during the exploration are not simulated again. The least recently used designs are evicted first,
+#   once the cache holds more than max_cnt designs or the system memory use passes memory_percentage.
+#   A hit returns a private copy of the simulated design (see copy_sim_dp), so the moves and times the exploration
+#   records on it do not change the cached design or the other hits of it.
+# Variables:
+#   max_cnt: maximum number of designs to keep (0 disables the cache)
+#   memory_percentage: system memory use (in percent) above which half of the cache is evicted
+# ------------------------------
+class DesignCache():
+    def __init__(self, max_cnt, memory_percentage):
+        self.max_cnt = max_cnt
+        self.memory_percentage = memory_percentage
+        self.designs = collections.OrderedDict()  # design code -> sim_dp
+        self.hit_cnt = 0
+        self.miss_cnt = 0
+        self.eviction_cnt = 0
+        self.record_added = False  # if True, the designs put in the cache are also collected in added
+        self.added = []  # (design code, sim_dp), used to merge the designs of a breadth worker back into the parent
+
+    def __contains__(self, design_code):
+        return design_code in self.designs
+
+    def __len__(self):
+        return len(self.designs)
+
+    # returns a copy of the sim_dp of the design, None if not cached
+    def get(self, design_code):
+        if design_code not in self.designs:
+            self.miss_cnt += 1
+            return None
+        self.hit_cnt += 1
+        self.designs.move_to_end(design_code)
+        return copy_sim_dp(self.designs[design_code])
+
+    def put(self, design_code, sim_dp):
+        if self.max_cnt <= 0:
+            return
+        self.designs[design_code] = sim_dp
+        self.designs.move_to_end(design_code)
+        if self.record_added:
+            self.added.append((design_code, sim_dp))
+        if psutil.virtual_memory().percent > self.memory_percentage:
+            self.evict(len(self.designs)//2)
+        self.evict(self.max_cnt)
+
+    # evict the least recently used designs until at most cnt are left
+    def evict(self, cnt):
+        while len(self.designs) > cnt:
+            self.designs.popitem(last=False)
+            self.eviction_cnt += 1
+
+    def clear(self):
+        self.designs.clear()
+
+    def get_stats(self):
+        return {"size": len(self.designs), "hits": self.hit_cnt, "misses": self.miss_cnt,
+                "evictions": self.eviction_cnt}
+
+
+# ------------------------------
+# Functionality:
+#   copy of a simulated design (SimDesignPointContainer) as a fresh simulation would return it: no move applied yet
+#   and no exploration time. The simulation results (design points and their stats) are read only, so they are
+#   shared; the stats container gets its own copy, as it refers back to the sim_dp.
+# ------------------------------
+def copy_sim_dp(sim_dp):
+    sim_dp_cp = copy.copy(sim_dp)
+    sim_dp_cp.dp_stats = copy.copy(sim_dp.dp_stats)
+    sim_dp_cp.dp_stats.sim_dp_container = sim_dp_cp
+    sim_dp_cp.move_applied = None
+    sim_dp_cp.exploration_and_simulation_approximate_time = 0
+    return sim_dp_cp
+
+
     # ------------------------------
 # This class is responsible for design space exploration using our proprietary hill-climbing algorithm.
 # Our Algorithm currently uses swap (improving the current design) and  duplicate (relaxing the contention on the
@@ -134,8 +269,11 @@ class HillClimbing:
 
         self.seen_SOC_design_codes = []  # config code of all the designs seen so far (this is mainly for debugging, concretely
                                      # simulation validation
+        self.seen_SOC_design_codes_set = set()  # same as above, for membership checks
 
-        self.cached_SOC_sim = {} # cache of designs simulated already. index is a unique code base on allocation and mapping
+        # cache of designs simulated already. index is a unique code base on allocation and mapping
+        self.cached_SOC_sim = DesignCache(config.cache_seen_designs_max_cnt if config.cache_seen_designs else 0,
+                                          config.cache_seen_designs_memory_percentage)
 
         self.move_s_krnel_selection = config.move_s_krnel_selection
         self.krnels_not_to_consider = []
@@ -241,7 +379,7 @@ class HillClimbing:
         #new_ex_dp = copy.deepcopy(ex_dp)
         t1 = time.time()
         gc.disable()
-        new_ex_dp = cPickle.loads(cPickle.dumps(ex_dp, -1))
+        new_ex_dp = snapshot(ex_dp)
         gc.enable()
         t2 = time.time()
         #new_sim_dp = copy.deepcopy(sim_dp)
@@ -1583,7 +1721,7 @@ class HillClimbing:
 
         blck_ref = move_to_apply.get_block_ref()
         gc.disable()
-        blck_ref_cp = cPickle.loads(cPickle.dumps(blck_ref, -1))
+        blck_ref_cp = snapshot(blck_ref)
         gc.enable()
         # ------------------------
         # prepare for the move
@@ -1773,10 +1911,8 @@ class HillClimbing:
         while(ctr < self.num_neighs_to_try):
             ex_dp, sim_dp = des_tup
             # Copy to avoid modifying the current designs.
-            new_ex_dp_1 = copy.deepcopy(ex_dp)
-            new_sim_dp_1 = copy.deepcopy(sim_dp)
-            new_ex_dp = copy.deepcopy(new_ex_dp_1)
-            new_sim_dp = copy.deepcopy(new_sim_dp_1)
+            new_ex_dp = snapshot(ex_dp)
+            new_sim_dp = copy.deepcopy(sim_dp)
 
             # apply the move
             yield self.dh.apply_move(new_ex_dp, new_sim_dp, all_possible_moves[ctr%len(all_possible_moves)], kernel_pos_to_hndl)
@@ -2452,7 +2588,7 @@ class HillClimbing:
     def generate_sample(self, ex_dp, hw_sampling):
         #new_ex_dp = copy.deepcopy(ex_dp)
         gc.disable()
-        new_ex_dp = cPickle.loads(cPickle.dumps(ex_dp, -1))
+        new_ex_dp = snapshot(ex_dp)
         gc.enable()
         new_ex_dp.sample_hardware_graph(hw_sampling)
         return new_ex_dp
@@ -2461,7 +2597,7 @@ class HillClimbing:
 
 
     def transform_to_most_inferior_design(self, ex_dp:ExDesignPoint):
-        new_ex_dp = cPickle.loads(cPickle.dumps(ex_dp, -1))
+        new_ex_dp = snapshot(ex_dp)
         move_to_try = move("swap", "swap", "irrelevant", "-1", "latency", "", "", "")
         all_blocks = new_ex_dp.get_blocks()
         for block in  all_blocks:
@@ -2493,7 +2629,7 @@ class HillClimbing:
         return new_ex_dp
 
     def transform_to_most_inferior_design_before_loop_unrolling(self, ex_dp: ExDesignPoint):
-        new_ex_dp = cPickle.loads(cPickle.dumps(ex_dp, -1))
+        new_ex_dp = snapshot(ex_dp)
         move_to_try = move("swap", "swap", "irrelevant", "-1", "latency", "", "", "")
         all_blocks = new_ex_dp.get_blocks()
         for block in all_blocks:
@@ -2669,14 +2805,12 @@ class HillClimbing:
         if move_to_try.get_transformation_name() == "identity" or not move_to_try.is_valid():
             # if nothing has changed, just copy the sim from before
             sim_dp = des_tup[1]
-        elif design_unique_code not in self.cached_SOC_sim.keys():
-            self.population_observed_ctr += 1
-            sim_dp = self.eval_design(ex_dp, self.database)  # evaluate the designs
-            #if config.cache_seen_designs: # this seems to be slower than just simulation, because of deepcopy
-            #    self.cached_SOC_sim[design_unique_code] = (ex_dp, sim_dp)
         else:
-            ex_dp = self.cached_SOC_sim[design_unique_code][0]
-            sim_dp = self.cached_SOC_sim[design_unique_code][1]
+            sim_dp = self.cached_SOC_sim.get(design_unique_code)
+            if sim_dp is None:
+                self.population_observed_ctr += 1
+                sim_dp = self.eval_design(ex_dp, self.database)  # evaluate the designs
+                self.cached_SOC_sim.put(design_unique_code, sim_dp)
 
         # collect the moves for debugging/visualization
         if config.DEBUG_MOVE:
@@ -2690,9 +2824,10 @@ class HillClimbing:
             vis_hardware.vis_hardware(sim_dp.get_dp_rep())
         if config.RUN_VERIFICATION_PER_GEN or \
                 (config.RUN_VERIFICATION_PER_NEW_CONFIG and
-                 not(sim_dp.dp.get_hardware_graph().get_SOC_design_code() in self.seen_SOC_design_codes)):
+                 not(sim_dp.dp.get_hardware_graph().get_SOC_design_code() in self.seen_SOC_design_codes_set)):
             self.gen_verification_data(sim_dp, ex_dp)
         self.seen_SOC_design_codes.append(sim_dp.dp.get_hardware_graph().get_SOC_design_code())
+        self.seen_SOC_design_codes_set.add(sim_dp.dp.get_hardware_graph().get_SOC_design_code())
 
 
         if not sim_dp.move_applied == None and config.print_info_regularly:
@@ -2784,6 +2919,103 @@ class HillClimbing:
             if config.DEBUG_SANITY: des_tup[0].sanity_check()
         #return des_tup_list
 
+    # ------------------------------
+    # Functionality:
+    #       generate and evaluate one breadth branch (a chain of up to depth_length neighbours starting
+    #       from des_tup). This is what a breadth worker runs (see gen_some_neighs_and_eval_parallel).
+    # Variables:
+    #       des_tup: starting point design point tuple (design point, simulated design point)
+    #       breadth: index of the branch
+    #       seed: seed of the branch's random choices
+    #       depth_length: the depth according to which to generate designs
+    # ------------------------------
+    def explore_breadth_branch(self, des_tup, breadth, seed, depth_length):
+        random.seed(seed)
+        np.random.seed(seed)
+        observed_ctr = self.population_observed_ctr
+        seen_ctr = len(self.seen_SOC_design_codes)
+        move_ctr = len(self.move_profile)
+        trail_ctr = len(self.des_trail_list)
+        start_move = des_tup[1].move_applied
+        cache_hit_cnt, cache_miss_cnt = self.cached_SOC_sim.hit_cnt, self.cached_SOC_sim.miss_cnt
+        self.cached_SOC_sim.record_added = True
+
+        self.SA_current_breadth = breadth
+        self.SA_current_depth = -1
+        des_tup_list = []
+        self.gen_some_neighs_and_eval(des_tup, 1, depth_length, des_tup_list)
+
+        # the bookkeeping the branch did, to be merged into the parent explorer. The starting design comes
+        # back as a reference, so the move an identity neighbour set on it is sent separately
+        branch_state = {"start_move_applied": None if des_tup[1].move_applied is start_move else des_tup[1].move_applied,
+                        "population_observed_ctr": self.population_observed_ctr - observed_ctr,
+                        "seen_SOC_design_codes": self.seen_SOC_design_codes[seen_ctr:],
+                        "move_profile": self.move_profile[move_ctr:],
+                        "des_trail_list": self.des_trail_list[trail_ctr:],
+                        "last_move": self.last_move,
+                        "last_des_trail": self.last_des_trail,
+                        "cached_designs": self.cached_SOC_sim.added,
+                        "cache_hit_cnt": self.cached_SOC_sim.hit_cnt - cache_hit_cnt,
+                        "cache_miss_cnt": self.cached_SOC_sim.miss_cnt - cache_miss_cnt}
+        return des_tup_list, branch_state
+
+    # ------------------------------
+    # Functionality:
+    #       parallel version of gen_some_neighs_and_eval. Every breadth branch is generated and simulated in
+    #       its own worker process. Workers are forked, so they inherit the explorer (and its warm database)
+    #       and only receive a compact move descriptor (breadth index, seed, depth) instead of a copy of the
+    #       design. Branches are merged back in breadth order, so the result does not depend on which
+    #       worker finishes first, and the seeds are derived from config.SA_parallel_seed (if set).
+    # Variables:
+    #       des_tup: starting point design point tuple (design point, simulated design point)
+    #       breadth: the breadth according to which to generate designs  (used for breadth wise search)
+    #       depth: the depth according to which to generate designs (used for look ahead)
+    # ------------------------------
+    def gen_some_neighs_and_eval_parallel(self, des_tup, breath_length, depth_length, des_tup_list):
+        global _breadth_explorer
+        if config.SA_parallel_seed is None:
+            base_seed = datetime.now().microsecond
+        else:
+            base_seed = config.SA_parallel_seed
+        move_descriptors = []
+        for breadth in range(0, breath_length):
+            seed = np.random.SeedSequence([base_seed, self.population_generation_cnt, breadth]).generate_state(1)[0]
+            move_descriptors.append((breadth, int(seed), depth_length))
+
+        process_cnt = min(config.SA_breadth_parallel_processes, breath_length)
+        _breadth_explorer = (self, des_tup)
+        try:
+            with multiprocessing.get_context("fork").Pool(process_cnt) as pool:
+                branches = pool.map(_explore_breadth_branch, move_descriptors)
+        finally:
+            _breadth_explorer = None
+
+        for breadth, branch in enumerate(branches):
+            branch_des_tup_list, branch_state = _loads_designs(branch, des_tup)
+            self.SA_current_breadth = breadth
+            if branch_state["start_move_applied"] is not None:
+                des_tup[1].set_move_applied(branch_state["start_move_applied"])
+            self.population_observed_ctr += branch_state["population_observed_ctr"]
+            self.seen_SOC_design_codes.extend(branch_state["seen_SOC_design_codes"])
+            self.seen_SOC_design_codes_set.update(branch_state["seen_SOC_design_codes"])
+            self.move_profile.extend(branch_state["move_profile"])
+            self.des_trail_list.extend(branch_state["des_trail_list"])
+            if branch_state["last_move"] is not None:
+                self.last_move = branch_state["last_move"]
+            if branch_state["last_des_trail"] is not None:
+                self.last_des_trail = branch_state["last_des_trail"]
+            # the designs the branch simulated, so that the next generations do not simulate them again
+            for design_code, sim_dp in branch_state["cached_designs"]:
+                self.cached_SOC_sim.put(design_code, sim_dp)
+            self.cached_SOC_sim.hit_cnt += branch_state["cache_hit_cnt"]
+            self.cached_SOC_sim.miss_cnt += branch_state["cache_miss_cnt"]
+            des_tup_list.extend(branch_des_tup_list)
+
+            # same as the serial version: once a branch starts with identity, the rest are not explored
+            if branch_des_tup_list[0][1].move_applied.get_transformation_name() == "identity":
+                break
+            if config.DEBUG_SANITY: des_tup[0].sanity_check()
+
     # simple simulated annealing
     def simple_SA(self):
         # define the result dictionary
@@ -2799,7 +3031,10 @@ class HillClimbing:
         # generate some neighbouring design points and evaluate them
         des_tup_list =[]
         #config.SA_depth = 3*len(self.so_far_best_ex_dp.get_hardware_graph().get_blocks_by_type("mem"))+ len(self.so_far_best_ex_dp.get_hardware_graph().get_blocks_by_type("ic"))
-        self.gen_some_neighs_and_eval((self.so_far_best_ex_dp, self.so_far_best_sim_dp), config.SA_breadth, config.SA_depth, des_tup_list)
+        if config.SA_breadth_parallel_processes > 1 and config.SA_breadth > 1:
+            self.gen_some_neighs_and_eval_parallel((self.so_far_best_ex_dp, self.so_far_best_sim_dp), config.SA_breadth, config.SA_depth, des_tup_list)
+        else:
+            self.gen_some_neighs_and_eval((self.so_far_best_ex_dp, self.so_far_best_sim_dp), config.SA_breadth, config.SA_depth, des_tup_list)
         exploration_and_simulation_approximate_time_per_iteration = (time.time() - strt)/max(len(des_tup_list), 1)
         #print("sim time + neighbour generation per design point " + str((time.time() - strt)/max(len(des_tup_list), 1)))
 
@@ -4,6 +4,7 @@
 
 from design_utils.design import  *
 from functools import reduce
+from collections import Counter
 
 
 # This class is the performance simulator of FARSI
@@ -12,11 +13,12 @@ class PerformanceSimulator:
         self.design = sim_design  # design to simulate
         self.scheduled_kernels = []   # kernels already scheduled
         self.driver_waiting_queue = []   # kernels whose trigger condition is met but can not run for various reasons
-        self.completed_kernels_for_memory_sizing = []   # kernels already completed
-        # List of all the kernels that are not scheduled yet (to be launched)
-        self.yet_to_schedule_kernels = self.design.get_kernels()[:]  # kernels to be scheduled
-        self.all_kernels = self.yet_to_schedule_kernels[:]
-        self.task_token_queue = []
+        self.completed_kernels_for_memory_sizing = Counter()   # kernels already completed (per iteration)
+        # all the kernels that are not scheduled yet (to be launched). A dict (insertion ordered) so that
+        # membership and removal do not scan
+        self.yet_to_schedule_kernels = dict.fromkeys(self.design.get_kernels())  # kernels to be scheduled
+        self.all_kernels = list(self.yet_to_schedule_kernels)
+        self.index_kernels()
         self.old_clock_time = self.clock_time = 0
         self.program_status = "idle"  # specifying the status of the program at the current tick
         self.phase_num = -1
@@ -37,11 +39,34 @@ class PerformanceSimulator:
             self.serial_latency += latency
 
 
+    # ------------------------------
+    # Functionality:
+    #   build the indices the scheduler works off, so that a phase only touches the kernels
+    #   that can change state instead of scanning all of them:
+    #       task_to_kernel: task -> kernel
+    #       task_token_queue: (parent task, child task) -> number of tokens, i.e., parent completions
+    #                         the child has not consumed yet
+    #       parents_missing: kernel -> number of its parents with no token for it
+    #       ready_kernels: kernels with a token from every parent (dependency wise free to launch)
+    #       throughput_kernels: kernels that can fire on a throughput trigger
+    # ------------------------------
+    def index_kernels(self):
+        self.kernel_order = {krnl: idx for idx, krnl in enumerate(self.all_kernels)}
+        self.task_to_kernel = {}
+        for krnl in self.all_kernels:
+            self.task_to_kernel.setdefault(krnl.get_task(), krnl)
+        task_graph = self.design.get_hardware_graph().get_task_graph()
+        self.kernel_parents = {krnl: task_graph.get_task_s_parents(krnl.get_task()) for krnl in self.all_kernels}
+        self.task_token_queue = Counter()
+        self.parents_missing = {krnl: len(set(parents)) for krnl, parents in self.kernel_parents.items()}
+        self.ready_kernels = {krnl for krnl, missing in self.parents_missing.items() if missing == 0}
+        self.throughput_kernels = [krnl for krnl in self.all_kernels if krnl.get_type() == "throughput_based"]
+
     def reset_perf_sim(self):
         self.scheduled_kernels = []
-        self.completed_kernels_for_memory_sizing = []
-        # List of all the kernels that are not scheduled yet (to be launched)
-        self.yet_to_schedule_kernels = self.design.get_kernels()[:]
+        self.completed_kernels_for_memory_sizing = Counter()
+        # all the kernels that are not scheduled yet (to be launched)
+        self.yet_to_schedule_kernels = dict.fromkeys(self.design.get_kernels())
         self.old_clock_time = self.clock_time = 0
         self.program_status = "idle"  # specifying the status of the program at the current tick
         self.phase_num = -1
@@ -67,9 +92,8 @@ class PerformanceSimulator:
     #   convert the task to kernel
     # ------------------------------
     def get_kernel_from_task(self, task):
-        for kernel in self.design.get_kernels()[:]:
-            if kernel.get_task() == task:
-                return kernel
+        if task in self.task_to_kernel:
+            return self.task_to_kernel[task]
         raise Exception("kernel associated with task with name" + task.name + " is not found")
 
     # ------------------------------
@@ -99,12 +123,32 @@ class PerformanceSimulator:
     """
 
     def kernel_s_parents_done(self, krnl):
-        kernel_s_task = krnl.get_task()
-        parents_s_task = self.design.get_hardware_graph().get_task_graph().get_task_s_parents(kernel_s_task)
-        for parent in parents_s_task:
-            if not (parent, kernel_s_task) in self.task_token_queue:
-                return False
-        return True
+        return self.parents_missing[krnl] == 0
+
+    # ------------------------------
+    # Functionality:
+    #   add/consume the token a parent task hands to a child task upon completion, keeping the
+    #   child kernel's count of missing parents (and thus the ready set) up to date
+    # ------------------------------
+    def add_token(self, parent_task, child_task):
+        edge = (parent_task, child_task)
+        self.task_token_queue[edge] += 1
+        child_kernel = self.task_to_kernel.get(child_task)
+        if self.task_token_queue[edge] == 1 and child_kernel is not None:
+            self.parents_missing[child_kernel] -= 1
+            if self.parents_missing[child_kernel] == 0:
+                self.ready_kernels.add(child_kernel)
+
+    def consume_token(self, parent_task, child_task):
+        edge = (parent_task, child_task)
+        if self.task_token_queue[edge] <= 0:
+            raise ValueError("no token from task " + parent_task.name + " to task " + child_task.name)
+        self.task_token_queue[edge] -= 1
+        if self.task_token_queue[edge] == 0:
+            del self.task_token_queue[edge]
+            child_kernel = self.task_to_kernel[child_task]
+            self.parents_missing[child_kernel] += 1
+            self.ready_kernels.discard(child_kernel)
 
 
     # launch: Every iteration, we launch the kernel, i.e,
@@ -122,9 +166,8 @@ class PerformanceSimulator:
 
     def remove_parents_from_token_queue(self, krnl):
         kernel_s_task = krnl.get_task()
-        parents_s_task = self.design.get_hardware_graph().get_task_graph().get_task_s_parents(kernel_s_task)
-        for parent in parents_s_task:
-            self.task_token_queue.remove((parent, kernel_s_task))
+        for parent in self.kernel_parents[krnl]:
+            self.consume_token(parent, kernel_s_task)
 
     def krnl_done_iterating(self, krnl):
         if krnl.iteration_ctr == -1 or krnl.iteration_ctr > 0:
@@ -162,17 +205,19 @@ class PerformanceSimulator:
     # ------------------------------
     # Functionality:
     #   Finds the kernels that are free to be scheduled (their parents are completed)
+    #   Only the kernels whose parents all handed over a token and the throughput based ones can
+    #   change state, so only those are visited (in the kernels' original order)
     # ------------------------------
     def schedule_kernels_token_based(self):
-        for krnl in self.all_kernels:
+        candidates = sorted(self.ready_kernels.union(self.throughput_kernels), key=self.kernel_order.__getitem__)
+        for krnl in candidates:
             if self.kernel_ready_to_be_launched(krnl):
                 # launch: Every iteration, we launch the kernel, i.e,
                 # we set the operating state appropriately, and size the hardware accordingly
-                self.kernel_s_parents_done(krnl)
                 self.remove_parents_from_token_queue(krnl)
                 self.scheduled_kernels.append(krnl)
                 if krnl in self.yet_to_schedule_kernels:
-                    self.yet_to_schedule_kernels.remove(krnl)
+                    del self.yet_to_schedule_kernels[krnl]
 
                 # initialize #insts, tick, and kernel progress status
                 krnl.launch(self.clock_time)
@@ -206,7 +251,7 @@ class PerformanceSimulator:
 
         for kernel in kernels_to_schedule:
             self.scheduled_kernels.append(kernel)
-            self.yet_to_schedule_kernels.remove(kernel)
+            del self.yet_to_schedule_kernels[kernel]
             # initialize #insts, tick, and kernel progress status
             kernel.launch(self.clock_time)
             # update memory size -> allocate memory regions on different mem blocks
@@ -256,10 +301,10 @@ class PerformanceSimulator:
         for kernel in scheduled_kernels:
             if kernel.status == "completed":
                 self.scheduled_kernels.remove(kernel)
-                self.completed_kernels_for_memory_sizing.append(kernel)
+                self.completed_kernels_for_memory_sizing[kernel] += 1
                 kernel.set_stats()
                 for child_task in kernel.get_task().get_children():
-                    self.task_token_queue.append((kernel.get_task(), child_task))
+                    self.add_token(kernel.get_task(), child_task)
                 # iterate though parents and check if for each parent, all the children are completed.
                 # if so, retract the memory
                 all_parent_kernels = [self.get_kernel_from_task(parent_task) for parent_task in
@@ -268,10 +313,10 @@ class PerformanceSimulator:
                     all_children_kernels = [self.get_kernel_from_task(child_task) for child_task in
                                            parent_kernel.get_task().get_children()]
 
-                    if all([child_kernel in self.completed_kernels_for_memory_sizing for child_kernel in all_children_kernels]):
+                    if all([self.completed_kernels_for_memory_sizing[child_kernel] > 0 for child_kernel in all_children_kernels]):
                         parent_kernel.update_mem_size(-1)
                         for child_kernel in all_children_kernels:
-                            self.completed_kernels_for_memory_sizing.remove(child_kernel)
+                            self.completed_kernels_for_memory_sizing[child_kernel] -= 1
 
             elif kernel.type == "throughput_based" and kernel.throughput_work_achieved():
                 #del kernel.data_work_left_to_meet_throughput[kernel.operating_state][0]
@@ -307,8 +352,8 @@ class PerformanceSimulator:
 
     def next_throughput_trigger_time(self):
         throughput_achieved_time_list = []
-        for krnl in self.all_kernels:
-            if krnl.get_type() == "throughput_based" and krnl.status == "in_progress" \
+        for krnl in self.throughput_kernels:
+            if krnl.status == "in_progress" \
                     and not krnl.get_task().is_task_dummy() and not krnl.operating_state == "execute":
                 throughput_achieved_time_list.extend(krnl.firing_time_to_meet_throughput[krnl.operating_state])
 
@@ -317,10 +362,7 @@ class PerformanceSimulator:
         return throughput_achieved_time_list_filtered
 
     def any_throughput_based_kernel(self):
-        for krnl in self.all_kernels:
-            if krnl.get_type()  == "throughput_based":
-                return True
-        return False
+        return len(self.throughput_kernels) > 0
 
     # ------------------------------
     # Functionality:
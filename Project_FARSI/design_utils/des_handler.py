@@ -15,7 +15,6 @@ from error_handling.custom_error import  *
 import importlib
 from DSE_utils.exhaustive_DSE import *
 from visualization_utils.vis_hardware import *
-import _pickle as cPickle
 
 # This class allows us to modify the design. Each design is applied
 # a move to get transformed to another.
@@ -1666,10 +1665,6 @@ class DesignHandler:
         ex_dp, sim_dp = des_tup
         blck_ref = move_to_apply.get_block_ref()
         #print("applying move  " +  move.name + " -----" )
-        #pre_moved_ex = copy.deepcopy(ex_dp)  # this is just for move sanity checking
-        gc.disable()
-        pre_moved_ex = cPickle.loads(cPickle.dumps(ex_dp, -1))
-        gc.enable()
 
         if move_to_apply.get_transformation_name() == "identity":
             return ex_dp, True
@@ -9,6 +9,8 @@ from design_utils.components.scheduling import *
 from design_utils.components.krnel import *
 from design_utils.common_design_utils import  *
 import collections
+import copyreg
+import io
 import datetime
 from datetime import datetime
 from error_handling.custom_error import  *
@@ -25,6 +27,44 @@ else:
     raise NameError("Simulation method unavailable")
 
 
+# ------------------------------
+# Design snapshots
+# ------------------------------
+# objects that are only read during exploration. A snapshot references them instead of copying them.
+# Note that every block of a design points to the database input (the full library of blocks/tasks/mappings), so
+# copying it used to be about half of the work of copying a design.
+snapshot_shared_types = [database_input.database_input_class]
+_snapshot_shared_objs = {}
+
+
+def _snapshot_shared_obj(obj_id):
+    return _snapshot_shared_objs[obj_id]
+
+
+def _snapshot_share(obj):
+    _snapshot_shared_objs[id(obj)] = obj
+    return _snapshot_shared_obj, (id(obj),)
+
+
+# ------------------------------
+# Functionality:
+#   copy a design (or any part of it, e.g. a block) for modification. Same as cPickle.loads(cPickle.dumps(obj, -1))
+#   (a structural deep copy), except that the objects in snapshot_shared_types are shared with the original.
+# Variables:
+#   obj: object to copy
+# ------------------------------
+def snapshot(obj):
+    buffer = io.BytesIO()
+    pickler = cPickle.Pickler(buffer, -1)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table.update({type_: _snapshot_share for type_ in snapshot_shared_types})
+    try:
+        pickler.dump(obj)
+        return cPickle.loads(buffer.getbuffer())
+    finally:
+        _snapshot_shared_objs.clear()
+
+
 # This class logs the insanity (opposite of sanity (check), so the flaw) with the design
 class Insanity:
     def __init__(self, task, block, name):
@@ -2194,8 +2234,17 @@ class SimDesignPoint(ExDesignPoint):
         elif mem_subtype == "sram":
             return "itrs-lop"
 
-    # run cacti to get results
-    def run_and_collect_cacti_data(self, blk, database):
+    # the CACTI configuration of a memory block: (cacti mem type, cacti cell type, memory size)
+    def get_cacti_mem_config(self, blk):
+        mem_bytes = max(blk.get_area_in_bytes(), config.cacti_min_memory_size_in_bytes) # to make sure we don't go smaller than cacti's minimum size
+        mem_bytes = (math.ceil(mem_bytes/config.min_mem_size[blk.subtype]))*config.min_mem_size[blk.subtype] # modulo calculation
+        #subtype = "sram"  # TODO: change later to sram/dram
+        mem_subtype = self.FARSI_to_cacti_mem_type_converter(blk.subtype)
+        cell_type = self.FARSI_to_cacti_cell_type_converter(blk.subtype)
+        return mem_subtype, cell_type, mem_bytes
+
+    # convert (and scale to the technology node) CACTI results, and log them
+    def log_cacti_data(self, cacti_area_energy_results, mem_subtype, mem_bytes, database):
         tech_node = {}
         tech_node["energy"] = 1
         tech_node["area"] = 1
@@ -2205,18 +2254,29 @@ class SimDesignPoint(ExDesignPoint):
             if "tech_node_SF" in misc_knobs.keys():
                 tech_node = misc_knobs["tech_node_SF"]
 
+        read_energy_per_byte = float(cacti_area_energy_results['Dynamic read energy (nJ)']) * (10 ** -9) / 16
+        write_energy_per_byte = float(cacti_area_energy_results['Dynamic write energy (nJ)']) * (10 ** -9) / 16
+        area = float(cacti_area_energy_results['Area (mm2)']) * (10 ** -6)
+
+        read_energy_per_byte *= tech_node["energy"]["non_gpp"]
+        write_energy_per_byte *= tech_node["energy"]["non_gpp"]
+        area *= tech_node["area"]["mem"]
+
+        # log values
+        self.cacti_hndlr.cacti_data_container.insert(list(zip(config.cacti_input_col_order +
+                                                              config.cacti_output_col_order,
+                                                              [mem_subtype, mem_bytes, read_energy_per_byte, write_energy_per_byte, area])))
+
+        return read_energy_per_byte, write_energy_per_byte, area
+
+    # run cacti to get results
+    def run_and_collect_cacti_data(self, blk, database):
         if not blk.type == "mem":
             print("Only memory blocks supported in CACTI")
             exit(0)
 
         # prime cacti
-        mem_bytes = max(blk.get_area_in_bytes(), config.cacti_min_memory_size_in_bytes)
-        subtype = blk.subtype
-        mem_bytes = (math.ceil(mem_bytes/config.min_mem_size[subtype]))*config.min_mem_size[subtype] # modulo calculation
-
-        #subtype = "sram"  # TODO: change later to sram/dram
-        mem_subtype = self.FARSI_to_cacti_mem_type_converter(subtype)
-        cell_type = self.FARSI_to_cacti_cell_type_converter(subtype)
+        mem_subtype, cell_type, mem_bytes = self.get_cacti_mem_config(blk)
         self.cacti_hndlr.set_cur_mem_type(mem_subtype)
         self.cacti_hndlr.set_cur_mem_size(mem_bytes)
         self.cacti_hndlr.set_cur_cell_type(cell_type)
@@ -2229,20 +2289,39 @@ class SimDesignPoint(ExDesignPoint):
             print(self.cacti_hndlr.get_config())
             raise e
 
-        read_energy_per_byte = float(cacti_area_energy_results['Dynamic read energy (nJ)']) * (10 ** -9) / 16
-        write_energy_per_byte = float(cacti_area_energy_results['Dynamic write energy (nJ)']) * (10 ** -9) / 16
-        area = float(cacti_area_energy_results['Area (mm2)']) * (10 ** -6)
+        return self.log_cacti_data(cacti_area_energy_results, mem_subtype, mem_bytes, database)
 
-        read_energy_per_byte *= tech_node["energy"]["non_gpp"]
-        write_energy_per_byte *= tech_node["energy"]["non_gpp"]
-        area *= tech_node["area"]["mem"]
+    # look up the cached data (from CACTI) of a memory configuration. If allowed (config.cacti_interpolate), unseen
+    # memory sizes are interpolated from the closest smaller/larger ones
+    def find_cacti_data(self, mem_subtype, mem_bytes):
+        KVs = list(zip(config.cacti_input_col_order,[mem_subtype, mem_bytes]))
+        results = self.cacti_hndlr.cacti_data_container.find(KVs)
+        if not results[0] and config.cacti_interpolate:
+            results = self.cacti_hndlr.cacti_data_container.interpolate(KVs)
+        return results
 
-        # log values
-        self.cacti_hndlr.cacti_data_container.insert(list(zip(config.cacti_input_col_order +
-                                                              config.cacti_output_col_order,
-                                                              [mem_subtype, mem_bytes, read_energy_per_byte, write_energy_per_byte, area])))
+    # run CACTI (in parallel) for all the memories of the design that are not cached yet, so that
+    # the (serial) per kernel/block updates bellow only look up the results.
+    def prefetch_cacti_data(self, database):
+        mem_configs = {}
+        for blk in self.get_blocks():
+            if not blk.type == "mem":
+                continue
+            mem_subtype, cell_type, mem_bytes = self.get_cacti_mem_config(blk)
+            if (mem_subtype, mem_bytes) not in mem_configs and not self.find_cacti_data(mem_subtype, mem_bytes)[0]:
+                mem_configs[(mem_subtype, mem_bytes)] = (mem_bytes, mem_subtype, cell_type)
+        if not mem_configs:
+            return
 
-        return read_energy_per_byte, write_energy_per_byte, area
+        mem_configs = list(mem_configs.values())
+        try:
+            all_results = self.cacti_hndlr.collect_cati_data_batch(mem_configs, config.cacti_worker_cnt)
+        except Exception as e:
+            print("Using cacti, one of the following memory configs tried and failed")
+            print(mem_configs)
+            raise e
+        for (mem_bytes, mem_subtype, cell_type), cacti_area_energy_results in zip(mem_configs, all_results):
+            self.log_cacti_data(cacti_area_energy_results, mem_subtype, mem_bytes, database)
 
     # either run or look into the cached data (from CACTI) to get energy/area data
     def collect_cacti_data(self, blk, database):
@@ -2250,12 +2329,9 @@ class SimDesignPoint(ExDesignPoint):
         if blk.type == "ic" :
             return 0,0,0,1
         elif blk.type == "mem":
-            mem_bytes = max(blk.get_area_in_bytes(), config.cacti_min_memory_size_in_bytes) # to make sure we don't go smaller than cacti's minimum size
-            mem_subtype = self.FARSI_to_cacti_mem_type_converter(blk.subtype)
-            mem_bytes = (math.ceil(mem_bytes / config.min_mem_size[blk.subtype])) * config.min_mem_size[blk.subtype]  # modulo calculation
+            mem_subtype, cell_type, mem_bytes = self.get_cacti_mem_config(blk)
             #mem_subtype = "ram" #choose from ["main memory", "ram"]
-            found_results, read_energy_per_byte, write_energy_per_byte, area = \
-                self.cacti_hndlr.cacti_data_container.find(list(zip(config.cacti_input_col_order,[mem_subtype, mem_bytes])))
+            found_results, read_energy_per_byte, write_energy_per_byte, area = self.find_cacti_data(mem_subtype, mem_bytes)
             if not found_results:
                 read_energy_per_byte, write_energy_per_byte, area = self.run_and_collect_cacti_data(blk, database)
                 #read_energy_per_byte *= tech_node["energy"]
@@ -2330,6 +2406,9 @@ class SimDesignPoint(ExDesignPoint):
         # bellow dictionaries used for debugging purposes. You can delete them later
         krnl_ratio_phase = {}  # for debugging delete later
 
+        # run CACTI for the memories not seen so far
+        self.prefetch_cacti_data(database)
+
         # update in 3 stages
         # (1) fix kernel energy first
         for krnl in self.__kernels:
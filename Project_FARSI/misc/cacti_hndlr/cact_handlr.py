@@ -7,11 +7,67 @@ import csv
 import pandas as pd
 import math
 import numpy as np
-import time
-import shutil
 import subprocess
+import sqlite3
+import tempfile
+import threading
+import bisect
+from concurrent.futures import ThreadPoolExecutor
 #from settings import config
 
+cacti_result_kwords = ["Dynamic read energy (nJ)", "Dynamic write energy (nJ)", "Area (mm2)"]
+
+
+# ------------------------------
+# Functionality:
+#   run CACTI for one memory configuration and parse the results. Every call uses its own config/output file and
+#   does not change the working directory, so calls can run concurrently.
+# Variables:
+#   bin_addr: CACTI binary
+#   param_file: base CACTI config, the memory configuration is appended to (a copy of) it
+#   mem_size, mem_type, cell_type: memory configuration
+#   kwords: the output columns to return
+# ------------------------------
+def run_cacti(bin_addr, param_file, mem_size, mem_type, cell_type, kwords):
+    fd, input_cfg = tempfile.mkstemp(prefix=os.path.basename(param_file) + "_", dir=os.path.dirname(param_file))
+    output_cfg = input_cfg + ".out"
+    try:
+        with os.fdopen(fd, "w") as file1:
+            with open(param_file, "r") as base_file:
+                file1.write(base_file.read())
+            file1.write("-size (bytes) " + str(mem_size) + "\n")
+            file1.write("-cache type \"" + mem_type + "\"" + "\n")
+            file1.write("-Data array cell type - \"" + cell_type + "\"" + "\n")
+
+        # cacti looks up its technology files relative to its own directory. It also tends to crash on exit, after
+        # the results are written, so the output file (and not the return code) tells whether it succeeded
+        subprocess.run([bin_addr, "-infile", input_cfg], cwd=os.path.dirname(bin_addr),
+                       stdout=subprocess.DEVNULL)
+        if not os.path.isfile(output_cfg):
+            raise RuntimeError("cacti did not produce any results for " + input_cfg)
+        return parse_cacti_output(output_cfg, kwords)
+    finally:
+        for file_addr in [input_cfg, output_cfg]:
+            if os.path.exists(file_addr):
+                os.remove(file_addr)
+
+
+def parse_cacti_output(output_cfg, kwords):
+    results_dict = {}
+    with open(output_cfg) as f:
+        dict_list = list(csv.DictReader(f))
+
+    for kw in kwords:
+        results_dict[kw] = []
+
+    for dict_ in dict_list:
+        for kw in results_dict.keys():
+            for key in dict_.keys():
+                if key == " " + kw:
+                    results_dict[kw] = dict_[key]
+    return results_dict
+
+
 # This class at the moment only handls very specific cases,
 # concretely, we can provide the size of memory and get the power/area results back.
 class CactiHndlr():
@@ -19,14 +75,16 @@ class CactiHndlr():
         self.bin_addr = bin_addr
         self.param_file = param_file
         self.cur_mem_size = 0
-        self.input_cfg = ""
-        self.output_cfg = ""
         self.cur_mem_type = ""
         self.cur_cell_type = ""
         self.input_col_order = input_col_order
         self.cacti_data_log_file = cacti_data_log_file
         self.output_col_order = output_col_order
-        self.cacti_data_container = CactiDataContainer(cacti_data_log_file, input_col_order, output_col_order)
+
+    # the results database is shared by all the handlers (of the process) logging to the same file
+    @property
+    def cacti_data_container(self):
+        return get_cacti_data_container(self.cacti_data_log_file, self.input_col_order, self.output_col_order)
 
     def set_cur_cell_type(self, cell_type):
         self.cur_cell_type = cell_type
@@ -37,149 +95,209 @@ class CactiHndlr():
     def set_cur_mem_type(self, cur_mem_type):
         self.cur_mem_type = cur_mem_type
 
-    def set_params(self):
-        param_file_copy_name= "/".join(self.param_file.split("/")[:-1]) + "/" + self.param_file.split("/")[-1] +"_cp"
-        #os.system("cp " + self.param_file + " "  + param_file_copy_name)
-        shutil.copy(self.param_file, param_file_copy_name)
-        time.sleep(.05)
-        file1 = open(param_file_copy_name, "a")  # append mode
-        size_cmd = "-size (bytes) " + str(self.cur_mem_size)
-        cur_mem_type_cmd = "-cache type \"" + self.cur_mem_type + "\""
-        cell_type_cmd = "-Data array cell type - \"" + self.cur_cell_type+ "\""
-        file1.write(size_cmd + "\n")
-        file1.write(cur_mem_type_cmd + "\n")
-        file1.write(cell_type_cmd + "\n")
-        file1.close()
-
-        self.input_cfg = param_file_copy_name
-        self.output_cfg = self.input_cfg +".out"
-
     def get_config(self):
         return {"mem_size":self.cur_mem_size, "mem_type":self.cur_mem_type, "cell_type:":self.cur_cell_type}
 
-    def run_bin(self):
-        bin_dir = "/".join(self.bin_addr.split("/")[:-1])
-        os.chdir(bin_dir)
-        #cmd = self.bin_addr + " " + "-infile " + self.input_cfg
-        subprocess.call([self.bin_addr, "-infile", self.input_cfg])
-        #os.system(cmd)
-
-    def run_cacti(self):
-        self.set_params()
-        self.run_bin()
-
-    def reset_cfgs(self):
-        self.input_cfg = ""
-        self.output_cfg = ""
-
-    def parse_and_find(self, kwords):
-        results_dict = {}
-        ctr =0
-        while not os.path.isfile(self.output_cfg) and ctr < 60:
-            time.sleep(1)
-            ctr +=1
-
-        f = open(self.output_cfg)
-        reader = csv.DictReader(f)
-        dict_list = []
-        for line in reader:
-            dict_list.append(line)
-
-        for kw in kwords:
-            results_dict [kw] = []
-
-        for dict_ in dict_list:
-            for kw in results_dict.keys():
-                for key in dict_.keys():
-                    if key == " " +kw:
-                        results_dict[kw] = dict_[key]
-
-        f.close()
-        return results_dict
-
     def collect_cati_data(self):
-        self.run_cacti()
-        results = self.parse_and_find(["Dynamic read energy (nJ)", "Dynamic write energy (nJ)", "Area (mm2)"])
-        os.system("rm " + self.output_cfg)
-        return results
-
-
-
+        return run_cacti(self.bin_addr, self.param_file, self.cur_mem_size, self.cur_mem_type, self.cur_cell_type,
+                         cacti_result_kwords)
+
+    # ------------------------------
+    # Functionality:
+    #   run CACTI for a batch of memory configurations, in parallel.
+    # Variables:
+    #   mem_configs: list of (mem_size, mem_type, cell_type)
+    #   worker_cnt: number of CACTI processes to run at the same time
+    # ------------------------------
+    def collect_cati_data_batch(self, mem_configs, worker_cnt):
+        def run(mem_config):
+            mem_size, mem_type, cell_type = mem_config
+            return run_cacti(self.bin_addr, self.param_file, math.ceil(mem_size), mem_type, cell_type,
+                             cacti_result_kwords)
+
+        if worker_cnt <= 1 or len(mem_configs) <= 1:
+            return [run(mem_config) for mem_config in mem_configs]
+        with ThreadPoolExecutor(max_workers=min(worker_cnt, len(mem_configs))) as pool:
+            return list(pool.map(run, mem_configs))
+
+
+_cacti_data_containers = {}
+_cacti_data_containers_lock = threading.Lock()
+
+
+# a forked child (e.g., a worker of the parallel exploration) must not use the sqlite connection of its parent, nor
+# the locks, which another thread of the parent may hold at the time of the fork. The containers are keyed by pid,
+# so the child opens its own, and the lock guarding them is replaced
+def _reset_after_fork():
+    global _cacti_data_containers_lock
+    _cacti_data_containers_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_cacti_data_container(cached_data_file_addr, input_col_order, output_col_order):
+    key = (os.getpid(), os.path.abspath(cached_data_file_addr), tuple(input_col_order), tuple(output_col_order))
+    with _cacti_data_containers_lock:
+        if key not in _cacti_data_containers:
+            _cacti_data_containers[key] = CactiDataContainer(cached_data_file_addr, input_col_order, output_col_order)
+        return _cacti_data_containers[key]
+
+
+# ------------------------------
+# CACTI results, i.e., (input columns, e.g., memory subtype and size) -> (output columns, e.g., energy and area).
+# The results are stored in an SQLite database next to cached_data_file_addr and indexed in memory. New results are
+# still appended to the csv log at cached_data_file_addr, which is imported when the database is created. Several
+# processes (e.g., parallel explorations) can share the database, each with its own container (see
+# get_cacti_data_container). Lookups that miss the index check the database for results the other processes added.
+# ------------------------------
 class CactiDataContainer():
     def __init__(self, cached_data_file_addr, input_col_order, output_col_order):
         self.cached_data_file_addr = cached_data_file_addr
-        self.input_col_order = input_col_order
-        self.output_col_order = output_col_order
-        self.prase_cached_data()
-
-    def prase_cached_data(self):
-        # create the file if doesn't exist
+        self.db_file_addr = os.path.splitext(cached_data_file_addr)[0] + ".sqlite"
+        self.input_col_order = list(input_col_order)
+        self.output_col_order = list(output_col_order)
+        self.lock = threading.Lock()
+        self.results = {}  # input values -> output values
+        self.sorted_last_inputs = {}  # all but the last input value -> sorted last input values (e.g., mem sizes)
+        self.open_db()
+
+    def open_db(self):
+        cols = self.input_col_order + self.output_col_order
+        self.select_all_cmd = "SELECT " + ", ".join(_quote(col) for col in cols) + " FROM cacti_results"
+        self.select_cmd = self.select_all_cmd + " WHERE " + \
+                          " AND ".join(_quote(col) + " = ?" for col in self.input_col_order)
+        self.insert_cmd = "INSERT OR IGNORE INTO cacti_results (" + ", ".join(_quote(col) for col in cols) + \
+                          ") VALUES (" + ", ".join("?" for col in cols) + ")"
+
+        db_exists = os.path.exists(self.db_file_addr)
+        self.conn = sqlite3.connect(self.db_file_addr, timeout=60, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cacti_results (" +
+                          ", ".join(_quote(col) for col in cols) +
+                          ", PRIMARY KEY (" + ", ".join(_quote(col) for col in self.input_col_order) + "))")
+        if not db_exists:
+            self.import_csv_log()
+        self.conn.commit()
+        for row in self.conn.execute(self.select_all_cmd):
+            self.add_to_index(row)
+
+    # results logged (as csv) by the older versions
+    def import_csv_log(self):
         if not os.path.exists(self.cached_data_file_addr):
-            file = open(self.cached_data_file_addr, "w")
-            for col_val in (self.input_col_order + self.output_col_order)[:-1]:
-                file.write(str(col_val)+ ",")
-            file.write(str((self.input_col_order + self.output_col_order)[-1])+"\n")
-            file.close()
-
-        # populate the pand data frames with it
+            return
         try:
-            self.df = pd.read_csv(self.cached_data_file_addr)
-        except Exception as e:
-            if e.__class__.__name__ in "pandas.errors.EmptyDataError":
-                self.df = pd.DataFrame(columns=self.input_col_order + self.output_col_order)
-                #self.df =
+            df = pd.read_csv(self.cached_data_file_addr)
+        except pd.errors.EmptyDataError:
+            return
+        cols = self.input_col_order + self.output_col_order
+        if not set(cols).issubset(df.columns):
+            return
+        rows = [self.normalize_row(row) for row in df[cols].itertuples(index=False, name=None)]
+        self.conn.executemany(self.insert_cmd, rows)
+
+    # inputs as keys (see _normalize), outputs as python values
+    def normalize_row(self, row):
+        input_cnt = len(self.input_col_order)
+        return _normalize(row[:input_cnt]) + tuple(_to_python(value) for value in row[input_cnt:])
+
+    def add_to_index(self, row):
+        row = self.normalize_row(row)
+        key = row[:len(self.input_col_order)]
+        if key in self.results:
+            return
+        self.results[key] = row[len(self.input_col_order):]
+        bisect.insort(self.sorted_last_inputs.setdefault(key[:-1], []), key[-1])
 
     def find(self, KVs):
-        df_ = self.df
-        for k,v in KVs:
-            df_temp = self.find_one_kv(df_, (k,v))
-            if isinstance(df_temp, bool)  and df_temp == False:  # if can't be found
-                return False, "_", "_", "_"
-            elif df_temp.empty:
-                return False, "_", "_", "_"
-            df_ =  df_temp
-
-        if len(df_.index) > 1:  # number of rows >1 means more than one equal value
-            print("can not have duplicated values ")
-            exit(0)
-
-        output = [True] + [df_.iloc[0][col_name] for col_name in self.output_col_order]
+        key = self.get_key(KVs)
+        with self.lock:
+            if key not in self.results:
+                # might have been added by another process
+                row = self.conn.execute(self.select_cmd, key).fetchone()
+                if row is None:
+                    return [False] + ["_"]*len(self.output_col_order)
+                self.add_to_index(row)
+            return [True] + list(self.results[key])
+
+    # ------------------------------
+    # Functionality:
+    #   estimate the results of an unseen configuration by interpolating (linearly, on a log-log scale) the results
+    #   of the closest smaller and larger configurations that only differ in the last input column (e.g., the memory
+    #   size). Returns not found unless the configuration lies between two stored ones.
+    # ------------------------------
+    def interpolate(self, KVs):
+        key = self.get_key(KVs)
+        not_found = [False] + ["_"]*len(self.output_col_order)
+        if not isinstance(key[-1], (int, float)):
+            return not_found
+        with self.lock:
+            if key in self.results:
+                return [True] + list(self.results[key])
+            last_inputs = self.sorted_last_inputs.get(key[:-1], [])
+            idx = bisect.bisect_left(last_inputs, key[-1])
+            if idx == 0 or idx == len(last_inputs):
+                return not_found
+            lower, upper = last_inputs[idx - 1], last_inputs[idx]
+            lower_results = self.results[key[:-1] + (lower,)]
+            upper_results = self.results[key[:-1] + (upper,)]
+
+        if lower <= 0:
+            return not_found
+        ratio = math.log(key[-1]/lower)/math.log(upper/lower)
+        output = [True]
+        for lower_val, upper_val in zip(lower_results, upper_results):
+            if lower_val > 0 and upper_val > 0:
+                output.append(math.exp(math.log(lower_val) + ratio*(math.log(upper_val) - math.log(lower_val))))
+            else:
+                output.append(lower_val + ratio*(upper_val - lower_val))
         return output
 
-    def find_one_kv(self, df, kv):
-        if df.empty:
-            return False
-
-        k = kv[0]
-        v = kv[1]
-        result = df.loc[(df[k] == v)]
-        return result
+    def get_key(self, KVs):
+        KVs = dict(KVs)
+        return _normalize([KVs[col] for col in self.input_col_order])
 
     def insert(self, key_values_):
-        # if data exists, return
-        if not self.df.empty:
-            if self.find(key_values_)[0]:
+        KVs = dict(key_values_)
+        row = self.normalize_row([KVs[col] for col in self.input_col_order + self.output_col_order])
+        with self.lock:
+            if row[:len(self.input_col_order)] in self.results:
                 return
-
-        # append the output file
-        # make the output file if doesn't exist
-        if not os.path.exists(self.cached_data_file_addr):
-            file = open(self.cached_data_file_addr, "w")
-            for col_val in self.df.columns[:-1]:
-                file.write(self.df.columns + ",")
-            file.write(self.df.columns[-1]+  "\n")
-            file.close()
-
-        values_ = [kv[1] for kv in key_values_]
-        # add it to the pandas
-        df2 = pd.DataFrame([values_], columns=self.input_col_order + self.output_col_order)
-        self.df = self.df.append(df2, ignore_index=True)
-
-        # append results to the file
-        with open(self.cached_data_file_addr, "a") as output:
-            for key, value in key_values_[:-1]:
-                output.write(str(value) +",")
-            output.write(str(values_[-1]) + "\n")
+            self.conn.execute(self.insert_cmd, row)
+            self.conn.commit()
+            self.add_to_index(row)
+            self.append_csv_log([KVs[col] for col in self.input_col_order + self.output_col_order])
+
+    # keep the csv log of the older versions up to date, for the tools reading it
+    def append_csv_log(self, values):
+        write_header = not os.path.exists(self.cached_data_file_addr) or \
+                       os.path.getsize(self.cached_data_file_addr) == 0
+        with open(self.cached_data_file_addr, "a", newline="") as output:
+            writer = csv.writer(output)
+            if write_header:
+                writer.writerow(self.input_col_order + self.output_col_order)
+            writer.writerow(values)
+
+
+def _quote(col):
+    return "\"" + col.replace("\"", "\"\"") + "\""
+
+
+# numpy/pandas scalars to python values, integral floats (e.g., memory sizes) to ints, so that keys compare equal
+def _normalize(values):
+    normalized = []
+    for value in values:
+        value = _to_python(value)
+        if isinstance(value, float) and value.is_integer() and abs(value) < 2**63:
+            value = int(value)
+        normalized.append(value)
+    return tuple(normalized)
+
+
+def _to_python(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
 
 
 # just a test case
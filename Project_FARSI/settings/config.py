@@ -65,6 +65,8 @@ sel_next_dp = "all_metrics"  # how to select the next desigh, ["all_metrics", "o
 neigh_sel_algorithm = "annealing"
 SA_breadth = 1 # breath of the neighbour search
 SA_depth = 15 # depth of the neighbour search
+SA_breadth_parallel_processes = 1  # number of processes evaluating the SA_breadth neighbours concurrently (1: one after another)
+SA_parallel_seed = None  # seed of the neighbours evaluated in parallel (None: seeded from the clock)
 annealing_max_temp = 500
 annealing_temp_dec = 50
 annealing_dampening_coef = 10  # how much to dampen the metric that has  met the design objectives
@@ -199,8 +201,10 @@ DEBUG_MOVE =  True and not NO_VIS # if true, we print/collect relevant info abou
 regulate_move_tracking = (FARSI_memory_consumption == "low") # if true, we don't track and hence graph every move. This helps preventing memory pressure (and avoid getting killed by the OS)
 #vis_move_trail_ctr_threshold = 20 # how often sample the moves (only applies if regulat_move_tracking enabled)
 
-cache_seen_designs = False and not(FARSI_memory_consumption == "low") # if True, we cache the designs that we have seen. This way we wont simulate them unnecessarily.
-                          # This should be set to false if memory is an issue
+cache_seen_designs = False # if True, we cache the designs that we have seen. This way we wont simulate them unnecessarily.
+                          # The cache is bounded by the following two knobs
+cache_seen_designs_max_cnt = 32 if FARSI_memory_consumption == "low" else 512  # designs in the cache. Least recently used designs are evicted first
+cache_seen_designs_memory_percentage = 80  # if the system memory usage (percentage) goes above this, half of the cache is evicted
 
 VIS_MOVE_TRAIL = DEBUG_MOVE and not NO_VIS and False
 eval_mode ="statistical"  # not statistical evaluation ["singular, statistical]. Note that singular is deprecated now
@@ -287,6 +291,8 @@ cacti_data_log_file = CC.cacti_data_log_file
 cacti_input_col_order = ["mem_subtype", "mem_size"]
 cacti_output_col_order = ["read_energy_per_byte", "write_energy_per_byte", "area"]
 cacti_min_memory_size_in_bytes = 2048 # bellow this value cacti errors out. We can play with burst size and page size to fix this though
+cacti_worker_cnt = 4 # number of CACTI runs (for the memories of a design not seen so far) to launch in parallel
+cacti_interpolate = False # if True, the results of unseen memory sizes are interpolated from the closest stored sizes (of the same memory type) instead of running CACTI
 
 #ACC_coeff = 128  # comparing to what we have parsed, how much to modify. This is just for some exploration purposes
 	       # It should almost always set to 1
@@ -9,6 +9,11 @@ import csv
 import random
 
 from envHelpers import helpers
+from eval_cache import make_eval_cache, fingerprint_files
+from workspace import make_workspace
+from async_step import run_subprocess
+from astrasim_constraints import ConstraintSet
+from step_profiler import make_profiler
 
 settings_file_path = os.path.realpath(__file__)
 settings_dir_path = os.path.dirname(settings_file_path)
@@ -26,7 +31,7 @@ VERSION = 1
 
 # astra-sim environment
 class AstraSimEnv(gym.Env):
-    def __init__(self, rl_form="sa1", max_steps=5, num_agents=1, reward_formulation="None", reward_scaling=1,):
+    def __init__(self, rl_form="sa1", max_steps=5, num_agents=1, reward_formulation="None", reward_scaling=1, eval_cache=None, workspace=None, profiler=None):
         self.rl_form = rl_form
         self.helpers = helpers()
         self.system_knobs, self.network_knobs, self.workload_knobs = self.helpers.parse_knobs_astrasim(knobs_spec)
@@ -55,6 +60,8 @@ class AstraSimEnv(gym.Env):
         self.num_agents = num_agents
         self.reward_formulation = reward_formulation
         self.reward_scaling = reward_scaling
+        self.eval_cache = make_eval_cache(eval_cache)
+        self.profiler = make_profiler(profiler, prefix="astrasim_")
 
         # goal of the agent is to find the average
         self.goal = 0
@@ -68,6 +75,15 @@ class AstraSimEnv(gym.Env):
         self.exe_path = os.path.join(sim_path, "run_general.sh")
         self.network_config = os.path.join(sim_path, "general_network.json")
         self.system_config = os.path.join(sim_path, "general_system.txt")
+        self.results_folder = os.path.join(sim_path, "results", "run_general")
+
+        # With a workspace, the generated configs and the results folder are
+        # private to this env so that several envs can run at once
+        self.workspace = make_workspace(workspace, prefix="astrasim_")
+        if self.workspace is not None:
+            self.network_config = self.workspace.path("general_network.json")
+            self.system_config = self.workspace.path("general_system.txt")
+            self.results_folder = self.workspace.makedirs("results", "run_general")
 
         # V1 networks, systems, and workloads folder
         self.networks_folder = os.path.join(sim_path, "astrasim-archgym/dse/archgen_v1_knobs/templates/network")
@@ -87,8 +103,9 @@ class AstraSimEnv(gym.Env):
 
         self.reset()
 
-        """TODO: constraints"""
-        _, _, _, self.constraints = self.helpers.actual_parse_knobs_astrasim(parameter_knobs)
+        # compiled once, checked before anything is written or launched
+        _, _, _, constraints = self.helpers.actual_parse_knobs_astrasim(parameter_knobs)
+        self.constraints = ConstraintSet(constraints)
         print("CONSTRAINTS: ", self.constraints)
         
 
@@ -98,7 +115,7 @@ class AstraSimEnv(gym.Env):
 
         self.counter = 0
         # get results folder path
-        results_folder_path = os.path.join(sim_path, "results", "run_general")
+        results_folder_path = self.results_folder
 
         # # find wildcard csv and m files
         csv_files = [f for f in os.listdir(results_folder_path) if f.endswith('.csv')]
@@ -143,7 +160,9 @@ class AstraSimEnv(gym.Env):
         return [seed]
 
     def close(self):
-        pass
+        self.profiler.close()
+        if self.workspace is not None:
+            self.workspace.close()
 
     # reward only looks at first value of fw, ig, and wg compute
     def calculate_reward(self, observations):
@@ -156,46 +175,41 @@ class AstraSimEnv(gym.Env):
         return 1 / (sum ** 0.5)
 
 
-    # give it one action: one set of parameters from json file
-    def step(self, action_dict):
-
-        if not isinstance(action_dict, dict):
-            with open(settings_dir_path + "/AstraSimRL_2.csv", 'a') as f:
-                writer = csv.writer(f)
-                writer.writerow(action_dict)
-
-            print("STEP: action_dict is a list")
-            action_dict_decoded = {}
-            action_dict_decoded['network'] = {"path": self.network_file}
-            action_dict_decoded['workload'] = {"path": self.workload_file}
-            
-            # parse system: initial values
-            self.helpers.parse_system_astrasim(self.system_file, action_dict_decoded, VERSION)
-            self.helpers.parse_network_astrasim(self.network_file, action_dict_decoded, VERSION)
-
-            # returning an 
-            action_decoded = self.helpers.action_decoder_ga_astraSim(action_dict)
-
-            # change all variables decoded into action_dict
-            for sect in action_decoded:
-                for key in action_decoded[sect]:
-                    action_dict_decoded[sect][key] = action_decoded[sect][key]
-
-            action_dict = action_dict_decoded
-
-        if "path" in action_dict["network"]:
-            self.network_config = action_dict["network"]["path"]
-
-        if "path" in action_dict["system"]:
-            self.system_config = action_dict["system"]["path"]
-
-        if "path" in action_dict["workload"]:
-            self.workload_config = action_dict["workload"]["path"]
-
-        print("ACTION DICT")
-        print(action_dict)
-        # load knobs
-
+    def run_simulation(self, action_dict):
+        """
+        Writes the system and network configs for action_dict, runs
+        run_general.sh and returns the parsed result csv files as
+        (backend_dim_info, backend_end_to_end, detailed, end_to_end,
+        sample_all_reduce_dimension_utilization)
+        """
+        with self.profiler.phase("render"):
+            self.write_configs(action_dict)
+        cmd, sim_env = self.sim_command()
+        with self.profiler.phase("simulate"):
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       env=sim_env)
+
+            # get the output
+            out, err = process.communicate()
+        with self.profiler.phase("parse"):
+            return self.collect_results(out.decode())
+
+    async def run_simulation_async(self, action_dict):
+        """
+        Same as run_simulation, but awaits run_general.sh instead of blocking
+        """
+        with self.profiler.phase("render"):
+            self.write_configs(action_dict)
+        cmd, sim_env = self.sim_command()
+        with self.profiler.phase("simulate"):
+            _, outstream, _ = await run_subprocess(cmd, env=sim_env)
+        with self.profiler.phase("parse"):
+            return self.collect_results(outstream)
+
+    def write_configs(self, action_dict):
+        """
+        Writes the system and network configs for action_dict
+        """
         if VERSION == 1:
             with open(self.system_config, 'w') as file:
                 for key, value in action_dict["system"].items(): 
@@ -245,123 +259,186 @@ class AstraSimEnv(gym.Env):
                 file.write('}')
             # WRITE NETWORK FILE TO YAML FILE
 
-        # the action is actually the parsed parameter files
-        print("Step: " + str(self.counter))
-        self.counter += 1
+    def sim_command(self):
+        """
+        Returns the run_general.sh command line and its environment
+        """
+        # point run_general.sh at the workspace configs and results folder
+        sim_env = None
+        if self.workspace is not None:
+            sim_env = dict(os.environ,
+                           ASTRASIM_NETWORK=self.network_config,
+                           ASTRASIM_SYSTEM=self.system_config,
+                           ASTRASIM_STATS=self.results_folder)
 
         # start subrpocess to run the simulation
         # $1: network, $2: system, $3: workload
         print("Running simulation...")
         print(self.exe_path, self.network_config, self.system_config, self.workload_config)
-        process = subprocess.Popen([self.exe_path, 
-                                    self.network_file, 
-                                    self.system_config, 
-                                    self.workload_file],
-                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-        # get the output
-        out, err = process.communicate()
-        outstream = out.decode()
+        cmd = [self.exe_path, 
+               self.network_file, 
+               self.system_config, 
+               self.workload_file]
+        return cmd, sim_env
+
+    def collect_results(self, outstream):
+        """
+        Parses the result csv files of the last run
+        """
         print("------------------------------------------------------------------")
         print(outstream)
         print("------------------------------------------------------------------")
 
         # backend_dim_info.csv
-        backend_dim_info = self.parse_result(sim_path + 
-            '/results/run_general/backend_dim_info.csv')
+        backend_dim_info = self.parse_result(self.results_folder + 
+            '/backend_dim_info.csv')
         # backend_end_to_end.csv
-        backend_end_to_end = self.parse_result(sim_path + 
-            '/results/run_general/backend_end_to_end.csv')
+        backend_end_to_end = self.parse_result(self.results_folder + 
+            '/backend_end_to_end.csv')
         # detailed.csv
-        detailed = self.parse_result(sim_path +
-            '/results/run_general/detailed.csv')
+        detailed = self.parse_result(self.results_folder +
+            '/detailed.csv')
         # EndToEnd.csv
-        end_to_end = self.parse_result(sim_path +
-            '/results/run_general/EndToEnd.csv')
+        end_to_end = self.parse_result(self.results_folder +
+            '/EndToEnd.csv')
         # sample_all_reduce_dimension_utilization.csv
-        sample_all_reduce_dimension_utilization = self.parse_result(sim_path +
-            '/results/run_general/sample_all_reduce_dimension_utilization.csv')
+        sample_all_reduce_dimension_utilization = self.parse_result(self.results_folder +
+            '/sample_all_reduce_dimension_utilization.csv')
+
+        return (backend_dim_info, backend_end_to_end, detailed, end_to_end,
+                sample_all_reduce_dimension_utilization)
+
+    def sim_version(self):
+        """
+        Hash of the AstraSim binary and launch script used to key cached evaluations.
+        The network and system files are not part of it: their values are in the
+        action, and without a workspace a step rewrites the network file
+        """
+        binary = os.path.join(astrasim_archgym, "astra-sim/build/astra_analytical/build/AnalyticalAstra/bin/AnalyticalAstra")
+        return fingerprint_files(binary, self.exe_path)
+
+    def feasible_population(self, X, dimension, defaults=None):
+        """
+        Boolean mask of the GA encoded candidates (rows of X) that satisfy
+        the constraints, so optimizers can skip or resample the others
+        """
+        system_knob, network_knob, workload_knob = self.helpers.parse_knobs_astrasim(knobs_spec)
+        return self.constraints.encoded_population_mask(X, system_knob, network_knob, workload_knob,
+                                                        dimension, defaults=defaults)
 
+    def infeasible_result(self, violated):
+        """
+        Step result of an action that violates the constraints; the
+        simulator is not run
+        """
+        for constraint in violated:
+            print("constraint not satisfied:", constraint)
+        self.check_done()
+        reward = float("-inf")
+        return [], reward, self.done, self.profiler.end_step({"useful_counter": self.useful_counter}), self.state
+
+    def check_done(self):
         if (self.counter == self.max_steps):
             self.done = True
             print("Maximum steps reached")
             self.reset()
 
+    # give it one action: one set of parameters from json file
+    def step(self, action_dict):
+        action_dict = self.decode_action(action_dict)
+
+        violated = self.constraints.violated(action_dict)
+        if violated:
+            return self.infeasible_result(violated)
+
+        if self.eval_cache is not None:
+            results = self.eval_cache.evaluate("AstraSim", action_dict,
+                                               lambda: self.run_simulation(action_dict),
+                                               version=self.sim_version(),
+                                               workload=self.workload_file)
+        else:
+            results = self.run_simulation(action_dict)
+
+        return self.step_result(action_dict, results)
+
+    async def astep(self, action_dict):
         """
-        TODO: add constraints
+        Same as step, but awaits the simulation so that other simulations
+        can run meanwhile (see async_step.AsyncEnvPool)
         """
+        action_dict = self.decode_action(action_dict)
 
-        operators = {"<=", ">=", "==", "<", ">"}
-        command = {"product", "mult", "num"}
-        for constraint in self.constraints:
-            constraint_args = constraint.split(" ")
-            
-            left_val, right_val = None, None
-            cur_val = None
-            operator = ""
-
-            # parse the arguments of a single constraint
-            i = 0
-            while i < len(constraint_args):
-                arg = constraint_args[i]
-
-                if arg in operators:
-                    left_val = cur_val
-                    cur_val = None
-                    operator = arg
-
-                elif arg in command:
-                    if arg == "product":
-                        # product network npus-count <= num network num-npus
-                        knob_dict, knob_name = constraint_args[i+1], constraint_args[i+2]
-                        i += 2
-
-                        if knob_dict in action_dict and knob_name in action_dict[knob_dict]:
-                            knob_arr = np.array(action_dict[knob_dict][knob_name])
-                            cur_val = np.prod(knob_arr)
-                        else:
-                            print(f"___ERROR: constraint knob name {knob_name} not found____")
-                            continue
-
-                    elif arg == "mult":
-                        # mult workload data-parallel-degree workload model-parallel-degree == network num-npus
-                        left_knob_dict, left_knob_name = constraint_args[i+1], constraint_args[i+2]
-                        right_knob_dict, right_knob_name = constraint_args[i+3], constraint_args[i+4]
-                        i += 4
-
-                        if (left_knob_dict in action_dict and 
-                            left_knob_name in action_dict[left_knob_dict] and
-                            right_knob_dict in action_dict and 
-                            right_knob_name in action_dict[right_knob_dict]):
-                            
-                            cur_val = (action_dict[left_knob_dict][left_knob_name] * 
-                                       action_dict[right_knob_dict][right_knob_name])
-                        else:
-                            print(f"___ERROR: constraint knob name {knob_name} not found____")
-                            continue
-
-                    elif arg == "num":
-                        # num network npus-count <= num network num-npus
-                        knob_dict, knob_name = constraint_args[i+1], constraint_args[i+2]
-                        i += 2
-                        if knob_dict in action_dict and knob_name in action_dict[knob_dict]:
-                            cur_val = action_dict[knob_dict][knob_name]
-                        else:
-                            print(f"___ERROR: constraint knob name {knob_name} not found____")
-                            continue
-                i += 1
-            
-            # evaluate the constraint
-            right_val = cur_val
-            evaluable = str(left_val) + " " + str(operator) + " " + str(right_val)
-            if eval(evaluable):
-                print("constraint satisfied")
-                continue
-            else:
-                print("constraint not satisfied")
-                reward = float("-inf")
-                return [], reward, self.done, {"useful_counter": self.useful_counter}, self.state
+        violated = self.constraints.violated(action_dict)
+        if violated:
+            return self.infeasible_result(violated)
+
+        if self.eval_cache is not None:
+            results = await self.eval_cache.evaluate_async("AstraSim", action_dict,
+                                                           lambda: self.run_simulation_async(action_dict),
+                                                           version=self.sim_version(),
+                                                           workload=self.workload_file)
+        else:
+            results = await self.run_simulation_async(action_dict)
+
+        return self.step_result(action_dict, results)
+
+    def decode_action(self, action_dict):
+        """
+        Turns a GA/RL action list into an action dict and counts the step
+        """
+        self.profiler.begin_step()
+        if not isinstance(action_dict, dict):
+            with open(settings_dir_path + "/AstraSimRL_2.csv", 'a') as f:
+                writer = csv.writer(f)
+                writer.writerow(action_dict)
+
+            print("STEP: action_dict is a list")
+            action_dict_decoded = {}
+            action_dict_decoded['network'] = {"path": self.network_file}
+            action_dict_decoded['workload'] = {"path": self.workload_file}
             
+            # parse system: initial values
+            self.helpers.parse_system_astrasim(self.system_file, action_dict_decoded, VERSION)
+            self.helpers.parse_network_astrasim(self.network_file, action_dict_decoded, VERSION)
+
+            # returning an 
+            action_decoded = self.helpers.action_decoder_ga_astraSim(action_dict)
+
+            # change all variables decoded into action_dict
+            for sect in action_decoded:
+                for key in action_decoded[sect]:
+                    action_dict_decoded[sect][key] = action_decoded[sect][key]
+
+            action_dict = action_dict_decoded
+
+        # configs stay in the workspace when there is one
+        if "path" in action_dict["network"] and self.workspace is None:
+            self.network_config = action_dict["network"]["path"]
+
+        if "path" in action_dict["system"] and self.workspace is None:
+            self.system_config = action_dict["system"]["path"]
+
+        if "path" in action_dict["workload"]:
+            self.workload_config = action_dict["workload"]["path"]
+
+        print("ACTION DICT")
+        print(action_dict)
+        # load knobs
+
+        # the action is actually the parsed parameter files
+        print("Step: " + str(self.counter))
+        self.counter += 1
+        return action_dict
+
+    def step_result(self, action_dict, results):
+        """
+        Computes the reward from the parsed results (the constraints were
+        checked before the simulation)
+        """
+        (backend_dim_info, backend_end_to_end, detailed, end_to_end,
+         sample_all_reduce_dimension_utilization) = results
+
+        self.check_done()
 
         # HARDCODED EXAMPLE: test if product of npu count <= number of npus
         # if np.prod(action_dict["network"]["npus-count"]) > action_dict["network"]["num-npus"]:
@@ -377,7 +454,7 @@ class AstraSimEnv(gym.Env):
             # set reward to be extremely negative
             reward = float("-inf")
             print("reward: ", reward)
-            return [], reward, self.done, {"useful_counter": self.useful_counter}, self.state
+            return [], reward, self.done, self.profiler.end_step({"useful_counter": self.useful_counter}), self.state
         else:
             observations = [
                 float(backend_end_to_end["CommsTime"][0])
@@ -396,7 +473,7 @@ class AstraSimEnv(gym.Env):
             observations = np.reshape(observations, self.observation_space.shape)
             self.useful_counter += 1
 
-            return observations, reward, self.done, {"useful_counter": self.useful_counter}, self.state
+            return observations, reward, self.done, self.profiler.end_step({"useful_counter": self.useful_counter}), self.state
 
 
 if __name__ == "__main__":
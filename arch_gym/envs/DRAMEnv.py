@@ -20,11 +20,18 @@ import gym
 from gym.utils           import seeding
 from envHelpers          import helpers
 from loggers             import write_csv
+from eval_cache          import make_eval_cache, fingerprint_files
+from workspace           import make_workspace
+from async_step          import run_subprocess
+from step_profiler       import make_profiler
 
 class DRAMEnv(gym.Env):
     def __init__(self,
                 reward_formulation = "power",
-                cost_model = "simulator"):
+                cost_model = "simulator",
+                eval_cache = None,
+                workspace = None,
+                profiler = None):
         # Todo: Change the values if we normalize the observation space
         self.observation_space = gym.spaces.Box(low=0, high=1e10, shape=(1,3))
         self.action_space = gym.spaces.Box(low=0, high=8, shape=(10,))
@@ -33,8 +40,23 @@ class DRAMEnv(gym.Env):
         self.sim_config = DRAMSys_config.sim_config
         self.experiment_name = DRAMSys_config.experiment_name
         self.logdir = DRAMSys_config.logdir
+        self.mem_ctrl_file = DRAMSys_config.dram_mem_controller_config_file
+
+        # With a workspace, DRAMSys runs on a private copy of the resources
+        # folder so that several envs can share one checkout
+        self.workspace = make_workspace(workspace, prefix="dramsys_")
+        self.resources_dir = None
+        if self.workspace is not None:
+            self.resources_dir = self.workspace.mirror(DRAMSys_config.dram_resources_dir, "resources")
+            self.mem_ctrl_file = self.workspace.writable(
+                os.path.join(self.resources_dir, "configs", "mcconfigs", os.path.basename(self.mem_ctrl_file)))
 
         self.cost_model = cost_model
+        if self.cost_model == "proxy_model":
+            # loaded once and reused by every step
+            self.proxy_model = DRAMSysProxyModel().load()
+        self.eval_cache = make_eval_cache(eval_cache)
+        self.profiler = make_profiler(profiler, prefix="dramsys_")
 
         self.reward_formulation = reward_formulation
         self.max_steps = 100
@@ -107,18 +129,45 @@ class DRAMEnv(gym.Env):
         '''
         Method to launch the DRAM executables given an action
         '''
+        cmd, cwd = self.sim_command()
+        with self.profiler.phase("simulate"):
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd)
+
+            out, err = process.communicate()
+        with self.profiler.phase("parse"):
+            return self.parse_sim_output(out.decode(), err.decode())
+
+    async def runDRAMEnv_async(self):
+        '''
+        Same as runDRAMEnv, but awaits the DRAMSys process instead of blocking
+        '''
+        cmd, cwd = self.sim_command()
+        with self.profiler.phase("simulate"):
+            _, out, err = await run_subprocess(cmd, cwd=cwd)
+        with self.profiler.phase("parse"):
+            return self.parse_sim_output(out, err)
+
+    def sim_command(self):
+        '''
+        Returns the DRAMSys command line and the directory to run it in
+        '''
         exe_path = self.exe_path
         exe_name = self.binary_name
         config_name = self.sim_config
         exe_final = os.path.join(exe_path,exe_name)
 
-        process = subprocess.Popen([exe_final, config_name],stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        cmd = [exe_final, config_name]
+        cwd = None
+        if self.workspace is not None:
+            cmd.append(self.resources_dir + os.sep)
+            cwd = self.workspace.dir
+        return cmd, cwd
 
-        out, err = process.communicate()
-        if err.decode() == "":
-            outstream = out.decode()
+    def parse_sim_output(self, out, err):
+        if err == "":
+            outstream = out
         else:
-            print(err.decode())
+            print(err)
             sys.exit()
         
         obs = self.get_observation(outstream)
@@ -126,6 +175,40 @@ class DRAMEnv(gym.Env):
         
         return obs
 
+    def simulate(self, action_dict):
+        '''
+        Writes the configs for the action and runs DRAMSys on them
+        '''
+        obs = None
+        with self.profiler.phase("render"):
+            status = self.actionToConfigs(action_dict)
+
+        if(status):
+            obs = self.runDRAMEnv()
+        else:
+            print("Error in writing configs")
+        return obs
+
+    async def simulate_async(self, action_dict):
+        '''
+        Same as simulate, but awaits DRAMSys instead of blocking
+        '''
+        obs = None
+        with self.profiler.phase("render"):
+            status = self.actionToConfigs(action_dict)
+
+        if(status):
+            obs = await self.runDRAMEnv_async()
+        else:
+            print("Error in writing configs")
+        return obs
+
+    def sim_version(self):
+        '''
+        Hash of the DRAMSys binary and simulation config used to key cached evaluations
+        '''
+        return fingerprint_files(os.path.join(self.exe_path, self.binary_name), self.sim_config)
+
     def step(self, action_dict):
         '''
         Step method takes action as input and outputs observation
@@ -133,20 +216,50 @@ class DRAMEnv(gym.Env):
         '''
         print("Action Dict",action_dict)
         self.steps += 1
-        done = False
+        self.profiler.begin_step()
 
         if self.cost_model == "simulator":
-            status = self.actionToConfigs(action_dict)
+            if self.eval_cache is not None:
+                obs = self.eval_cache.evaluate("DRAMSys", action_dict,
+                                               lambda: self.simulate(action_dict),
+                                               version=self.sim_version(),
+                                               workload=os.path.basename(self.sim_config))
+            else:
+                obs = self.simulate(action_dict)
+        elif self.cost_model == "proxy_model":
+            with self.profiler.phase("predict"):
+                obs = self.proxy_model.predict(action_dict).reshape(1,3)
+
+        return self.step_result(obs)
+
+    async def astep(self, action_dict):
+        '''
+        Same as step, but awaits the DRAMSys process so that other
+        simulations can run meanwhile (see async_step.AsyncEnvPool)
+        '''
+        print("Action Dict",action_dict)
+        self.steps += 1
+        self.profiler.begin_step()
 
-            if(status):
-                obs = self.runDRAMEnv()
+        if self.cost_model == "simulator":
+            if self.eval_cache is not None:
+                obs = await self.eval_cache.evaluate_async("DRAMSys", action_dict,
+                                                           lambda: self.simulate_async(action_dict),
+                                                           version=self.sim_version(),
+                                                           workload=os.path.basename(self.sim_config))
             else:
-                print("Error in writing configs")
+                obs = await self.simulate_async(action_dict)
         elif self.cost_model == "proxy_model":
+            with self.profiler.phase("predict"):
+                obs = self.proxy_model.predict(action_dict).reshape(1,3)
 
-            proxy_model = DRAMSysProxyModel()
-            obs = proxy_model.run_proxy_model(action_dict)
-        
+        return self.step_result(obs)
+
+    def step_result(self, obs):
+        '''
+        Computes reward and episode bookkeeping for the observation of a step
+        '''
+        done = False
         reward = self.calculate_reward(obs[0][1], obs[0][2])
         
         if(self.steps == 100):
@@ -156,13 +269,31 @@ class DRAMEnv(gym.Env):
             self.episode +=1
         
         print("Episode:", self.episode, " Rewards:", reward)
-        return obs, reward, done, {}
+        return obs, reward, done, self.profiler.end_step({})
+
+    def evaluate_population(self, actions):
+        '''
+        Evaluates a whole population of action dicts (or a DataFrame, see
+        helpers.action_decoder_ga_batch) with one vectorized proxy model
+        prediction. Returns observations of shape (N, 3) and rewards of shape (N,)
+        '''
+        if self.cost_model != "proxy_model":
+            raise ValueError("evaluate_population requires cost_model='proxy_model'")
+
+        obs = self.proxy_model.predict(actions)
+        rewards = self.calculate_reward(obs[:, 1], obs[:, 2])
+        return obs, rewards
 
     def reset(self):
         #print("Reseting Environment!")
         self.steps = 0
         return self.observation_space.sample()
 
+    def close(self):
+        self.profiler.close()
+        if self.workspace is not None:
+            self.workspace.close()
+
     def actionToConfigs(self,action):
 
         '''
@@ -171,11 +302,11 @@ class DRAMEnv(gym.Env):
         write_ok = False
 
         if(type(action) == dict):
-            write_ok = self.helpers.read_modify_write_dramsys(action)
+            write_ok = self.helpers.read_modify_write_dramsys(action, self.mem_ctrl_file)
         else:
             
             action_decoded = self.helpers.action_decoder_rl(action)
-            write_ok = self.helpers.read_modify_write_dramsys(action_decoded)
+            write_ok = self.helpers.read_modify_write_dramsys(action_decoded, self.mem_ctrl_file)
         return write_ok
     
 
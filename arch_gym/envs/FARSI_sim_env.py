@@ -40,6 +40,7 @@ from gym.utils import seeding
 from envHelpers import helpers
 
 from loggers import write_csv
+from eval_cache import make_eval_cache, fingerprint_files
 import numpy as np
 
 # ToDo: Have a configuration for Arch-Gym to manipulate this methods
@@ -55,7 +56,8 @@ import random
 
 class DRAMEnv(gym.Env):
     def __init__(self,
-                reward_formulation = "power"):
+                reward_formulation = "power",
+                eval_cache = None):
         # Todo: Change the values if we normalize the observation space
         self.observation_space = gym.spaces.Box(low=0, high=1e10, shape=(1,3))
         self.action_space = gym.spaces.Box(low=0, high=8, shape=(10,))
@@ -66,6 +68,7 @@ class DRAMEnv(gym.Env):
         self.logdir = arch_gym_configs.logdir
 
         self.reward_formulation = reward_formulation
+        self.eval_cache = make_eval_cache(eval_cache)
         self.max_steps = 100
         self.steps = 0
         self.max_episode_len = 10
@@ -173,7 +176,13 @@ class DRAMEnv(gym.Env):
         new_des = apply_move(move_)
 
         if(status):
-            obs = self.runDRAMEnv()  # this run the simulation
+            if self.eval_cache is not None:
+                obs = self.eval_cache.evaluate("DRAMSys", action_dict, self.runDRAMEnv,
+                                               version=fingerprint_files(os.path.join(self.exe_path, self.binary_name),
+                                                                         self.sim_config),
+                                               workload=os.path.basename(self.sim_config))
+            else:
+                obs = self.runDRAMEnv()  # this run the simulation
             sim = eval(new_des)
         else:
             print("Error in writing configs")
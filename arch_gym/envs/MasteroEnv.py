@@ -15,6 +15,11 @@ from gym.utils import seeding
 from envHelpers import helpers
 
 from loggers import write_csv
+from eval_cache import make_eval_cache, fingerprint_files
+from workspace import make_workspace
+from async_step import run_subprocess
+from step_profiler import make_profiler
+from maestro_engine import MaestroEngine
 import numpy as np
 
 # ToDo: Have a configuration for Arch-Gym to manipulate this methods
@@ -47,6 +52,11 @@ class MasteroEnv(gym.Env):
                  l1_size: int = 1073741824,
                  l2_size: int = 1073741824,
                  num_pe: int = 1024,
+                 eval_cache = None,
+                 workspace = None,
+                 profiler = None,
+                 network: bool = False,
+                 num_workers: int = None,
                  ):
         self._executable = Gamma_config.mastero_exe_file
         self.mapping_file = mapping_file
@@ -64,8 +74,27 @@ class MasteroEnv(gym.Env):
         self.layer_id = layer_id
         self.reward_type = reward_formulation
         self.helpers = helpers() 
-
-        self.dimension, _ = self.helpers.get_dimensions(workload=self.workload, layer_id=self.layer_id)
+        self.eval_cache = make_eval_cache(eval_cache)
+        self.profiler = make_profiler(profiler, prefix="maestro_")
+
+        # With a workspace, the .m mapping and .csv result files are written
+        # to (and cleaned from) a private directory instead of the cwd
+        self.workspace = make_workspace(workspace, prefix="maestro_")
+
+        # With network, every step maps the action to all the layers of the
+        # workload and evaluates them concurrently with a MaestroEngine
+        self.network = network
+        if self.network:
+            self.layers = self.helpers.get_network_dimensions(self.workload)
+            # the action space is sized for the largest layer
+            self.dimension = {key: max(layer[key] for layer, _ in self.layers) for key in self.layers[0][0]}
+            self.engine = MaestroEngine(self._executable, num_workers=num_workers,
+                                        root=self.workspace.dir if self.workspace is not None else None)
+            self.eval_workload = [self.workload, "network"]
+        else:
+            self.dimension, _ = self.helpers.get_dimensions(workload=self.workload, layer_id=self.layer_id)
+            self.engine = None
+            self.eval_workload = [self.workload, self.layer_id]
         print("dimension: ", self.dimension) 
         print("Reward Formulation", self.reward_type)
         
@@ -129,39 +158,70 @@ class MasteroEnv(gym.Env):
             self.observation_space = gym.spaces.Box(low=0, high=1, shape=(4,), dtype=np.float32)
             self.action_space = gym.spaces.Box(low=1, high=2, shape=(17,), dtype=np.float32)
 
-    def clean_sim_files(self, file_path):
-
-        # split the file_path into file name and directory
-        dir_path = os.path.dirname(file_path)
-
-        # use glob to get the list of files
-        csv_files = glob.glob(os.path.join(dir_path, '*.csv'))
-        m_files = glob.glob(os.path.join(dir_path, '*.m'))
-
-        # remove the files
-        for csv_files in csv_files:
-            csv_files = os.path.join(file_path, csv_files)
-            if os.path.exists(csv_files):
-                os.remove(csv_files)
-        
-        for m_files in m_files:
-            m_files = os.path.join(file_path, m_files)
-            if os.path.exists(m_files):
-                os.remove(m_files)
+    def clean_sim_files(self, m_file):
+        '''
+        Removes the mapping and result files of one maestro run (m_file
+        without the extension). Only these two files: concurrent evaluations
+        and other files share the directory when there is no workspace.
+        '''
+        for path in ("{}.m".format(m_file), "{}.csv".format(m_file)):
+            if os.path.exists(path):
+                os.remove(path)
 
     def step(self, action):
         
+        action_decoded, m_file, arch_configs = self.decode_action(action)
+
+        # the decoded mapping (not the raw action) determines the maestro run
+        if self.eval_cache is not None:
+            obs = self.eval_cache.evaluate("Maestro", [action_decoded, arch_configs],
+                                           lambda: self.simulate(action_decoded, m_file, arch_configs),
+                                           version=fingerprint_files(self._executable),
+                                           workload=self.eval_workload)
+        else:
+            obs = self.simulate(action_decoded, m_file, arch_configs)
+
+        return self.step_result(obs)
+
+    async def astep(self, action):
+        '''
+        Same as step, but awaits maestro so that other simulations can run
+        meanwhile (see async_step.AsyncEnvPool)
+        '''
+        action_decoded, m_file, arch_configs = self.decode_action(action)
+
+        if self.eval_cache is not None:
+            obs = await self.eval_cache.evaluate_async("Maestro", [action_decoded, arch_configs],
+                                                       lambda: self.simulate_async(action_decoded, m_file, arch_configs),
+                                                       version=fingerprint_files(self._executable),
+                                                       workload=self.eval_workload)
+        else:
+            obs = await self.simulate_async(action_decoded, m_file, arch_configs)
+
+        return self.step_result(obs)
+
+    def decode_action(self, action):
+        '''
+        Decodes the action into a maestro mapping, a fresh mapping file name
+        and the fixed hardware configuration
+        '''
         self.steps += 1
-        done = False
+        self.profiler.begin_step()
 
         if self.rl_form == 'macme':
             # TODO(Sri) implement this
             action_decoded = self.helpers.decode_action_list_multiagent(action)
+        elif self.network:
+            # the action is decoded against the dimensions of every layer
+            action_decoded = [self.helpers.decode_action_list(self.helpers.decode_action_list_rl(action, dimension))
+                              for dimension, _ in self.layers]
         else:
             action_discretized = self.helpers.decode_action_list_rl(action, self.dimension)
             action_decoded = self.helpers.decode_action_list(action_discretized)
 
         m_file = "{}".format(random.randint(0, 2**32))
+        if self.workspace is not None:
+            m_file = self.workspace.path(m_file)
         
         arch_configs = {
             "NocBW": self.NocBW,
@@ -170,12 +230,13 @@ class MasteroEnv(gym.Env):
             "l2_size": self.l2_size,
             "num_pe": self.num_pe
         }
-        # write the action to the file
-        m_file_path = self.helpers.write_maestro(indv = action_decoded, workload=self.workload, layer_id = self.layer_id, m_file = m_file)
-
-        # run the maestro
-        obs = self.helpers.run_maestro(self._executable, m_file, arch_configs)
+        return action_decoded, m_file, arch_configs
 
+    def step_result(self, obs):
+        '''
+        Computes reward and episode bookkeeping for the observation of a step
+        '''
+        done = False
         obs = obs.reshape(4,)
         print("obs: ", obs)
         reward = self.calculate_reward(obs)
@@ -189,10 +250,69 @@ class MasteroEnv(gym.Env):
         if self.rl_form == "macme":
             obs = [obs.copy()] * self.num_agents
 
+        return obs, reward, done, self.profiler.end_step({})
+
+    def simulate(self, action_decoded, m_file, arch_configs):
+        if self.engine is not None:
+            return self.simulate_network(action_decoded, arch_configs)
+
+        # write the action to the file
+        with self.profiler.phase("render"):
+            self.helpers.write_maestro(indv = action_decoded, workload=self.workload, layer_id = self.layer_id, m_file = m_file)
+
+        # run the maestro and read its results
+        with self.profiler.phase("simulate"):
+            obs = self.helpers.run_maestro(self._executable, m_file, arch_configs)
+
         # clean the files
-        self.clean_sim_files(m_file_path)
-        
-        return obs, reward, done, {}
+        with self.profiler.phase("cleanup"):
+            self.clean_sim_files(m_file)
+
+        return obs
+
+    async def simulate_async(self, action_decoded, m_file, arch_configs):
+        if self.engine is not None:
+            return await self.simulate_network_async(action_decoded, arch_configs)
+
+        # write the action to the file
+        with self.profiler.phase("render"):
+            self.helpers.write_maestro(indv = action_decoded, workload=self.workload, layer_id = self.layer_id, m_file = m_file)
+
+        # run the maestro without blocking the event loop
+        command = self.helpers.maestro_command(self._executable, m_file, arch_configs)
+        with self.profiler.phase("simulate"):
+            await run_subprocess(command, cwd=os.path.dirname(m_file) or None)
+        with self.profiler.phase("parse"):
+            obs = self.helpers.parse_maestro(m_file, arch_configs)
+
+        # clean the files
+        with self.profiler.phase("cleanup"):
+            self.clean_sim_files(m_file)
+
+        return obs
+
+    def render_network(self, action_decoded):
+        '''maestro mapping texts of the decoded action, one per layer'''
+        return [self.helpers.render_maestro(indv, dimension, layer_id)
+                for layer_id, (indv, (_, dimension)) in enumerate(zip(action_decoded, self.layers))]
+
+    def simulate_network(self, action_decoded, arch_configs):
+        with self.profiler.phase("render"):
+            mappings = self.render_network(action_decoded)
+        with self.profiler.phase("simulate"):
+            results = self.engine.evaluate(mappings, arch_configs)
+        with self.profiler.phase("parse"):
+            obs = self.helpers.parse_maestro_network(results, arch_configs)
+        return obs
+
+    async def simulate_network_async(self, action_decoded, arch_configs):
+        with self.profiler.phase("render"):
+            mappings = self.render_network(action_decoded)
+        with self.profiler.phase("simulate"):
+            results = await self.engine.evaluate_async(mappings, arch_configs)
+        with self.profiler.phase("parse"):
+            obs = self.helpers.parse_maestro_network(results, arch_configs)
+        return obs
 
     def calculate_reward(self, stats):
         
@@ -246,6 +366,13 @@ class MasteroEnv(gym.Env):
             obs = np.zeros(self.observation_space.shape)
         return obs 
 
+    def close(self):
+        self.profiler.close()
+        if self.engine is not None:
+            self.engine.close()
+        if self.workspace is not None:
+            self.workspace.close()
+
 
 # For testing
 if __name__ == "__main__":
@@ -14,12 +14,16 @@ import gym
 from gym.utils import seeding
 from envHelpers import helpers
 from loggers import write_csv
+from eval_cache import make_eval_cache, fingerprint_files
+from workspace import make_workspace
+from step_profiler import make_profiler
 import numpy as np
 
 import sys
 import math
 
 import subprocess
+import shutil
 import time
 import re
 import numpy
@@ -27,8 +31,31 @@ import random
 import json
 import collections
 
+# Lines sniper needs at the top of the config: https://groups.google.com/g/snipersim/c/bXvBb6SXZ0k
+CONFIG_INCLUDES = "#include rob\n#include nehalem\n"
+
+
+def wait_for_json(path, timeout=10.0, poll=0.01):
+    '''
+    Waits until path holds a complete JSON document and returns it, or None
+    if it is not ready within timeout seconds. The file is polled with a
+    growing interval, so a file that is already there costs nothing.
+    '''
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with open(path) as json_file:
+                return json.load(json_file)
+        except (OSError, ValueError):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+        time.sleep(min(poll, remaining))
+        poll = min(2 * poll, 1.0)
+
+
 class SniperEnv(gym.Env):
-    def __init__(self):
+    def __init__(self, eval_cache=None, workspace=None, profiler=None):
         
         self.action_space = gym.spaces.Discrete(128)
         # Todo: Change the values if we normalize the observation space
@@ -56,8 +83,17 @@ class SniperEnv(gym.Env):
             self.cummulative_reward = 0
         
         self.cores = Sniper_config.sniper_numcores
+
+        # With a workspace, the config and the sniper logs are private to
+        # this env so that several envs can run at once
+        self.workspace = make_workspace(workspace, prefix="sniper_")
+        if self.workspace is not None:
+            self.sniper_config = self.workspace.copy(self.sniper_config)
+            self.logdir = self.workspace.path("logs")
         
         self.helpers = helpers()
+        self.eval_cache = make_eval_cache(eval_cache)
+        self.profiler = make_profiler(profiler, prefix="sniper_")
         #self.reset()
 
         self.cummulative_reward = 0
@@ -118,26 +154,34 @@ class SniperEnv(gym.Env):
         return obs, rewards, done, {}
     
     def reset_multiagent(self):
-      
+        # the removals are done when they return: the next batch can reuse the
+        # config names and output directories right away
         for each_config in self.agent_configs:
-            os.remove(each_config)
+            if os.path.exists(each_config):
+                os.remove(each_config)
         
         for each_output in self.output_dirs:
             print("Deleting Old logs!:", each_output)
-            os.system("rm -rf {}".format(each_output))
-        # sleep for a while to make sure the files are deleted
-        time.sleep(60)
+            shutil.rmtree(each_output, ignore_errors=True)
+
+        self.agent_configs = []
+        self.output_dirs = []
 
 
     def step(self, action):
         self.steps += 1
+        self.profiler.begin_step()
 
         done = False
         
-        status = self.actionToConfigs(action,self.sniper_config)
+        if self.eval_cache is not None:
+            obs = self.eval_cache.evaluate("Sniper", action, lambda: self.simulate(action),
+                                           version=self.sim_version(),
+                                           workload=[self.sniper_workload, self.cores])
+        else:
+            obs = self.simulate(action)
 
-        if(status):
-            obs = self.runSniper()
+        if obs is not None:
             done = True
             reward = self.calculate_reward(obs)
         else:
@@ -146,8 +190,24 @@ class SniperEnv(gym.Env):
         
         # To do : Add some stopping conditions when dealing with real workload
         
-        return obs, reward, done, {}
+        return obs, reward, done, self.profiler.end_step({})
     
+    def simulate(self, action):
+        '''
+        Writes the sniper config for the action and runs the simulation
+        '''
+        with self.profiler.phase("render"):
+            status = self.actionToConfigs(action,self.sniper_config)
+        if(status):
+            return self.runSniper()
+        return None
+
+    def sim_version(self):
+        '''
+        Hash of the sniper launcher used to key cached evaluations
+        '''
+        return fingerprint_files(os.path.join(self.binary_path, self.binary_name))
+
     def reset(self):
         print("Reseting Environment!")
         self.steps = 0
@@ -157,10 +217,15 @@ class SniperEnv(gym.Env):
         # Delete the logs to make sure every step is a new run
         if os.path.exists(self.logdir):
             print("Deleting Logs")
-            subprocess.call(["rm", "-rf", self.logdir])
+            shutil.rmtree(self.logdir, ignore_errors=True)
 
         
         return self.obs
+
+    def close(self):
+        self.profiler.close()
+        if self.workspace is not None:
+            self.workspace.close()
     
     def actionToConfigs(self,action, cfg):
 
@@ -170,23 +235,14 @@ class SniperEnv(gym.Env):
         '''
         write_ok = self.helpers.read_modify_write_sniper_config(action,cfg)
 
-        # Todo: Maybe there is a cleaner way to write the config file
-
         # workaround: add include to the config file each time we take a new action
-        # Sniper seems to need this: https://groups.google.com/g/snipersim/c/bXvBb6SXZ0k
-
-        dir_path = os.path.dirname(cfg)
-        
+        # (configparser drops them when it writes the file)
         if os.path.exists(cfg):
             print("Adding include to config file")
-                
-            process = subprocess.Popen(["sed", "-i",'1i #include nehalem',cfg], stdout=subprocess.PIPE
-                            ,stderr=subprocess.PIPE)
-            out, err = process.communicate()
-            print("Adding Include Nehalem")
-            process = subprocess.Popen(["sed", "-i",'1i #include rob',cfg], stdout=subprocess.PIPE
-                            ,stderr=subprocess.PIPE)                
-            out, err = process.communicate()
+            with open(cfg) as f:
+                config = f.read()
+            with open(cfg, "w") as f:
+                f.write(CONFIG_INCLUDES + config)
         
         return write_ok
     
@@ -229,34 +285,27 @@ class SniperEnv(gym.Env):
         for idx in range(len(self.output_dirs)):
             basedir = os.path.join(Sniper_config.sniper_binary_path, self.output_dirs[idx])
             
-            # rety this operation till stats.json file is created
-            retry_count = 0
-            while(retry_count < 10):
-                if(os.path.exists(os.path.join(basedir, 'stats.json'))):
-                    with open(os.path.join(basedir, 'stats.json')) as json_file:
-                        data = json.load(json_file)
-                        agent_name = "agent_" + str(idx)
-                        obs[agent_name]['runtime'] = data['Time']
-                        obs[agent_name]['branch_predictor_mpki'] = data["Branch Prediction"]["MPKI"]
-                        obs[agent_name]['branch_mispredict_rate'] = data["Branch Prediction"]["misprediction rate"]
-                        obs[agent_name]['l1_dcache_mpki'] = data["Cache"]["Cache L1-D"]["MPKI"]
-                        obs[agent_name]['l1_dcache_missrate'] = data["Cache"]["Cache L1-D"]["miss rate"]
-                        obs[agent_name]['l1_icache_mpki'] = data["Cache"]["Cache L1-I"]["MPKI"]
-                        obs[agent_name]['l1_icache_missrate'] = data["Cache"]["Cache L1-I"]["miss rate"]
-                        obs[agent_name]['l2_mpki'] = data["Cache"]["Cache L2"]["MPKI"]
-                        obs[agent_name]['l2_missrate'] = data["Cache"]["Cache L2"]["miss rate"]
-                        obs[agent_name]['l3_mpki'] = data["Cache"]["Cache L3"]["MPKI"]
-                        obs[agent_name]['l3_missrate'] = data["Cache"]["Cache L3"]["miss rate"]
-                        obs[agent_name]['power_dynamic'] = data["Power"]["Processor"]["Runtime Dynamic"]
-                        obs[agent_name]['power_peak'] = data["Power"]["Processor"]["Peak Power"]
-                        obs[agent_name]['area'] = data["Power"]["Processor"]["Area"]
-                    break
-                else:
-                    retry_count += 1
-                    time.sleep(1)
-                    print("stats.json file is not present, retry count: ", retry_count)
-
-            if(retry_count == 10):
+            # combine_stats has written stats.json by now, unless the
+            # simulation failed; only a slow filesystem needs the timeout
+            data = wait_for_json(os.path.join(basedir, 'stats.json'))
+            if data is not None:
+                agent_name = "agent_" + str(idx)
+                obs[agent_name]['runtime'] = data['Time']
+                obs[agent_name]['branch_predictor_mpki'] = data["Branch Prediction"]["MPKI"]
+                obs[agent_name]['branch_mispredict_rate'] = data["Branch Prediction"]["misprediction rate"]
+                obs[agent_name]['l1_dcache_mpki'] = data["Cache"]["Cache L1-D"]["MPKI"]
+                obs[agent_name]['l1_dcache_missrate'] = data["Cache"]["Cache L1-D"]["miss rate"]
+                obs[agent_name]['l1_icache_mpki'] = data["Cache"]["Cache L1-I"]["MPKI"]
+                obs[agent_name]['l1_icache_missrate'] = data["Cache"]["Cache L1-I"]["miss rate"]
+                obs[agent_name]['l2_mpki'] = data["Cache"]["Cache L2"]["MPKI"]
+                obs[agent_name]['l2_missrate'] = data["Cache"]["Cache L2"]["miss rate"]
+                obs[agent_name]['l3_mpki'] = data["Cache"]["Cache L3"]["MPKI"]
+                obs[agent_name]['l3_missrate'] = data["Cache"]["Cache L3"]["miss rate"]
+                obs[agent_name]['power_dynamic'] = data["Power"]["Processor"]["Runtime Dynamic"]
+                obs[agent_name]['power_peak'] = data["Power"]["Processor"]["Peak Power"]
+                obs[agent_name]['area'] = data["Power"]["Processor"]["Area"]
+            else:
+                print("stats.json file is not present: ", basedir)
                 # write a message to a file
                 with open(os.path.join(basedir, 'error.log'), 'w') as f:
                     f.write("stats.json file is not present! Shutting down!")
@@ -274,11 +323,12 @@ class SniperEnv(gym.Env):
         cmd = exe_final
         args = " -c" + " " + self.sniper_config + " -d " + self.logdir + " -n " + self.cores
 
-        process = subprocess.check_output(["python", cmd, 
-                 self.sniper_workload,
-                 "-c", self.sniper_config,
-                 "-d", self.logdir,
-                 "-n", self.cores])
+        with self.profiler.phase("simulate"):
+            process = subprocess.check_output(["python", cmd, 
+                     self.sniper_workload,
+                     "-c", self.sniper_config,
+                     "-d", self.logdir,
+                     "-n", self.cores])
 
         #process = subprocess.Popen(["python", cmd, args],stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         #process = subprocess.check_output(["python", cmd, args])#,stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -293,7 +343,7 @@ class SniperEnv(gym.Env):
         data = {}
         # read from a json file if done
         if done:
-            with open(output_file) as json_file:
+            with self.profiler.phase("parse"), open(output_file) as json_file:
                 data = json.load(json_file)
         else:
             # To do : Gracefully hanfl ethis case
@@ -16,6 +16,9 @@ from   audioop       import mul
 from   sims.Timeloop import simulate_timeloop, process_params
 from   configs.sims  import Timeloop_config
 from   envHelpers    import helpers
+from   eval_cache    import make_eval_cache, fingerprint_files
+from   workspace     import make_workspace
+from   step_profiler import make_profiler
 
 MAX_EPISODE_LENGTH = 10
 MAX_STEPS = 100
@@ -23,7 +26,8 @@ MAX_STEPS = 100
 class TimeloopEnv(gym.Env):
     def __init__(self, script_dir=None, output_dir=None, arch_dir=None,
                  mapper_dir=None, workload_dir=None, target_val=None,
-                 num_cores=None, reward_formulation=None):
+                 num_cores=None, reward_formulation=None, eval_cache=None,
+                 workspace=None, profiler=None):
 
         param_obj = process_params.TimeloopConfigParams(Timeloop_config.timeloop_parameters)
         param_sizes = param_obj.get_param_size()
@@ -70,9 +74,21 @@ class TimeloopEnv(gym.Env):
 
         self.cores = self.cores//8    # 8 threads per timeloop run
 
+        # With a workspace, run_timeloop.sh, eyeriss_like.yaml and the outputs
+        # live in a private sandbox so that several envs can run at once
+        self.workspace = make_workspace(workspace, prefix="timeloop_")
+        if self.workspace is not None:
+            self.timeloop_script = self.workspace.mirror(self.timeloop_script, "script")
+            self.workspace.writable(os.path.join(self.timeloop_script, "run_timeloop.sh"))
+            self.timeloop_arch = self.workspace.mirror(self.timeloop_arch, "arch")
+            self.workspace.writable(os.path.join(self.timeloop_arch, "eyeriss_like.yaml"))
+            self.timeloop_output = self.workspace.makedirs("output")
+
         self.cumulative_reward = 0
 
         self.helpers = helpers()
+        self.eval_cache = make_eval_cache(eval_cache)
+        self.profiler = make_profiler(profiler, prefix="timeloop_")
 
         # Batch mode directories
         self.timeloop_script_batch = []
@@ -83,12 +99,27 @@ class TimeloopEnv(gym.Env):
         '''Take an action in a timestep'''
         # Assumes that the action here is the modified architecture parameters for now
         self.steps += 1
+        self.profiler.begin_step()
         obs = self.run_timeloop(action_params)
+        return self.step_result(obs)
+
+    async def astep(self, action_params):
+        '''
+        Same as step, but awaits timeloop so that other simulations can run
+        meanwhile (see async_step.AsyncEnvPool)
+        '''
+        self.steps += 1
+        self.profiler.begin_step()
+        obs = await self.run_timeloop_async(action_params)
+        return self.step_result(obs)
+
+    def step_result(self, obs):
+        '''Computes the reward for the observation of a step'''
         done = True
         reward = self.calculate_reward(obs)
         self.cumulative_reward += reward
 
-        return obs, reward, done, {}
+        return obs, reward, done, self.profiler.end_step({})
 
     def step_multiagent(self, action_params):
         '''Take one action for multiple agents in each timestep'''
@@ -144,11 +175,54 @@ class TimeloopEnv(gym.Env):
 
         return obs
 
+    def close(self):
+        self.profiler.close()
+        if self.workspace is not None:
+            self.workspace.close()
+
     def run_timeloop(self, arch_params):
+        '''Invokes the timeloop scripts, reusing cached results when available'''
+        if self.eval_cache is None:
+            return self.simulate(arch_params)
+
+        version, workload = self.cache_version()
+        return self.eval_cache.evaluate("Timeloop", arch_params, lambda: self.simulate(arch_params),
+                                        version=version, workload=workload)
+
+    async def run_timeloop_async(self, arch_params):
+        '''Same as run_timeloop, but awaits timeloop instead of blocking'''
+        if self.eval_cache is None:
+            return await self.simulate_async(arch_params)
+
+        version, workload = self.cache_version()
+        return await self.eval_cache.evaluate_async("Timeloop", arch_params, lambda: self.simulate_async(arch_params),
+                                                    version=version, workload=workload)
+
+    def cache_version(self):
+        '''Version and workload keys of cached evaluations'''
+        # run_timeloop.sh and eyeriss_like.yaml are rewritten on every run, so only
+        # the static inputs take part in the version hash
+        version = fingerprint_files(os.path.join(self.timeloop_arch, "components"), self.timeloop_mapper)
+        workload = [self.timeloop_workload, fingerprint_files(self.timeloop_workload)]
+        return version, workload
+
+    def simulate(self, arch_params):
         '''Invokes the timeloop scripts'''
 
         energy, area, cycles = simulate_timeloop.simulate_timeloop(self.timeloop_script, self.timeloop_output,
-                                                                   self.timeloop_arch, self.timeloop_mapper, self.timeloop_workload, arch_params)
+                                                                   self.timeloop_arch, self.timeloop_mapper, self.timeloop_workload, arch_params,
+                                                                   profiler=self.profiler, max_workers=max(1, self.cores))
+
+        obs = np.array([energy, area, cycles])
+
+        return obs
+
+    async def simulate_async(self, arch_params):
+        '''Invokes the timeloop scripts without blocking the event loop'''
+
+        energy, area, cycles = await simulate_timeloop.simulate_timeloop_async(self.timeloop_script, self.timeloop_output,
+                                                                               self.timeloop_arch, self.timeloop_mapper, self.timeloop_workload, arch_params,
+                                                                               profiler=self.profiler, max_workers=max(1, self.cores))
 
         obs = np.array([energy, area, cycles])
 
@@ -165,7 +239,8 @@ class TimeloopEnv(gym.Env):
         for agent in range(len(multi_arch_params)):
             params = (self.timeloop_script_batch[agent], self.timeloop_output_batch[agent],
                       self.timeloop_arch_batch[agent], self.timeloop_mapper,
-                      self.timeloop_workload, multi_arch_params[agent])
+                      self.timeloop_workload, multi_arch_params[agent],
+                      "docker", None, 1)  # the agents already fill the cores
             pool_params.append(params)
 
         energy, area, cycles = zip(*pool.starmap(simulate_timeloop.simulate_timeloop, pool_params))
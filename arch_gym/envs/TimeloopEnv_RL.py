@@ -198,7 +198,8 @@ class TimeloopEnv(gym.Env):
         for agent in range(len(multi_arch_params)):
             params = (self.timeloop_script_batch[agent], self.timeloop_output_batch[agent],
                       self.timeloop_arch_batch[agent], self.timeloop_mapper,
-                      self.timeloop_workload, multi_arch_params[agent])
+                      self.timeloop_workload, multi_arch_params[agent],
+                      "docker", None, 1)  # the agents already fill the cores
             pool_params.append(params)
 
         energy, area, cycles = zip(*pool.starmap(simulate_timeloop.simulate_timeloop, pool_params))
@@ -0,0 +1,168 @@
+import numpy as np
+
+# comparison operators of the constraint language
+OPERATORS = {
+    "<=": np.less_equal,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "<": np.less,
+    ">": np.greater,
+}
+
+# command -> number of (section, knob) pairs it takes
+COMMANDS = {"product": 1, "mult": 2, "num": 1}
+
+
+class Constraint():
+    '''
+    One compiled constraint of frontend/parameter_knobs.py, e.g.
+
+        product network npus-count <= num network num-npus
+        mult workload data-parallel-degree workload model-parallel-degree == num network num-npus
+
+    Each side is a term: "product <section> <knob>" (product of a per
+    dimension knob), "mult <section> <knob> <section> <knob>" (product of two
+    knobs), "num <section> <knob>" (value of a knob) or a number.
+    '''
+    def __init__(self, text):
+        self.text = text
+        tokens = text.split()
+        operators = [i for i, token in enumerate(tokens) if token in OPERATORS]
+        if len(operators) != 1:
+            raise ValueError("Constraint needs exactly one comparison operator: {}".format(text))
+        split = operators[0]
+        self.operator = tokens[split]
+        self.compare = OPERATORS[self.operator]
+        self.left = self._parse_term(tokens[:split])
+        self.right = self._parse_term(tokens[split + 1:])
+
+    def _parse_term(self, tokens):
+        if len(tokens) == 1:
+            try:
+                return ("const", float(tokens[0]))
+            except ValueError:
+                pass
+        if not tokens or tokens[0] not in COMMANDS or len(tokens) != 1 + 2 * COMMANDS[tokens[0]]:
+            raise ValueError("Cannot parse '{}' in constraint: {}".format(" ".join(tokens), self.text))
+        knobs = tuple((tokens[i], tokens[i + 1]) for i in range(1, len(tokens), 2))
+        return (tokens[0], knobs)
+
+    @property
+    def knobs(self):
+        return {knob for command, args in (self.left, self.right) if command != "const" for knob in args}
+
+    @staticmethod
+    def _value(term, columns):
+        command, args = term
+        if command == "const":
+            return args
+        values = [columns[knob] for knob in args]
+        if command == "product":
+            return np.prod(values[0].reshape(len(values[0]), -1), axis=1)
+        if command == "mult":
+            return _scalar(values[0]) * _scalar(values[1])
+        return _scalar(values[0])
+
+    def evaluate(self, columns):
+        '''
+        Vectorized check: columns maps (section, knob) to an array with one
+        row per candidate, returns a boolean array with one entry per row
+        '''
+        return self.compare(self._value(self.left, columns), self._value(self.right, columns))
+
+    def __repr__(self):
+        return self.text
+
+
+def _scalar(values):
+    # knobs set per dimension but compared as a number use their first entry
+    return values.reshape(len(values), -1)[:, 0]
+
+
+class ConstraintSet():
+    '''
+    The constraints of an env, compiled once.
+
+    feasible()/violated() check a single action dict before any config file
+    is written or the simulator is launched. population_mask() and
+    encoded_population_mask() evaluate the constraints for a whole population
+    at once with NumPy, so that optimizers can drop or resample infeasible
+    candidates before evaluating them.
+
+    A constraint that refers to a knob the candidates do not define cannot
+    be checked and is skipped.
+    '''
+    def __init__(self, constraints):
+        self.constraints = [c if isinstance(c, Constraint) else Constraint(c) for c in constraints]
+
+    def __iter__(self):
+        return iter(self.constraints)
+
+    def __len__(self):
+        return len(self.constraints)
+
+    def __repr__(self):
+        return repr([c.text for c in self.constraints])
+
+    @property
+    def knobs(self):
+        return set().union(*(c.knobs for c in self.constraints))
+
+    def population_mask(self, columns, num_candidates=None):
+        '''
+        Boolean mask of the candidates that satisfy every constraint.
+        columns maps (section, knob) to one value (or sequence of per
+        dimension values) per candidate.
+        '''
+        columns = {knob: np.asarray(values, dtype=float) for knob, values in columns.items()}
+        if num_candidates is None:
+            num_candidates = len(next(iter(columns.values()))) if columns else 1
+        mask = np.ones(num_candidates, dtype=bool)
+        for constraint in self.constraints:
+            if constraint.knobs <= columns.keys():
+                mask &= constraint.evaluate(columns)
+        return mask
+
+    def violated(self, action_dict):
+        '''Constraints violated by a single action dict'''
+        columns = {}
+        for section, knob in self.knobs:
+            if section in action_dict and knob in action_dict[section]:
+                columns[(section, knob)] = np.asarray([action_dict[section][knob]], dtype=float)
+        return [c for c in self.constraints
+                if c.knobs <= columns.keys() and not c.evaluate(columns)[0]]
+
+    def feasible(self, action_dict):
+        return not self.violated(action_dict)
+
+    def encoded_population_mask(self, X, system_knob, network_knob, workload_knob, dimension, defaults=None):
+        '''
+        population_mask() for GA encoded candidates (rows of X in the layout
+        of helpers.action_decoder_ga_astraSim). Knobs the encoding does not
+        cover are taken from the defaults action dict (e.g. the parsed base
+        system and network files).
+        '''
+        X = np.asarray(X)
+        wanted = self.knobs
+        columns = {}
+        if defaults is not None:
+            for section, knob in wanted:
+                if section in defaults and knob in defaults[section]:
+                    value = np.asarray(defaults[section][knob], dtype=float)
+                    columns[(section, knob)] = np.broadcast_to(value, (len(X),) + value.shape)
+
+        counter = 0
+        for knobs, section in ((system_knob, 'system'), (network_knob, 'network'), (workload_knob, 'workload')):
+            for knob, (domain, per_dimension) in knobs.items():
+                width = dimension if per_dimension == "FALSE" else 1
+                if (section, knob) in wanted:
+                    codes = X[:, counter:counter + width]
+                    if isinstance(domain, set):
+                        # same value order as the decoder
+                        codes = np.asarray(list(domain), dtype=float)[codes.astype(int)]
+                    if per_dimension == "TRUE":
+                        # one gene, repeated for every dimension like the decoder does
+                        codes = np.repeat(codes, dimension, axis=1)
+                    columns[(section, knob)] = codes if per_dimension in ("FALSE", "TRUE") else codes[:, 0]
+                counter += width
+        return self.population_mask(columns, num_candidates=len(X))
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from asyncio.subprocess import PIPE
+
+
+async def run_subprocess(cmd, cwd=None, env=None):
+    '''
+    asyncio counterpart of subprocess.Popen(...).communicate(). Returns
+    (returncode, stdout, stderr) with the streams decoded.
+    '''
+    process = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE, cwd=cwd, env=env)
+    out, err = await process.communicate()
+    return process.returncode, out.decode(), err.decode()
+
+
+class AsyncEnvPool():
+    '''
+    Non-blocking stepping for ArchGym environments that implement the
+    coroutine astep(action).
+
+    Every env runs one simulation at a time, so the number of envs is the
+    number of simulations kept in flight. Give each env its own workspace
+    (see workspace.py) so that they do not share config files.
+
+    step_async(actions) launches the simulations and returns immediately,
+    step_wait() blocks until all of them finished and returns the
+    (obs, reward, done, info) tuples in the order of the actions. Inside an
+    event loop, await astep(actions) instead.
+    '''
+    def __init__(self, envs):
+        self.envs = list(envs)
+        self.pending = None
+        self.loop = None
+        self.thread = None
+
+    @classmethod
+    def from_factory(cls, env_fn, num_envs):
+        '''Builds num_envs envs with env_fn(index)'''
+        return cls([env_fn(i) for i in range(num_envs)])
+
+    async def astep(self, actions):
+        free = asyncio.Queue()
+        for env in self.envs:
+            free.put_nowait(env)
+
+        async def run(action):
+            env = await free.get()
+            try:
+                return await env.astep(action)
+            finally:
+                free.put_nowait(env)
+
+        return list(await asyncio.gather(*(run(action) for action in actions)))
+
+    def _start_loop(self):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+            self.thread.start()
+
+    def step_async(self, actions):
+        if self.pending is not None:
+            raise RuntimeError("step_wait() must be called before the next step_async()")
+        self._start_loop()
+        self.pending = asyncio.run_coroutine_threadsafe(self.astep(actions), self.loop)
+
+    def step_wait(self, timeout=None):
+        if self.pending is None:
+            raise RuntimeError("step_async() must be called before step_wait()")
+        pending, self.pending = self.pending, None
+        return pending.result(timeout)
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+        for env in self.envs:
+            env.close()
@@ -0,0 +1,210 @@
+"""Drives N replicas of an ArchGym dm_env environment in worker processes."""
+
+import multiprocessing
+import time
+from typing import Callable, Optional, Sequence
+
+from acme import core
+from acme import types
+from acme.utils import loggers
+import dm_env
+import numpy as np
+import tree
+
+
+def _worker(remote, parent_remote, env_fn):
+  """Owns one environment replica and serves commands from the parent."""
+  parent_remote.close()
+  environment = env_fn()
+  reset_next_step = True
+  try:
+    while True:
+      command, data = remote.recv()
+      if command == 'step':
+        # Auto-reset: the step after a LAST time step starts a new episode.
+        if reset_next_step:
+          timestep = environment.reset()
+        else:
+          timestep = environment.step(data)
+        reset_next_step = timestep.last()
+        remote.send(timestep)
+      elif command == 'reset':
+        timestep = environment.reset()
+        reset_next_step = False
+        remote.send(timestep)
+      elif command == 'specs':
+        remote.send((environment.observation_spec(),
+                     environment.action_spec(),
+                     environment.reward_spec(),
+                     environment.discount_spec()))
+      elif command == 'close':
+        environment.close()
+        remote.send(None)
+        break
+      else:
+        raise ValueError('Unknown command: {}'.format(command))
+  except KeyboardInterrupt:
+    pass
+  finally:
+    remote.close()
+
+
+class BatchedEnvWrapper(dm_env.Environment):
+  """Steps N independent environment replicas in parallel.
+
+  Every replica lives in its own worker process, so N simulator runs overlap
+  and the caller collects N transitions per simulation latency. step() takes
+  actions stacked along a leading axis of size N and returns a TimeStep whose
+  fields are stacked the same way. Replicas reset themselves after a LAST
+  time step (the next step of that replica returns its FIRST time step), so
+  a batch may mix step types. Rewards and discounts of FIRST time steps are
+  filled with zeros and ones so that they stack.
+
+  observation_spec() and friends return the spec of a single replica, which
+  is what acme networks are built from.
+
+  Give each replica its own workspace (see workspace.py) so that replicas
+  do not share config files.
+  """
+
+  def __init__(self, env_fns: Sequence[Callable[[], dm_env.Environment]]):
+    ctx = multiprocessing.get_context()
+    self._remotes, self._processes = [], []
+    for env_fn in env_fns:
+      remote, worker_remote = ctx.Pipe()
+      process = ctx.Process(
+          target=_worker, args=(worker_remote, remote, env_fn), daemon=True)
+      process.start()
+      worker_remote.close()
+      self._remotes.append(remote)
+      self._processes.append(process)
+
+    self._remotes[0].send(('specs', None))
+    (self._observation_spec, self._action_spec, self._reward_spec,
+     self._discount_spec) = self._remotes[0].recv()
+    self._closed = False
+
+  @property
+  def num_envs(self) -> int:
+    return len(self._remotes)
+
+  def _stack(self, timesteps) -> dm_env.TimeStep:
+    rewards, discounts = [], []
+    for timestep in timesteps:
+      rewards.append(tree.map_structure(lambda s: s.generate_value(), self._reward_spec)
+                     if timestep.reward is None else timestep.reward)
+      discounts.append(np.ones((), dtype=self._discount_spec.dtype)
+                       if timestep.discount is None else timestep.discount)
+    stack = lambda *x: np.stack(x)
+    return dm_env.TimeStep(
+        step_type=np.array([timestep.step_type for timestep in timesteps]),
+        reward=tree.map_structure(stack, *rewards),
+        discount=np.stack(discounts),
+        observation=tree.map_structure(stack, *[t.observation for t in timesteps]))
+
+  def reset(self) -> dm_env.TimeStep:
+    """Resets every replica."""
+    for remote in self._remotes:
+      remote.send(('reset', None))
+    return self._stack([remote.recv() for remote in self._remotes])
+
+  def step(self, actions: types.NestedArray) -> dm_env.TimeStep:
+    """Steps every replica with its row of actions."""
+    self.step_async(actions)
+    return self.step_wait()
+
+  def step_async(self, actions: types.NestedArray):
+    """Sends the actions without waiting for the simulations to finish."""
+    for i, remote in enumerate(self._remotes):
+      remote.send(('step', tree.map_structure(lambda a: a[i], actions)))
+
+  def step_wait(self) -> dm_env.TimeStep:
+    """Waits for the replicas stepped by step_async."""
+    return self._stack([remote.recv() for remote in self._remotes])
+
+  def observation_spec(self) -> types.NestedSpec:
+    return self._observation_spec
+
+  def action_spec(self) -> types.NestedSpec:
+    return self._action_spec
+
+  def reward_spec(self):
+    return self._reward_spec
+
+  def discount_spec(self):
+    return self._discount_spec
+
+  def close(self):
+    if self._closed:
+      return
+    for remote in self._remotes:
+      remote.send(('close', None))
+    for remote in self._remotes:
+      remote.recv()
+    for process in self._processes:
+      process.join()
+    self._closed = True
+
+
+def unstack_timestep(timestep: dm_env.TimeStep, index: int) -> dm_env.TimeStep:
+  """Returns the time step of replica `index` from a stacked TimeStep."""
+  step_type = dm_env.StepType(timestep.step_type[index])
+  reward = tree.map_structure(lambda x: x[index], timestep.reward)
+  discount = timestep.discount[index]
+  if step_type == dm_env.StepType.FIRST:
+    reward, discount = None, None
+  return dm_env.TimeStep(
+      step_type=step_type,
+      reward=reward,
+      discount=discount,
+      observation=tree.map_structure(lambda x: x[index], timestep.observation))
+
+
+class BatchedEnvironmentLoop(core.Worker):
+  """Acme-style environment loop over a BatchedEnvWrapper.
+
+  Replica i is driven by actors[i]. The actors are expected to share their
+  learner (e.g. built N times by the same builder with their own adders), so
+  the learner receives N transitions per batched step.
+  """
+
+  def __init__(self,
+               environment: BatchedEnvWrapper,
+               actors: Sequence[core.Actor],
+               logger: Optional[loggers.Logger] = None,
+               should_update: bool = True):
+    if len(actors) != environment.num_envs:
+      raise ValueError('Need one actor per replica, got {} actors for {} envs'.format(
+          len(actors), environment.num_envs))
+    self._environment = environment
+    self._actors = actors
+    self._logger = logger or loggers.make_default_logger('batched_environment_loop')
+    self._should_update = should_update
+
+  def run(self, num_steps: int):
+    """Runs num_steps batched steps, i.e. num_steps * num_envs transitions."""
+    timestep = self._environment.reset()
+    for i, actor in enumerate(self._actors):
+      actor.observe_first(unstack_timestep(timestep, i))
+
+    episodes, start_time = 0, time.time()
+    for step in range(num_steps):
+      actions = [actor.select_action(unstack_timestep(timestep, i).observation)
+                 for i, actor in enumerate(self._actors)]
+      timestep = self._environment.step(tree.map_structure(lambda *a: np.stack(a), *actions))
+
+      for i, actor in enumerate(self._actors):
+        replica_timestep = unstack_timestep(timestep, i)
+        if replica_timestep.first():
+          actor.observe_first(replica_timestep)
+        else:
+          actor.observe(actions[i], next_timestep=replica_timestep)
+          episodes += int(replica_timestep.last())
+        if self._should_update:
+          actor.update()
+
+      self._logger.write({
+          'steps': (step + 1) * self._environment.num_envs,
+          'episodes': episodes,
+          'steps_per_second': (step + 1) * self._environment.num_envs / (time.time() - start_time),
+      })
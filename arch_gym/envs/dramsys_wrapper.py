@@ -194,10 +194,16 @@ def _convert_to_spec(space: gym.Space,
 def make_dramsys_env(seed: int = 12234,
                      max_steps: int = 100,
                      reward_formulation: str = 'power',
+                     eval_cache = None,
+                     workspace = None,
+                     profiler = None,
                      ) -> dm_env.Environment:
   """Returns DRAMSys environment."""
   environment = DRAMSysEnvWrapper(DRAMEnv(
-    reward_formulation = reward_formulation))
+    reward_formulation = reward_formulation,
+    eval_cache = eval_cache,
+    workspace = workspace,
+    profiler = profiler))
   environment = wrappers.SinglePrecisionWrapper(environment)
   if(rl_config.rl_agent):
     environment = wrappers.CanonicalSpecWrapper(environment, clip=True)
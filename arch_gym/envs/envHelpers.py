@@ -10,10 +10,12 @@ os.sys.path.insert(0, os.path.abspath('/../../configs'))
 os.sys.path.insert(0, os.path.abspath('/../..'))
 
 #from configs import configs
+from configs import arch_gym_configs
 from configs.sims import DRAMSys_config
 from configs.sims import Timeloop_config
 import shutil
 from sims.Timeloop.process_params import TimeloopConfigParams
+from maestro_engine import MaestroEngine, maestro_command, read_maestro_csv
 from subprocess import Popen, PIPE
 import pandas as pd
 from math import ceil
@@ -778,6 +780,33 @@ class helpers():
         return act_decoded
 
     
+    def action_decoder_ga_batch(self, population):
+        """
+        Vectorized action_decoder_ga: decodes a whole GA population of shape
+        (size_pop, 10) into a DataFrame with one action per row
+        """
+        population = np.asarray(population, dtype=float).astype(int)
+
+        page_policy_mapper = np.array(["Open", "OpenAdaptive", "Closed", "ClosedAdaptive"])
+        scheduler_mapper = np.array(["Fifo", "FrFcfsGrp", "FrFcfs"])
+        schedulerbuffer_mapper = np.array(["Bankwise", "ReadWrite", "Shared"])
+        respqueue_mapper = np.array(["Fifo", "Reorder"])
+        refreshpolicy_mapper = np.array(["NoRefresh", "AllBank"])
+        arbiter_mapper = np.array(["Simple", "Fifo", "Reorder"])
+
+        return pd.DataFrame({
+            "PagePolicy": page_policy_mapper[population[:, 0]],
+            "Scheduler": scheduler_mapper[population[:, 1]],
+            "SchedulerBuffer": schedulerbuffer_mapper[population[:, 2]],
+            "RequestBufferSize": population[:, 3],
+            "RespQueue": respqueue_mapper[population[:, 4]],
+            "RefreshPolicy": refreshpolicy_mapper[population[:, 5]],
+            "RefreshMaxPostponed": population[:, 6],
+            "RefreshMaxPulledin": population[:, 7],
+            "Arbiter": arbiter_mapper[population[:, 8]],
+            "MaxActiveTransactions": population[:, 9],
+        })
+
     def action_decoder_ga_astraSim(self, act_encoded, system_knob, network_knob, workload_knob, dimension):
         act_decoded = {"system": {}, "network": {}, "workload": {}}
         dicts = [(system_knob, 'system'), (network_knob, 'network'), (workload_knob, 'workload')]
@@ -980,10 +1009,11 @@ class helpers():
 
         return rand_actions
     
-    def read_modify_write_dramsys(self, action):
+    def read_modify_write_dramsys(self, action, mem_ctrl_file=None):
         print("[envHelpers][Action]", action)
         op_success = False
-        mem_ctrl_file = DRAMSys_config.dram_mem_controller_config_file
+        if mem_ctrl_file is None:
+            mem_ctrl_file = DRAMSys_config.dram_mem_controller_config_file
         
         try:
             with open (mem_ctrl_file, "r") as JsonFile:
@@ -1212,6 +1242,10 @@ class helpers():
         return final_df
 
     def get_dimensions(self, workload, layer_id):
+        return self.get_network_dimensions(workload)[layer_id]
+
+    def get_network_dimensions(self, workload):
+        '''(row_dict, row_list) with the dimensions of every layer of the workload'''
         # add .csv to the workload name
         model_name = workload + ".csv"
         model_path = os.path.join(arch_gym_configs.mastero_model_path, model_name)
@@ -1219,23 +1253,19 @@ class helpers():
         # check if model_path exists
         if os.path.exists(model_path):
             print("model_path exists")
-            import pandas as pd
 
             # Read in the csv file
             df = pd.read_csv(model_path)
 
-            # Get user input for row number
-            layer_id = layer_id
+            layers = []
+            for _, row in df.iterrows():
+                # convert the row to dictionary
+                row_dict = row.to_dict()
 
-            # Select the row based on user input
-            row = df.iloc[layer_id]
-
-            # convert the row to dictionary
-            row_dict = row.to_dict()
-
-            # convert the dictionary to list
-            row_list = list(row_dict.values())
-            return row_dict, row_list
+                # convert the dictionary to list
+                row_list = list(row_dict.values())
+                layers.append((row_dict, row_list))
+            return layers
 
         else:
             print("model_path does not exist")
@@ -1260,52 +1290,58 @@ class helpers():
         _, dimension = self.get_dimensions(workload, layer_id)
         print("[DEBUG][write_maestro][dimension: {}]", dimension)
         
+        print("[DEBUG][write_maestro][m_file: {}]", m_file)
+        with open("{}.m".format(m_file), "w") as fo:
+            fo.write(self.render_maestro(indv, dimension, layer_id))
+
+        # return the full path of the m_file
+        return os.path.join(os.getcwd(), "{}.m".format(m_file))
+
+    def render_maestro(self, indv, dimension, layer_id=0):
+        '''Returns the maestro mapping (.m) text of the mapping indv for a layer of the given dimension'''
         m_type_dicts = {0:"CONV", 1:"CONV", 2:"DSCONV", 3:"CONV"}
         
-        print("[DEBUG][write_maestro][m_file: {}]", m_file)
+        lines = []
         dimensions = [dimension]
-        with open("{}.m".format(m_file), "w") as fo:
-            fo.write("Network {} {{\n".format(layer_id))
-            for i in range(len(dimensions)):
-                dimension = dimensions[i]
-                m_type = m_type_dicts[int(dimension[-1])]
-                dimension = self.get_CONVtypeShape(dimension, int(dimension[-1]))
-                print(dimension)
-                
-                fo.write("Layer {} {{\n".format(m_type))
-                fo.write("Type: {}\n".format(m_type))
-                fo.write(
-                    "Dimensions {{ K: {:.0f}, C: {:.0f}, Y: {:.0f}, X: {:.0f}, R: {:.0f}, S: {:.0f} }}\n".format(
-                        *dimension))
-                fo.write("Dataflow {\n")
-                for k in range(0, len(indv), 7):
-                    for i in range(k, k + 7):
-                        if len(indv[i]) == 2:
-                            d, d_sz = indv[i]
-                        else:
-                            d, d_sz, _ = indv[i]
-                        if i % 7 == 0:
-                            if k != 0:
-                                fo.write("Cluster({},P);\n".format(d_sz))
+        lines.append("Network {} {{\n".format(layer_id))
+        for i in range(len(dimensions)):
+            dimension = dimensions[i]
+            m_type = m_type_dicts[int(dimension[-1])]
+            dimension = self.get_CONVtypeShape(dimension, int(dimension[-1]))
+            print(dimension)
+            
+            lines.append("Layer {} {{\n".format(m_type))
+            lines.append("Type: {}\n".format(m_type))
+            lines.append(
+                "Dimensions {{ K: {:.0f}, C: {:.0f}, Y: {:.0f}, X: {:.0f}, R: {:.0f}, S: {:.0f} }}\n".format(
+                    *dimension))
+            lines.append("Dataflow {\n")
+            for k in range(0, len(indv), 7):
+                for i in range(k, k + 7):
+                    if len(indv[i]) == 2:
+                        d, d_sz = indv[i]
+                    else:
+                        d, d_sz, _ = indv[i]
+                    if i % 7 == 0:
+                        if k != 0:
+                            lines.append("Cluster({},P);\n".format(d_sz))
+                    else:
+                        sp = "SpatialMap" if d == indv[k][0] or (
+                                    len(indv[k]) > 2 and d == indv[k][2]) else "TemporalMap"
+                        # MAESTRO cannot take K dimension as dataflow file
+                        if not (m_type == "DSCONV"):
+                            lines.append("{}({},{}) {};\n".format(sp, d_sz, d_sz, self.get_out_repr(d)))
                         else:
-                            sp = "SpatialMap" if d == indv[k][0] or (
-                                        len(indv[k]) > 2 and d == indv[k][2]) else "TemporalMap"
-                            # MAESTRO cannot take K dimension as dataflow file
-                            if not (m_type == "DSCONV"):
-                                fo.write("{}({},{}) {};\n".format(sp, d_sz, d_sz, self.get_out_repr(d)))
+                            if self.get_out_repr(d) == "C" and self.get_out_repr(indv[k][0]) == "K":
+                                lines.append("{}({},{}) {};\n".format("SpatialMap", d_sz, d_sz, "C"))
                             else:
-                                if self.get_out_repr(d) == "C" and self.get_out_repr(indv[k][0]) == "K":
-                                    fo.write("{}({},{}) {};\n".format("SpatialMap", d_sz, d_sz, "C"))
-                                else:
-                                    if not (self.get_out_repr(d) == "K"):
-                                        fo.write("{}({},{}) {};\n".format(sp, d_sz, d_sz, self.get_out_repr(d)))
+                                if not (self.get_out_repr(d) == "K"):
+                                    lines.append("{}({},{}) {};\n".format(sp, d_sz, d_sz, self.get_out_repr(d)))
 
-                fo.write("}\n")
-                fo.write("}\n")
-            fo.write("}")
-
-            # return the full path of the m_file
-            return os.path.join(os.getcwd(), "{}.m".format(m_file))
+            lines.append("}\n")
+            lines.append("}\n")
+        lines.append("}")
+        return "".join(lines)
 
     def get_out_repr(self, x):
         out_repr = set(["K", "C", "R", "S"])
@@ -1316,94 +1352,46 @@ class helpers():
 
     def run_maestro(self, exe, m_file, arch_configs):
 
-        NocBW = arch_configs["NocBW"]
-        offchipBW = arch_configs["offchipBW"]
-        num_pe = arch_configs["num_pe"]
-        l1_size = arch_configs["l1_size"]
-        l2_size = arch_configs["l2_size"]
-        num_pe = arch_configs["num_pe"]
-
-        command = [exe,
-           "--Mapping_file={}.m".format(m_file),
-           "--full_buffer=false",
-           "--noc_bw_cstr={}".format(NocBW),
-           "--noc_hops=1",
-           "--noc_hop_latency=1",
-           "--offchip_bw_cstr={}".format(offchipBW),
-           "--noc_mc_support=true",
-           "--num_pes={}".format(int(num_pe)),
-           "--num_simd_lanes=1",
-           "--l1_size_cstr={}".format(l1_size),
-           "--l2_size_cstr={}".format(l2_size),
-           "--print_res=false",
-           "--print_res_csv_file=true",
-           "--print_log_file=false",
-           "--print_design_space=false",
-           "--msg_print_lv=0"]
+        command = self.maestro_command(exe, m_file, arch_configs)
 
         print(command)
-        process = Popen(command, stdout=PIPE, stderr=PIPE)
+        # run next to the mapping file so the result csv lands beside it
+        process = Popen(command, stdout=PIPE, stderr=PIPE, cwd=os.path.dirname(m_file) or None)
         stdout, stderr = process.communicate()
         process.wait() 
+
+        return self.parse_maestro(m_file, arch_configs)
+
+    def maestro_command(self, exe, m_file, arch_configs):
+        '''Returns the maestro command line for the mapping in m_file'''
+        return maestro_command(exe, m_file, arch_configs)
+
+    def parse_maestro(self, m_file, arch_configs):
+        '''Reads the result csv maestro wrote for m_file into an observation'''
+        num_pe = arch_configs["num_pe"]
         
         try:
-            df = pd.read_csv("{}.csv".format(m_file))
-            layer_name = df[" Layer Number"]
-            runtime = np.array(df[" Runtime (Cycles)"]).reshape(-1, 1)
-            runtime_series = np.array(df[" Runtime (Cycles)"]).reshape(-1, 1)
-            throughput = np.array(df[" Throughput (MACs/Cycle)"]).reshape(-1, 1)
-            energy = np.array(df[" Activity count-based Energy (nJ)"]).reshape(-1, 1)
-            area = np.array(df[" Area"]).reshape(-1, 1)
-            power = np.array(df[" Power"]).reshape(-1, 1)
-            l1_size = np.array(df[" L1 SRAM Size Req (Bytes)"]).reshape(-1, 1)
-            l2_size = np.array(df["  L2 SRAM Size Req (Bytes)"]).reshape(-1, 1)
-            l1_size_series = np.array(df[" L1 SRAM Size Req (Bytes)"]).reshape(-1, 1)
-            l2_size_series = np.array(df["  L2 SRAM Size Req (Bytes)"]).reshape(-1, 1)
-            l1_input_read = np.array(df[" input l1 read"]).reshape(-1, 1)
-            l1_input_write = np.array(df[" input l1 write"]).reshape(-1, 1)
-            l1_weight_read = np.array(df["filter l1 read"]).reshape(-1, 1)
-            l1_weight_write = np.array(df[" filter l1 write"]).reshape(-1, 1)
-            l1_output_read = np.array(df["output l1 read"]).reshape(-1, 1)
-            l1_output_write = np.array(df[" output l1 write"]).reshape(-1, 1)
-            l2_input_read = np.array(df[" input l2 read"]).reshape(-1, 1)
-            l2_input_write = np.array(df[" input l2 write"]).reshape(-1, 1)
-            l2_weight_read = np.array(df[" filter l2 read"]).reshape(-1, 1)
-            l2_weight_write = np.array(df[" filter l2 write"]).reshape(-1, 1)
-            l2_output_read = np.array(df[" output l2 read"]).reshape(-1, 1)
-            l2_output_write = np.array(df[" output l2 write"]).reshape(-1, 1)
-            mac = np.array(df[" Num MACs"]).reshape(-1, 1)
-            
-            activity_count = {}
-            activity_count["l1_input_read"] = l1_input_read
-            activity_count["l1_input_write"] = l1_input_write
-            activity_count["l1_weight_read"] = l1_weight_read
-            activity_count["l1_weight_write"] = l1_weight_write
-            activity_count["l1_output_read"] = l1_output_read
-            activity_count["l1_output_write"] = l1_output_write
-            activity_count["l2_input_read"] = l2_input_read
-            activity_count["l2_input_write"] = l2_input_write
-            activity_count["l2_weight_read"] = l2_weight_read
-            activity_count["l2_weight_write"] = l2_weight_write
-            activity_count["l2_output_read"] = l2_output_read
-            activity_count["l2_output_write"] = l2_output_write
-            activity_count["mac_activity"] = mac
-            area = self.compute_area_maestro(num_pe, l1_size, l2_size)
+            results = read_maestro_csv("{}.csv".format(m_file))
+            runtime = results["runtime"]
+            throughput = results["throughput"]
+            energy = results["energy"]
+            power = results["power"]
+            l1_size = results["l1_size"]
+            l2_size = results["l2_size"]
+            mac = results["mac"]
+            area = self.compute_area_maestro(num_pe, l1_size.max(), l2_size.max())
             self.observation = [np.mean(x) for x in [runtime, throughput, energy, area, l1_size, l2_size, mac, power, num_pe]]
             
         except Exception as e:
             print(e)
             #set all the return values to -1
             runtime = np.array([1e20])
-            runtime_series = -1
             throughput = np.array([-1])
             energy = np.array([-1])
             area = np.array([-1])
             power = -1
             l1_size = -1    
             l2_size = -1
-            l1_size_series = -1
-            l2_size_series = -1
-            activity_count = -1
             mac = -1
             self.observation = [np.mean(x) for x in [runtime, throughput, energy, area, l1_size, l2_size, mac, power, num_pe]]
             print("Error in reading csv file")
@@ -1415,6 +1403,26 @@ class helpers():
         # convert to numpy array
         flat_obs = np.asarray(flat_obs)
         return flat_obs
+
+    def parse_maestro_network(self, results, arch_configs):
+        '''
+        Observation of a whole network from the per-layer results of a
+        MaestroEngine: total runtime, network throughput, total energy and the
+        area of buffers that fit every layer
+        '''
+        network = MaestroEngine.aggregate(results)
+        if network is None:
+            print("Error in the maestro results of the network")
+            self.observation = [1e20, -1, -1, -1, -1, -1, -1, -1, arch_configs["num_pe"]]
+            return np.array([1e20, -1, -1, -1], dtype=float)
+
+        area = self.compute_area_maestro(arch_configs["num_pe"], network["l1_size"], network["l2_size"])
+        self.observation = [network["runtime"], network["throughput"], network["energy"], area,
+                            network["l1_size"], network["l2_size"], network["mac"], network["power"],
+                            arch_configs["num_pe"]]
+        obs = np.array([network["runtime"], network["throughput"], network["energy"], area], dtype=float)
+        print("[Env Helpers][Network observation: ]", obs)
+        return obs
     
     def decode_action_list_multiagent (self, action_list):
         return NotImplementedError
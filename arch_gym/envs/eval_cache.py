@@ -0,0 +1,337 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import sqlite3
+import numpy as np
+
+# Default location of the shared evaluation store. Every env (and every
+# process of a parallel sweep) pointing at the same file shares its hits.
+settings_file_path = os.path.realpath(__file__)
+settings_dir_path = os.path.dirname(settings_file_path)
+DEFAULT_CACHE_PATH = os.path.join(settings_dir_path, "../../logs/eval_cache.sqlite")
+
+_fingerprint_memo = {}
+
+
+def normalize_action(action):
+    '''
+    Converts an action (dict, list, numpy array or scalar) into a canonical,
+    JSON serialisable form so that equivalent designs hash to the same key.
+    Integral floats are folded into ints (GA agents emit 3.0 where RL
+    agents emit 3) and numpy types are converted to python builtins.
+    '''
+    if isinstance(action, dict):
+        return {str(k): normalize_action(v) for k, v in action.items()}
+    if isinstance(action, (list, tuple)):
+        return [normalize_action(v) for v in action]
+    if isinstance(action, np.ndarray):
+        return normalize_action(action.tolist())
+    if isinstance(action, np.generic):
+        return normalize_action(action.item())
+    if isinstance(action, float) and action.is_integer():
+        return int(action)
+    return action
+
+
+def fingerprint_files(*paths):
+    '''
+    Returns a content hash over the given files or directories. Used as the
+    simulator "version" so that rebuilding a binary or editing a static
+    config invalidates previously cached results. Only file names relative
+    to the given paths take part, so copies in different workspaces hash
+    alike. Missing paths are hashed by name so that environments without the
+    simulator installed still get a stable key.
+    '''
+    digest = hashlib.sha256()
+    for path in paths:
+        path = os.path.abspath(str(path))
+        if os.path.isdir(path):
+            files = []
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files.extend(os.path.join(root, name) for name in sorted(names))
+            base = path
+        else:
+            files = [path]
+            base = os.path.dirname(path)
+
+        for file_path in files:
+            # relative names, so that per-env workspace copies hash alike
+            digest.update(os.path.relpath(file_path, base).encode())
+            if not os.path.isfile(file_path):
+                digest.update(b"missing")
+                continue
+            stat = os.stat(file_path)
+            memo_key = (file_path, stat.st_mtime_ns, stat.st_size)
+            if memo_key not in _fingerprint_memo:
+                file_digest = hashlib.sha256()
+                with open(file_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        file_digest.update(chunk)
+                _fingerprint_memo[memo_key] = file_digest.hexdigest()
+            digest.update(_fingerprint_memo[memo_key].encode())
+    return digest.hexdigest()
+
+
+class EvaluationCache():
+    '''
+    Persistent, content-addressed store of simulator evaluations.
+
+    Entries are keyed by a hash of (simulator, simulator version, workload,
+    normalized action) and hold the pickled observation. The store is a
+    SQLite database in WAL mode so any number of processes can read and
+    write it concurrently. Eviction is least-recently-used and bounded by
+    max_entries and/or max_bytes. Hit/miss counters and the simulator time
+    saved by hits are kept in the database so they aggregate across every
+    process sharing the file.
+
+    Lookups are plain reads and never take the write lock: their hit/miss
+    counts and access times are kept in memory and written with the next
+    put(), or every flush_every lookups, stats() and close().
+    '''
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=None, max_bytes=None, timeout=60.0,
+                 flush_every=100):
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.flush_every = flush_every
+
+        # per-instance counters, the database holds the global ones
+        self.hits = 0
+        self.misses = 0
+
+        # bookkeeping of the lookups not written to the database yet
+        self._pending = {}
+        self._touched = {}
+
+        self._conn = None
+        self._pid = None
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connect()
+
+    def _connect(self):
+        # sqlite connections must not be shared across a fork
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        if self._pid is not None:
+            # a forked child: the pending lookups are the parent's to write
+            self._pending, self._touched = {}, {}
+
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS evaluations (
+                            key TEXT PRIMARY KEY,
+                            simulator TEXT,
+                            value BLOB,
+                            size INTEGER,
+                            sim_seconds REAL,
+                            created REAL,
+                            last_access REAL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS evaluations_lru ON evaluations(last_access)")
+        conn.execute("""CREATE TABLE IF NOT EXISTS counters (
+                            name TEXT PRIMARY KEY,
+                            value REAL)""")
+        self._conn = conn
+        self._pid = os.getpid()
+        return conn
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        state["_pid"] = None
+        state["_pending"] = {}
+        state["_touched"] = {}
+        return state
+
+    def key(self, simulator, action, version="", workload=""):
+        '''Canonical hash of a single evaluation'''
+        record = {
+            "simulator": simulator,
+            "version": version,
+            "workload": normalize_action(workload),
+            "action": normalize_action(action),
+        }
+        encoded = json.dumps(record, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def _bump(self, conn, name, amount):
+        conn.execute("INSERT INTO counters(name, value) VALUES (?, ?) "
+                     "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                     (name, amount))
+
+    def _count(self, name, amount):
+        self._pending[name] = self._pending.get(name, 0) + amount
+
+    def _write_pending(self, conn):
+        '''writes the pending lookup bookkeeping, inside a write transaction of conn'''
+        for name, amount in self._pending.items():
+            self._bump(conn, name, amount)
+        conn.executemany("UPDATE evaluations SET last_access = ? WHERE key = ?",
+                         [(access, key) for key, access in self._touched.items()])
+        self._pending, self._touched = {}, {}
+
+    def flush(self):
+        '''Writes the hit/miss counts and access times of the lookups since the last write'''
+        if not self._pending and not self._touched:
+            return
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_pending(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, key, default=None):
+        '''Returns the cached value for key or default on a miss'''
+        conn = self._connect()
+        row = conn.execute("SELECT value, sim_seconds FROM evaluations WHERE key = ?",
+                           (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            self._count("misses", 1)
+        else:
+            self.hits += 1
+            self._count("hits", 1)
+            self._count("saved_seconds", row[1] or 0.0)
+            self._touched[key] = time.time()
+        if self._pending.get("hits", 0) + self._pending.get("misses", 0) >= self.flush_every:
+            self.flush()
+        return default if row is None else pickle.loads(row[0])
+
+    def put(self, key, value, simulator="", sim_seconds=0.0):
+        '''Stores value under key and evicts least recently used entries if over budget'''
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_pending(conn)
+            conn.execute("INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, simulator, blob, len(blob), sim_seconds, now, now))
+            self._bump(conn, "sim_seconds", sim_seconds)
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn):
+        if self.max_entries is not None:
+            count = conn.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute("DELETE FROM evaluations WHERE key IN "
+                             "(SELECT key FROM evaluations ORDER BY last_access ASC LIMIT ?)",
+                             (excess,))
+                self._bump(conn, "evictions", excess)
+
+        if self.max_bytes is not None:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM evaluations").fetchone()[0]
+            if total > self.max_bytes:
+                evicted = 0
+                rows = conn.execute("SELECT key, size FROM evaluations ORDER BY last_access ASC").fetchall()
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM evaluations WHERE key = ?", (key,))
+                    total -= size
+                    evicted += 1
+                self._bump(conn, "evictions", evicted)
+
+    def evaluate(self, simulator, action, run_fn, version="", workload=""):
+        '''
+        Returns the cached result for this evaluation, or calls run_fn(),
+        stores its result and returns it. None results (failed runs) are
+        not cached.
+        '''
+        key = self.key(simulator, action, version, workload)
+        value = self.get(key)
+        if value is not None:
+            print("[EvaluationCache] Hit for", simulator)
+            return value
+
+        start = time.perf_counter()
+        value = run_fn()
+        elapsed = time.perf_counter() - start
+        if value is not None:
+            self.put(key, value, simulator, elapsed)
+        return value
+
+    async def evaluate_async(self, simulator, action, run_coro_fn, version="", workload=""):
+        '''
+        Same as evaluate, for envs that await their simulator. run_coro_fn()
+        returns the coroutine that runs the simulation.
+        '''
+        key = self.key(simulator, action, version, workload)
+        value = self.get(key)
+        if value is not None:
+            print("[EvaluationCache] Hit for", simulator)
+            return value
+
+        start = time.perf_counter()
+        value = await run_coro_fn()
+        elapsed = time.perf_counter() - start
+        if value is not None:
+            self.put(key, value, simulator, elapsed)
+        return value
+
+    def stats(self):
+        '''Global counters aggregated over every process sharing the store'''
+        self.flush()
+        conn = self._connect()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM evaluations").fetchone()
+        hits = int(counters.get("hits", 0))
+        misses = int(counters.get("misses", 0))
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "evictions": int(counters.get("evictions", 0)),
+            "entries": entries,
+            "bytes": size,
+            "sim_seconds": counters.get("sim_seconds", 0.0),
+            "saved_seconds": counters.get("saved_seconds", 0.0),
+            "saved_sim_hours": counters.get("saved_seconds", 0.0) / 3600.0,
+        }
+
+    def clear(self):
+        conn = self._connect()
+        self._pending, self._touched = {}, {}
+        conn.execute("DELETE FROM evaluations")
+        conn.execute("DELETE FROM counters")
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self.flush()
+            self._conn.close()
+        self._conn = None
+        self._pid = None
+
+
+def make_eval_cache(eval_cache):
+    '''Accepts an EvaluationCache, a path to one, True for the default store or None'''
+    if eval_cache is None or eval_cache is False:
+        return None
+    if isinstance(eval_cache, EvaluationCache):
+        return eval_cache
+    if eval_cache is True:
+        return EvaluationCache()
+    return EvaluationCache(str(eval_cache))
+
+
+# For testing
+if __name__ == "__main__":
+    cache = EvaluationCache("/tmp/arch_gym_eval_cache.sqlite", max_entries=2)
+    cache.clear()
+    action = {'PagePolicy': 'Open', 'RequestBufferSize': 8.0}
+    print(cache.evaluate("DRAMSys", action, lambda: np.array([[1.0, 2.0, 3.0]])))
+    print(cache.evaluate("DRAMSys", {'RequestBufferSize': 8, 'PagePolicy': 'Open'}, lambda: None))
+    print(cache.stats())
@@ -185,7 +185,11 @@ def make_maestro_env(seed: int = 12234,
                     reward_formulation = 'power',
                     reward_scaling = 'false',
                     max_steps: int = 100,
-                    num_agents: int = 10) -> dm_env.Environment:
+                    num_agents: int = 10,
+                    workload: str = 'resnet18',
+                    layer_id: int = 2,
+                    network: bool = False,
+                    num_workers: int = None) -> dm_env.Environment:
   """Returns DRAMSys environment."""
   print("[DEBUG][Seed]", seed)
   print("[DEBUG][RL Form]", rl_form)
@@ -199,7 +203,11 @@ def make_maestro_env(seed: int = 12234,
       max_steps = max_steps,
       num_agents = num_agents,
       reward_formulation = reward_formulation,
-      reward_scaling = reward_scaling
+      reward_scaling = reward_scaling,
+      workload = workload,
+      layer_id = layer_id,
+      network = network,
+      num_workers = num_workers
     ),
     env_wrapper_sel = rl_form
   )
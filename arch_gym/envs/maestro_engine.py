@@ -0,0 +1,193 @@
+import os
+import csv
+import shutil
+import tempfile
+import subprocess
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Fields of a maestro result row and the csv column each one is read from
+# (maestro pads its column names with spaces, they are compared stripped)
+MAESTRO_CSV_COLUMNS = [
+    ("runtime", "Runtime (Cycles)"),
+    ("throughput", "Throughput (MACs/Cycle)"),
+    ("energy", "Activity count-based Energy (nJ)"),
+    ("area", "Area"),
+    ("power", "Power"),
+    ("l1_size", "L1 SRAM Size Req (Bytes)"),
+    ("l2_size", "L2 SRAM Size Req (Bytes)"),
+    ("l1_input_read", "input l1 read"),
+    ("l1_input_write", "input l1 write"),
+    ("l1_weight_read", "filter l1 read"),
+    ("l1_weight_write", "filter l1 write"),
+    ("l1_output_read", "output l1 read"),
+    ("l1_output_write", "output l1 write"),
+    ("l2_input_read", "input l2 read"),
+    ("l2_input_write", "input l2 write"),
+    ("l2_weight_read", "filter l2 read"),
+    ("l2_weight_write", "filter l2 write"),
+    ("l2_output_read", "output l2 read"),
+    ("l2_output_write", "output l2 write"),
+    ("mac", "Num MACs"),
+]
+
+MAESTRO_RESULT_DTYPE = np.dtype([("layer", np.int64)] + [(field, np.float64) for field, _ in MAESTRO_CSV_COLUMNS])
+
+
+def maestro_command(exe, m_file, arch_configs):
+    '''Returns the maestro command line for the mapping in m_file (without the .m)'''
+    return [exe,
+            "--Mapping_file={}.m".format(m_file),
+            "--full_buffer=false",
+            "--noc_bw_cstr={}".format(arch_configs["NocBW"]),
+            "--noc_hops=1",
+            "--noc_hop_latency=1",
+            "--offchip_bw_cstr={}".format(arch_configs["offchipBW"]),
+            "--noc_mc_support=true",
+            "--num_pes={}".format(int(arch_configs["num_pe"])),
+            "--num_simd_lanes=1",
+            "--l1_size_cstr={}".format(arch_configs["l1_size"]),
+            "--l2_size_cstr={}".format(arch_configs["l2_size"]),
+            "--print_res=false",
+            "--print_res_csv_file=true",
+            "--print_log_file=false",
+            "--print_design_space=false",
+            "--msg_print_lv=0"]
+
+
+def read_maestro_csv(path, layer=0):
+    '''
+    Reads a maestro result csv into a structured array of MAESTRO_RESULT_DTYPE,
+    one record per row. Rows are numbered from layer on. Raises OSError,
+    KeyError or ValueError for a missing or malformed file.
+    '''
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader)]
+        columns = [header.index(column) for _, column in MAESTRO_CSV_COLUMNS]
+        rows = [(layer + i,) + tuple(float(row[c]) for c in columns)
+                for i, row in enumerate(reader) if row]
+    if not rows:
+        raise ValueError("{} has no results".format(path))
+    return np.array(rows, dtype=MAESTRO_RESULT_DTYPE)
+
+
+def failed_results(layers):
+    '''Results of layers that maestro could not evaluate: every field is nan'''
+    results = np.zeros(len(layers), dtype=MAESTRO_RESULT_DTYPE)
+    results["layer"] = layers
+    for field, _ in MAESTRO_CSV_COLUMNS:
+        results[field] = np.nan
+    return results
+
+
+# Private directory of a pool worker, set by _init_worker
+_worker_dir = None
+
+
+def _init_worker(root):
+    global _worker_dir
+    _worker_dir = tempfile.mkdtemp(prefix="worker_{}_".format(os.getpid()), dir=root)
+
+
+def _run_layer(exe, layer, mapping, arch_configs):
+    '''Runs maestro on the mapping of one layer inside the worker directory'''
+    m_file = os.path.join(_worker_dir, "layer_{}".format(layer))
+    try:
+        with open(m_file + ".m", "w") as f:
+            f.write(mapping)
+        subprocess.run(maestro_command(exe, m_file, arch_configs), stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, cwd=_worker_dir)
+        return read_maestro_csv(m_file + ".csv", layer)[:1]
+    except (OSError, KeyError, ValueError) as e:
+        print("[maestro_engine] layer {} failed: {}".format(layer, e))
+        return failed_results([layer])
+    finally:
+        for path in (m_file + ".m", m_file + ".csv"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class MaestroEngine():
+    '''
+    Evaluates all the layers of a network with maestro, one maestro run per
+    layer, in a pool of at most num_workers processes. Every worker writes
+    its mapping and result files to a private directory below root (a fresh
+    temporary directory by default), which is removed on close().
+
+    The step latency of a whole-network evaluation is thus about the
+    slowest layer instead of the sum over the layers. Layers with the same
+    mapping text are only simulated once.
+    '''
+    def __init__(self, exe, num_workers=None, root=None):
+        self.exe = exe
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.root = tempfile.mkdtemp(prefix="maestro_engine_", dir=root)
+        self.pool = ProcessPoolExecutor(max_workers=self.num_workers, mp_context=multiprocessing.get_context(),
+                                        initializer=_init_worker, initargs=(self.root,))
+
+    def submit(self, mappings, arch_configs):
+        '''
+        Launches the runs of mappings (one maestro mapping text per layer,
+        see helpers.render_maestro) and returns (futures, layer_futures)
+        where layer_futures[i] indexes the future of layer i
+        '''
+        futures, index, layer_futures = [], {}, []
+        for layer, mapping in enumerate(mappings):
+            # the network name line differs between layers, the rest does not
+            key = mapping.split("\n", 1)[-1]
+            if key not in index:
+                index[key] = len(futures)
+                futures.append(self.pool.submit(_run_layer, self.exe, layer, mapping, arch_configs))
+            layer_futures.append(index[key])
+        return futures, layer_futures
+
+    @staticmethod
+    def collect(results, layer_futures):
+        '''Per-layer results array from the results of the submitted runs'''
+        network_results = np.concatenate([results[i] for i in layer_futures])
+        network_results["layer"] = np.arange(len(layer_futures))
+        return network_results
+
+    def evaluate(self, mappings, arch_configs):
+        '''Structured array with the maestro results of every layer'''
+        futures, layer_futures = self.submit(mappings, arch_configs)
+        return self.collect([future.result() for future in futures], layer_futures)
+
+    async def evaluate_async(self, mappings, arch_configs):
+        '''Same as evaluate, but awaits the pool instead of blocking the event loop'''
+        futures, layer_futures = self.submit(mappings, arch_configs)
+        results = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        return self.collect(results, layer_futures)
+
+    @staticmethod
+    def aggregate(results):
+        '''
+        Network-level metrics of per-layer results: the layers run one after
+        the other, so runtime, energy and MACs add up while the buffers have
+        to fit the largest layer. None if any layer failed.
+        '''
+        if len(results) == 0 or np.isnan(results["runtime"]).any():
+            return None
+        runtime = results["runtime"].sum()
+        return {
+            "runtime": runtime,
+            "throughput": results["mac"].sum() / runtime,
+            "energy": results["energy"].sum(),
+            "power": results["power"].max(),
+            "l1_size": results["l1_size"].max(),
+            "l2_size": results["l2_size"].max(),
+            "mac": results["mac"].sum(),
+        }
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,187 @@
+import contextlib
+import json
+import os
+import resource
+import threading
+import time
+
+_PROC_IO = "/proc/self/io"
+
+
+def _io_counters():
+    '''(bytes read, bytes written) by this process so far, (0, 0) where unsupported'''
+    try:
+        with open(_PROC_IO, "rb") as f:
+            counters = dict(line.split(b":") for line in f.read().splitlines())
+        return int(counters[b"rchar"]), int(counters[b"wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def _children_cpu():
+    '''user + system CPU seconds of the finished subprocesses'''
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class NullProfiler():
+    '''Profiler that records nothing, used when profiling is off'''
+    enabled = False
+
+    def begin_step(self):
+        pass
+
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+    def end_step(self, info=None):
+        return info
+
+    def report(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+class StepProfiler():
+    '''
+    Per-phase timing of env steps.
+
+    An env brackets every step with begin_step()/end_step(info) and wraps
+    the parts of the step in phase(name), e.g. "render" (writing the
+    simulator configs), "simulate" (spawning and waiting for the simulator)
+    and "parse" (reading its outputs). For every phase the profiler records
+    wall time, CPU time of the subprocesses that finished during it and the
+    bytes this process read and wrote (Linux /proc/self/io; zero elsewhere).
+
+    end_step() attaches the phases of the step to info["profile"]. The
+    phases are also aggregated over all steps (report(), written to
+    report_path on close()) and, with trace_path, streamed as Chrome trace
+    events that chrome://tracing, Perfetto or speedscope can open as a
+    flamegraph.
+
+    A profiler is meant for one env; the subprocess CPU time is per process,
+    so envs stepping concurrently in one process share it.
+    '''
+    enabled = True
+
+    def __init__(self, trace_path=None, report_path=None):
+        self.trace_path = trace_path
+        self.report_path = report_path
+        self.trace_file = None
+        if trace_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(trace_path)), exist_ok=True)
+            # JSON array format: the closing bracket is optional, so the trace
+            # stays readable even if the process dies
+            self.trace_file = open(trace_path, "w")
+            self.trace_file.write("[\n")
+        self.totals = {}
+        self.steps = 0
+        self.current = None
+        self.step_start = None
+        self.pid = os.getpid()
+
+    def begin_step(self):
+        self.current = {}
+        self.step_start = self._sample()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = self._sample()
+        try:
+            yield
+        finally:
+            self._record(name, start, self._sample())
+
+    def end_step(self, info=None):
+        if self.step_start is None:
+            return info
+        end = self._sample()
+        self._record("step", self.step_start, end, in_step=False)
+        self.steps += 1
+        phases, self.current, self.step_start = self.current, None, None
+        if info is not None:
+            info["profile"] = phases
+        return info
+
+    def _sample(self):
+        read_bytes, write_bytes = _io_counters()
+        return time.perf_counter(), _children_cpu(), read_bytes, write_bytes
+
+    def _record(self, name, start, end, in_step=True):
+        record = {
+            "wall": end[0] - start[0],
+            "children_cpu": end[1] - start[1],
+            "read_bytes": end[2] - start[2],
+            "write_bytes": end[3] - start[3],
+        }
+        if in_step and self.current is not None:
+            # a phase can run several times in one step (e.g. once per layer)
+            if name in self.current:
+                record_sum = self.current[name]
+                for key in record:
+                    record_sum[key] += record[key]
+            else:
+                self.current[name] = dict(record)
+
+        total = self.totals.setdefault(name, {"count": 0, "wall": 0.0, "wall_max": 0.0,
+                                              "children_cpu": 0.0, "read_bytes": 0, "write_bytes": 0})
+        total["count"] += 1
+        total["wall"] += record["wall"]
+        total["wall_max"] = max(total["wall_max"], record["wall"])
+        total["children_cpu"] += record["children_cpu"]
+        total["read_bytes"] += record["read_bytes"]
+        total["write_bytes"] += record["write_bytes"]
+
+        if self.trace_file is not None:
+            event = {"name": name, "cat": "step" if not in_step else "phase", "ph": "X",
+                     "ts": start[0] * 1e6, "dur": record["wall"] * 1e6,
+                     "pid": self.pid, "tid": threading.get_ident(), "args": record}
+            self.trace_file.write(json.dumps(event) + ",\n")
+
+    def report(self):
+        '''Totals per phase, the most expensive phases first'''
+        report = {}
+        for name, total in sorted(self.totals.items(), key=lambda item: -item[1]["wall"]):
+            report[name] = dict(total, wall_mean=total["wall"] / total["count"])
+        return report
+
+    def format_report(self):
+        lines = ["{:<12} {:>7} {:>11} {:>11} {:>11} {:>13} {:>13}".format(
+            "phase", "count", "wall [s]", "mean [s]", "child cpu", "read [B]", "written [B]")]
+        for name, total in self.report().items():
+            lines.append("{:<12} {:>7} {:>11.3f} {:>11.4f} {:>11.3f} {:>13} {:>13}".format(
+                name, total["count"], total["wall"], total["wall_mean"], total["children_cpu"],
+                total["read_bytes"], total["write_bytes"]))
+        return "\n".join(lines)
+
+    def close(self):
+        if self.trace_file is not None:
+            self.trace_file.close()
+            self.trace_file = None
+        if self.report_path is not None:
+            with open(self.report_path, "w") as f:
+                json.dump({"steps": self.steps, "phases": self.report()}, f, indent=2)
+
+
+def make_profiler(profile, prefix="env_"):
+    '''
+    Profiler for an env: None/False for no profiling, True for in-memory
+    totals and info["profile"], a directory to also write a Chrome trace and
+    an aggregated report there, or a ready StepProfiler
+    '''
+    if profile is None or profile is False:
+        return NullProfiler()
+    if profile is True:
+        return StepProfiler()
+    if isinstance(profile, (StepProfiler, NullProfiler)):
+        return profile
+    os.makedirs(profile, exist_ok=True)
+    name = "{}{}_{}".format(prefix, os.getpid(), time.strftime("%Y%m%d-%H%M%S"))
+    base = os.path.join(profile, name)
+    n = 0
+    while os.path.exists(base + ".trace.json"):
+        n += 1
+        base = os.path.join(profile, "{}_{}".format(name, n))
+    return StepProfiler(trace_path=base + ".trace.json", report_path=base + ".report.json")
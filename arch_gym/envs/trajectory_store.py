@@ -0,0 +1,336 @@
+import json
+import multiprocessing.util
+import numbers
+import os
+
+import numpy as np
+
+SCHEMA_FILE = "schema.json"
+
+
+def flatten_record(record, prefix=""):
+    '''
+    Flattens nested dicts into {"action.PagePolicy": ..., "obs": ...} so that
+    every leaf becomes one column
+    '''
+    flat = {}
+    for key, value in record.items():
+        name = prefix + str(key)
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, name + "."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def _column(name, dtype, shape=()):
+    column = {"name": name, "dtype": np.dtype(dtype).str, "shape": list(shape)}
+    if column["dtype"] == np.dtype(str).str:
+        # strings are stored as int32 codes into a per-column vocabulary
+        column.update(dtype=np.dtype(np.int32).str, vocab=[])
+    return column
+
+
+def infer_column(name, value):
+    '''Column description for one (flattened) value'''
+    if isinstance(value, (str, np.str_)):
+        return _column(name, str)
+    if isinstance(value, (bool, np.bool_)):
+        return _column(name, np.bool_)
+    if isinstance(value, numbers.Integral):
+        return _column(name, np.int64)
+    if isinstance(value, numbers.Real):
+        return _column(name, np.float64)
+    value = np.asarray(value)
+    if value.dtype.kind in "USO":
+        raise ValueError("Column {} holds an array of {}, only numeric arrays are supported".format(
+            name, value.dtype))
+    return _column(name, value.dtype, value.shape)
+
+
+def schema_from_space(space, prefix=""):
+    '''
+    Columns for a gym space: Box and MultiDiscrete become fixed-shape array
+    columns, Discrete an int64 column, Dict and Tuple are flattened to
+    "<prefix>.<key>" and "<prefix>.<index>"
+    '''
+    kind = type(space).__name__
+    name = prefix.rstrip(".")
+    if kind == "Dict":
+        columns = []
+        for key, subspace in space.spaces.items():
+            columns += schema_from_space(subspace, prefix + str(key) + ".")
+        return columns
+    if kind == "Tuple":
+        columns = []
+        for i, subspace in enumerate(space.spaces):
+            columns += schema_from_space(subspace, prefix + str(i) + ".")
+        return columns
+    if kind == "Discrete":
+        return [_column(name, np.int64)]
+    if kind in ("Box", "MultiDiscrete", "MultiBinary"):
+        return [_column(name, space.dtype, space.shape)]
+    raise ValueError("Unsupported space {}".format(space))
+
+
+def env_schema(env, scalars=("reward",)):
+    '''
+    Schema of the records {"action": ..., "obs": ..., "reward": ...} logged
+    for env. Spaces that schema_from_space does not support are left out and
+    inferred from the first record instead.
+    '''
+    columns = []
+    for prefix, space in (("action.", env.action_space), ("obs.", env.observation_space)):
+        try:
+            columns += schema_from_space(space, prefix)
+        except ValueError:
+            pass
+    columns += [_column(name, np.float64) for name in scalars]
+    return columns
+
+
+class TrajectoryWriter():
+    '''
+    Append-only, columnar trajectory log.
+
+    Records (dicts, nested dicts are flattened) are buffered in memory and
+    every flush_every records appended to one raw binary file per column, so
+    a step costs a dict append instead of building a DataFrame and reopening
+    a CSV. The layout of a part directory is
+
+        schema.json    columns (name, dtype, shape, string vocab) and row count
+        c<i>.bin       rows of column i, back to back
+
+    schema.json is replaced atomically after the column files are written, so
+    readers (and a writer reopening the part) never see a half written batch:
+    bytes beyond the recorded row count are ignored and truncated on reopen.
+
+    The schema comes from the schema argument (see schema_from_space and
+    env_schema) or, for the columns it does not cover, from the first record.
+    Later records must have the same columns, with values of the same type and
+    shape: append() raises ValueError for a record that does not fit, before
+    it is buffered, so a bad record never reaches (and breaks) a flush.
+
+    Every process should write its own part: TrajectoryWriter(root) appends to
+    root/part-<pid>, TrajectoryReader(root) reads all of them back.
+    '''
+    def __init__(self, root, schema=None, flush_every=1024, part=None):
+        if part is None:
+            part = "part-{}".format(os.getpid())
+        self.dir = os.path.join(root, part)
+        os.makedirs(self.dir, exist_ok=True)
+        self.flush_every = flush_every
+        self.buffer = []
+        self.closed = False
+
+        schema_path = os.path.join(self.dir, SCHEMA_FILE)
+        reopened = os.path.exists(schema_path)
+        if reopened:
+            with open(schema_path, "r") as f:
+                stored = json.load(f)
+            self.columns, self.rows = stored["columns"], stored["rows"]
+            for i, column in enumerate(self.columns):
+                with open(self.column_path(i), "ab") as f:
+                    f.truncate(self.rows * _row_bytes(column))
+        else:
+            self.columns = list(schema) if schema else []
+            self.rows = 0
+        self._index()
+        self.complete = reopened
+
+    def _index(self):
+        self.names = {column["name"]: i for i, column in enumerate(self.columns)}
+        self.codes = [None if "vocab" not in column else {s: c for c, s in enumerate(column["vocab"])}
+                      for column in self.columns]
+
+    def column_path(self, i):
+        return os.path.join(self.dir, "c{}.bin".format(i))
+
+    def append(self, record):
+        if self.closed:
+            raise ValueError("append() on a closed TrajectoryWriter")
+        flat = flatten_record(record)
+        n_columns = len(self.columns)
+        if not self.complete:
+            # first record: fill in the columns the schema did not cover
+            for name, value in flat.items():
+                if name not in self.names:
+                    self.columns.append(infer_column(name, value))
+            self._index()
+        try:
+            if len(flat) != len(self.columns) or any(name not in self.names for name in flat):
+                raise ValueError("Record columns {} do not match the schema {}".format(
+                    sorted(flat), sorted(self.names)))
+            row = {name: self._coerce(self.names[name], value) for name, value in flat.items()}
+        except ValueError:
+            if not self.complete:
+                # the schema is not completed from a record that is rejected
+                del self.columns[n_columns:]
+                self._index()
+            raise
+        self.complete = True
+        self.buffer.append(row)
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def _coerce(self, i, value):
+        '''value converted to the type of column i, ValueError if it does not fit'''
+        column = self.columns[i]
+        if self.codes[i] is not None:
+            if not isinstance(value, (str, np.str_)):
+                raise ValueError("Column {} holds strings, got {!r}".format(column["name"], value))
+            return str(value)
+        dtype = np.dtype(column["dtype"])
+        array = np.asarray(value)
+        if not np.can_cast(array.dtype, dtype, casting="same_kind"):
+            raise ValueError("Column {} is {}, got values of type {}".format(
+                column["name"], dtype, array.dtype))
+        if array.shape != tuple(column["shape"]):
+            raise ValueError("Column {} has shape {}, got {}".format(
+                column["name"], tuple(column["shape"]), array.shape))
+        return array.astype(dtype)
+
+    def _encode(self, i, values):
+        column = self.columns[i]
+        codes = self.codes[i]
+        if codes is not None:
+            for value in values:
+                if value not in codes:
+                    codes[value] = len(column["vocab"])
+                    column["vocab"].append(value)
+            values = [codes[value] for value in values]
+        array = np.asarray(values, dtype=column["dtype"])
+        return np.ascontiguousarray(array.reshape((len(values),) + tuple(column["shape"])))
+
+    def flush(self):
+        if not self.buffer:
+            return
+        arrays = [self._encode(i, [row[column["name"]] for row in self.buffer])
+                  for i, column in enumerate(self.columns)]
+        for i, array in enumerate(arrays):
+            with open(self.column_path(i), "ab") as f:
+                f.write(array.tobytes())
+        self.rows += len(self.buffer)
+        self.buffer = []
+
+        tmp_path = os.path.join(self.dir, SCHEMA_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"columns": self.columns, "rows": self.rows}, f)
+        os.replace(tmp_path, os.path.join(self.dir, SCHEMA_FILE))
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _row_bytes(column):
+    return np.dtype(column["dtype"]).itemsize * int(np.prod(column["shape"], dtype=np.int64))
+
+
+class TrajectoryReader():
+    '''
+    Reads back the parts written by TrajectoryWriter under root.
+
+    read_part() memory-maps the columns of one part without loading them,
+    column() concatenates one column over all parts, iter_batches() streams
+    fixed-size DataFrames and to_pandas() loads everything (string columns
+    become categoricals).
+    '''
+    def __init__(self, root):
+        self.root = root
+        self.parts = sorted(entry for entry in os.listdir(root)
+                            if os.path.exists(os.path.join(root, entry, SCHEMA_FILE)))
+
+    def schema(self, part):
+        with open(os.path.join(self.root, part, SCHEMA_FILE), "r") as f:
+            return json.load(f)
+
+    def read_part(self, part):
+        '''{column name: np.memmap} of one part'''
+        stored = self.schema(part)
+        columns = {}
+        for i, column in enumerate(stored["columns"]):
+            shape = (stored["rows"],) + tuple(column["shape"])
+            if stored["rows"] == 0:
+                columns[column["name"]] = np.empty(shape, dtype=column["dtype"])
+            else:
+                columns[column["name"]] = np.memmap(os.path.join(self.root, part, "c{}.bin".format(i)),
+                                                    dtype=column["dtype"], mode="r", shape=shape)
+        return columns
+
+    def __len__(self):
+        return sum(self.schema(part)["rows"] for part in self.parts)
+
+    def column(self, name):
+        '''One column over all parts, strings decoded'''
+        values = []
+        for part in self.parts:
+            stored = self.schema(part)
+            column = next(c for c in stored["columns"] if c["name"] == name)
+            data = self.read_part(part)[name]
+            if "vocab" in column:
+                data = np.asarray(column["vocab"], dtype=object)[data]
+            values.append(np.asarray(data))
+        return np.concatenate(values)
+
+    def iter_batches(self, batch_size=65536):
+        '''Yields DataFrames of at most batch_size rows'''
+        for part in self.parts:
+            stored = self.schema(part)
+            data = self.read_part(part)
+            for start in range(0, stored["rows"], batch_size):
+                yield self._frame(stored["columns"], data, slice(start, start + batch_size))
+
+    def to_pandas(self):
+        import pandas as pd
+        frames = list(self.iter_batches(batch_size=np.iinfo(np.int64).max))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def _frame(columns, data, rows):
+        import pandas as pd
+        frame = {}
+        for column in columns:
+            values = np.asarray(data[column["name"]][rows])
+            if "vocab" in column:
+                frame[column["name"]] = pd.Categorical.from_codes(values, categories=column["vocab"])
+            elif values.ndim > 1:
+                # array columns (e.g. the observation vector) as one cell per row
+                frame[column["name"]] = list(values)
+            else:
+                frame[column["name"]] = values
+        return pd.DataFrame(frame)
+
+
+_writers = {}
+
+
+def get_writer(root, schema=None, flush_every=1024):
+    '''
+    Process-wide writer for root, created on first use and flushed when the
+    process exits (including multiprocessing workers, which skip atexit)
+    '''
+    key = (os.path.abspath(root), os.getpid())
+    if key not in _writers:
+        writer = TrajectoryWriter(root, schema=schema, flush_every=flush_every)
+        multiprocessing.util.Finalize(writer, writer.close, exitpriority=10)
+        _writers[key] = writer
+    return _writers[key]
+
+
+def read_trajectories(root):
+    '''Convenience: the whole trajectory log under root as a DataFrame'''
+    return TrajectoryReader(root).to_pandas()
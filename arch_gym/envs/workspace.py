@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+
+# Default parent of the per-environment sandboxes
+settings_file_path = os.path.realpath(__file__)
+settings_dir_path = os.path.dirname(settings_file_path)
+DEFAULT_WORKSPACE_ROOT = os.path.join(settings_dir_path, "../../logs/workspaces")
+
+
+class Workspace():
+    '''
+    Private sandbox for one environment instance.
+
+    Simulators in arch_gym read their configs from, and write their results
+    to, fixed paths inside the checkout. A workspace mirrors those inputs into
+    its own directory: directory trees are recreated with every file symlinked
+    to the original (cheap, read-only), and files the environment rewrites are
+    turned into real copies on demand with writable() (copy-on-write). Output
+    directories are created inside the sandbox. Removing the directory on
+    close() cleans up everything the environment produced.
+    '''
+    def __init__(self, root=None, prefix="arch_gym_", keep=False):
+        if root is None:
+            root = DEFAULT_WORKSPACE_ROOT
+        os.makedirs(root, exist_ok=True)
+        self.dir = tempfile.mkdtemp(prefix=prefix, dir=root)
+        self.keep = keep
+
+    def path(self, *parts):
+        '''Path inside the workspace'''
+        return os.path.join(self.dir, *parts)
+
+    def makedirs(self, *parts):
+        '''Creates (if needed) and returns a directory inside the workspace'''
+        path = self.path(*parts)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def mirror(self, src, name=None):
+        '''
+        Mirrors src (file or directory) into the workspace by symlinking
+        files. Returns the mirrored path.
+        '''
+        src = os.path.abspath(src)
+        dst = self.path(name or os.path.basename(src))
+        if os.path.isdir(src):
+            for root, dirs, files in os.walk(src):
+                rel = os.path.relpath(root, src)
+                os.makedirs(os.path.join(dst, rel), exist_ok=True)
+                for f in files:
+                    link = os.path.join(dst, rel, f)
+                    if not os.path.lexists(link):
+                        os.symlink(os.path.join(root, f), link)
+        else:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if not os.path.lexists(dst):
+                os.symlink(src, dst)
+        return dst
+
+    def copy(self, src, name=None):
+        '''Copies src (file or directory) into the workspace. Returns the copied path.'''
+        src = os.path.abspath(src)
+        dst = self.path(name or os.path.basename(src))
+        if os.path.isdir(src):
+            shutil.copytree(src, dst, dirs_exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copy(src, dst)
+        return dst
+
+    def writable(self, path):
+        '''Replaces a mirrored symlink by a private copy so that it can be modified'''
+        if os.path.islink(path):
+            target = os.path.realpath(path)
+            os.remove(path)
+            shutil.copy(target, path)
+        return path
+
+    def close(self):
+        if not self.keep:
+            shutil.rmtree(self.dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def make_workspace(workspace, prefix="arch_gym_"):
+    '''Accepts a Workspace, a parent directory for one, True for the default root or None'''
+    if workspace is None or workspace is False:
+        return None
+    if isinstance(workspace, Workspace):
+        return workspace
+    if workspace is True:
+        return Workspace(prefix=prefix)
+    return Workspace(str(workspace), prefix=prefix)
+
+
+# For testing
+if __name__ == "__main__":
+    with Workspace("/tmp/arch_gym_workspaces") as ws:
+        configs = ws.mirror(os.path.join(settings_dir_path, "../../configs/sims"), "sims")
+        config = ws.writable(os.path.join(configs, "DRAMSys_config.py"))
+        print(ws.dir, os.path.islink(config), sorted(os.listdir(configs)))
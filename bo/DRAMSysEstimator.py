@@ -5,6 +5,7 @@ import json
 from arch_gym.envs.envHelpers import helpers
 from arch_gym.envs.DRAMEnv import DRAMEnv
 from arch_gym.envs.dramsys_wrapper import make_dramsys_env
+from arch_gym.envs.trajectory_store import get_writer
 import configparser
 import envlogger
 import sys
@@ -94,6 +95,7 @@ class DRAMSysEstimator(BaseEstimator):
         log_dir = config.get("experiment_configuration", "log_dir")
         reward_formulation = config.get("experiment_configuration", "reward_formulation")
         use_envlogger = config.get("experiment_configuration", "use_envlogger")
+        log_format = config.get("experiment_configuration", "log_format", fallback="csv")
 
         env_wrapper = make_dramsys_env(reward_formulation = reward_formulation)
         
@@ -117,7 +119,10 @@ class DRAMSysEstimator(BaseEstimator):
 
         # logging twice due to the cv. So we will track the bo_steps and log only once
         if self.bo_steps == 1:
-            self.log_fitness_to_csv(log_dir)
+            if log_format == "columnar":
+                self.log_fitness_to_store(log_dir)
+            else:
+                self.log_fitness_to_csv(log_dir)
 
         # clear the self.fitness_hist
         self.fitness_hist = []
@@ -197,6 +202,14 @@ class DRAMSysEstimator(BaseEstimator):
         df = pd.DataFrame([self.fitness_hist])
         csvfile = os.path.join(filename, "actions.csv")
         df.to_csv(csvfile, index=False, header=False, mode='a')
+
+    def log_fitness_to_store(self, filename):
+        # one typed column per action/obs field, flushed in batches
+        try:
+            get_writer(os.path.join(filename, "trajectory")).append(self.fitness_hist)
+        except Exception as e:
+            # a logging problem must not abort the search
+            logging.error('Could not log to the columnar trajectory store: %s', e)
                
 
 
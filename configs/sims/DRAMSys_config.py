@@ -16,6 +16,7 @@ os.sys.path.insert(0, proj_root_path  + "/arch_gym/envs")
 ##############################
 #   DRAMSys Configurations   #
 ##############################
+dram_resources_dir = os.path.join(proj_root_path, "sims/DRAM/DRAMSys/library/resources")
 dram_mem_controller_config = os.path.join(proj_root_path, "sims/DRAM/DRAMSys/library/resources/configs/mcconfigs")
 dram_mem_controller_config_file = os.path.join(dram_mem_controller_config, "policy.json")
 binary_name = "DRAMSys"
@@ -0,0 +1,206 @@
+import os
+import sys
+import time
+import numpy as np
+
+from absl import flags
+from absl import app
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sko.GA import GA, RCGA
+from sko.operators import crossover, mutation, selection
+
+# Define flags
+
+flags.DEFINE_integer('size_pop', 10000, 'Population size')
+flags.DEFINE_integer('n_dim', 20, 'Number of variables')
+flags.DEFINE_float('precision', 1e-7, 'Precision of the variables (sets the chromosome length of GA)')
+flags.DEFINE_integer('len_tsp', 50, 'Number of points of the TSP chromosomes')
+flags.DEFINE_integer('repeat', 3, 'Runs per operator, the best one is reported')
+
+FLAGS = flags.FLAGS
+
+
+# The per-individual implementations the vectorized operators replaced, as reference
+
+def loop_chrom2x(self, Chrom):
+    cumsum_len_segment = self.Lind.cumsum()
+    X = np.zeros(shape=(self.size_pop, self.n_dim))
+    for i, j in enumerate(cumsum_len_segment):
+        if i == 0:
+            Chrom_temp = Chrom[:, :cumsum_len_segment[0]]
+        else:
+            Chrom_temp = Chrom[:, cumsum_len_segment[i - 1]:cumsum_len_segment[i]]
+        X[:, i] = self.gray2rv(Chrom_temp)
+    return self.lb + (self.ub - self.lb) * X
+
+
+def loop_selection_tournament(self, tourn_size=3):
+    FitV = self.FitV
+    sel_index = []
+    for i in range(self.size_pop):
+        aspirants_index = np.random.randint(self.size_pop, size=tourn_size)
+        sel_index.append(max(aspirants_index, key=lambda i: FitV[i]))
+    self.Chrom = self.Chrom[sel_index, :]
+    return self.Chrom
+
+
+def loop_crossover_1point(self):
+    for i in range(0, self.size_pop, 2):
+        n = np.random.randint(0, self.len_chrom)
+        seg1, seg2 = self.Chrom[i, n:].copy(), self.Chrom[i + 1, n:].copy()
+        self.Chrom[i, n:], self.Chrom[i + 1, n:] = seg2, seg1
+    return self.Chrom
+
+
+def loop_crossover_2point(self):
+    for i in range(0, self.size_pop, 2):
+        n1, n2 = np.random.randint(0, self.len_chrom, 2)
+        if n1 > n2:
+            n1, n2 = n2, n1
+        seg1, seg2 = self.Chrom[i, n1:n2].copy(), self.Chrom[i + 1, n1:n2].copy()
+        self.Chrom[i, n1:n2], self.Chrom[i + 1, n1:n2] = seg2, seg1
+    return self.Chrom
+
+
+def loop_crossover_2point_bit(self):
+    half_size_pop = int(self.size_pop / 2)
+    Chrom1, Chrom2 = self.Chrom[:half_size_pop], self.Chrom[half_size_pop:]
+    mask = np.zeros(shape=(half_size_pop, self.len_chrom), dtype=int)
+    for i in range(half_size_pop):
+        n1, n2 = np.random.randint(0, self.len_chrom, 2)
+        if n1 > n2:
+            n1, n2 = n2, n1
+        mask[i, n1:n2] = 1
+    mask2 = (Chrom1 ^ Chrom2) & mask
+    Chrom1 ^= mask2
+    Chrom2 ^= mask2
+    return self.Chrom
+
+
+def loop_crossover_pmx(self):
+    for i in range(0, self.size_pop, 2):
+        Chrom1, Chrom2 = self.Chrom[i], self.Chrom[i + 1]
+        cxpoint1, cxpoint2 = np.random.randint(0, self.len_chrom - 1, 2)
+        if cxpoint1 >= cxpoint2:
+            cxpoint1, cxpoint2 = cxpoint2, cxpoint1 + 1
+        pos1_recorder = {value: idx for idx, value in enumerate(Chrom1)}
+        pos2_recorder = {value: idx for idx, value in enumerate(Chrom2)}
+        for j in range(cxpoint1, cxpoint2):
+            value1, value2 = Chrom1[j], Chrom2[j]
+            pos1, pos2 = pos1_recorder[value2], pos2_recorder[value1]
+            Chrom1[j], Chrom1[pos1] = Chrom1[pos1], Chrom1[j]
+            Chrom2[j], Chrom2[pos2] = Chrom2[pos2], Chrom2[j]
+            pos1_recorder[value1], pos1_recorder[value2] = pos1, j
+            pos2_recorder[value1], pos2_recorder[value2] = j, pos2
+    return self.Chrom
+
+
+def loop_mutation_reverse(self):
+    for i in range(self.size_pop):
+        if np.random.rand() < self.prob_mut:
+            self.Chrom[i] = mutation.reverse(self.Chrom[i])
+    return self.Chrom
+
+
+def loop_mutation_swap(self):
+    for i in range(self.size_pop):
+        if np.random.rand() < self.prob_mut:
+            self.Chrom[i] = mutation.swap(self.Chrom[i])
+    return self.Chrom
+
+
+def loop_crossover_SBX(self):
+    Chrom = self.Chrom
+    for i in range(0, self.size_pop, 2):
+        if np.random.random() > self.prob_cros:
+            continue
+        for j in range(len(Chrom[0])):
+            y1, y2 = Chrom[i][j], Chrom[i + 1][j]
+            r = np.random.random()
+            if r <= 0.5:
+                betaq = (2 * r) ** (1.0 / (1 + 1.0))
+            else:
+                betaq = (0.5 / (1.0 - r)) ** (1.0 / (1 + 1.0))
+            Chrom[i][j] = min(max(0.5 * ((1 + betaq) * y1 + (1 - betaq) * y2), 0), 1)
+            Chrom[i + 1][j] = min(max(0.5 * ((1 - betaq) * y1 + (1 + betaq) * y2), 0), 1)
+    return self.Chrom
+
+
+def loop_mutation_polynomial(self):
+    Chrom = self.Chrom
+    for i in range(self.size_pop):
+        for j in range(self.n_dim):
+            if np.random.random() <= self.prob_mut:
+                y = Chrom[i][j]
+                r = np.random.random()
+                if r <= 0.5:
+                    deltaq = (2.0 * r + (1.0 - 2.0 * r) * ((1.0 - y) ** 2)) ** 0.5 - 1.0
+                else:
+                    deltaq = 1.0 - (2.0 * (1.0 - r) + 2.0 * (r - 0.5) * (y ** 2)) ** 0.5
+                Chrom[i][j] = min(1, max(y + deltaq, 0))
+    return self.Chrom
+
+
+def best_time(operator, ga, reset):
+    times = []
+    for _ in range(FLAGS.repeat):
+        reset(ga)
+        start = time.perf_counter()
+        operator(ga)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(_):
+    objective = lambda x: np.sum(x ** 2)
+    size_pop = FLAGS.size_pop - FLAGS.size_pop % 2
+
+    ga = GA(func=objective, n_dim=FLAGS.n_dim, size_pop=size_pop, max_iter=1, lb=-1, ub=1,
+            precision=FLAGS.precision)
+    bits = ga.Chrom.copy()
+    FitV = np.random.rand(size_pop)
+
+    def reset_bits(ga_):
+        ga_.Chrom, ga_.FitV = bits.copy(), FitV
+
+    ga_tsp = GA(func=objective, n_dim=1, size_pop=size_pop, max_iter=1)
+    ga_tsp.len_chrom, ga_tsp.n_dim, ga_tsp.prob_mut = FLAGS.len_tsp, FLAGS.len_tsp, 0.1
+    routes = np.random.rand(size_pop, FLAGS.len_tsp).argsort(axis=1)
+
+    def reset_routes(ga_):
+        ga_.Chrom = routes.copy()
+
+    rcga = RCGA(func=objective, n_dim=FLAGS.n_dim, size_pop=size_pop, max_iter=1, prob_mut=0.1, lb=-1, ub=1)
+    reals = rcga.Chrom.copy()
+
+    def reset_reals(ga_):
+        ga_.Chrom = reals.copy()
+
+    benchmarks = [
+        ("chrom2x (gray decoding)", ga, reset_bits,
+         lambda g: loop_chrom2x(g, g.Chrom), lambda g: g.chrom2x(g.Chrom)),
+        ("selection_tournament", ga, reset_bits, loop_selection_tournament, selection.selection_tournament),
+        ("crossover_1point", ga, reset_bits, loop_crossover_1point, crossover.crossover_1point),
+        ("crossover_2point", ga, reset_bits, loop_crossover_2point, crossover.crossover_2point),
+        ("crossover_2point_bit", ga, reset_bits, loop_crossover_2point_bit, crossover.crossover_2point_bit),
+        ("crossover_pmx", ga_tsp, reset_routes, loop_crossover_pmx, crossover.crossover_pmx),
+        ("mutation_reverse", ga_tsp, reset_routes, loop_mutation_reverse, mutation.mutation_reverse),
+        ("mutation_swap", ga_tsp, reset_routes, loop_mutation_swap, mutation.mutation_swap),
+        ("RCGA crossover_SBX", rcga, reset_reals, loop_crossover_SBX, RCGA.crossover_SBX),
+        ("RCGA mutation", rcga, reset_reals, loop_mutation_polynomial, RCGA.mutation),
+    ]
+
+    print("size_pop: {}, GA chromosome: {} genes, TSP chromosome: {} genes".format(
+        size_pop, ga.len_chrom, FLAGS.len_tsp))
+    print("{:<26} {:>12} {:>12} {:>9}".format("operator", "loop [s]", "numpy [s]", "speedup"))
+    for name, ga_, reset, loop_operator, operator in benchmarks:
+        loop_time = best_time(loop_operator, ga_, reset)
+        vectorized_time = best_time(operator, ga_, reset)
+        print("{:<26} {:>12.4f} {:>12.4f} {:>8.1f}x".format(
+            name, loop_time, vectorized_time, loop_time / vectorized_time))
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -5,15 +5,17 @@ SCRIPT_DIR=$(dirname "$(realpath $0)")
 
 # Absolute paths to useful directories
 BINARY="${SCRIPT_DIR:?}"/astrasim-archgym/astra-sim/build/astra_analytical/build/AnalyticalAstra/bin/AnalyticalAstra
-SYSTEM="${SCRIPT_DIR:?}"/general_system.txt
-NETWORK="${SCRIPT_DIR:?}"/general_network.json
+# System/network configs and the stats folder can be redirected to a
+# per-environment workspace through ASTRASIM_SYSTEM, ASTRASIM_NETWORK and ASTRASIM_STATS
+SYSTEM="${ASTRASIM_SYSTEM:-${SCRIPT_DIR:?}/general_system.txt}"
+NETWORK="${ASTRASIM_NETWORK:-${SCRIPT_DIR:?}/general_network.json}"
 WORKLOAD="${SCRIPT_DIR:?}"/astrasim-archgym/themis/inputs/workload/$3
 
 echo "SH NETWORK: ${NETWORK}"
 echo "SH SYSTEM: ${SYSTEM}"
 echo "SH WORKLOAD: ${WORKLOAD}"
 
-STATS="${SCRIPT_DIR:?}"/results/run_general
+STATS="${ASTRASIM_STATS:-${SCRIPT_DIR:?}/results/run_general}"
 
 rm -rf "${STATS}"
 mkdir "${STATS}"
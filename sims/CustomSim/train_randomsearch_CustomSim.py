@@ -20,6 +20,7 @@ import pandas as pd
 
 from vizier._src.algorithms.designers.random import RandomDesigner
 from arch_gym.envs import customenv_wrapper
+from arch_gym.envs.trajectory_store import get_writer
 from vizier.service import clients
 from vizier.service import pyvizier as vz
 from vizier.service import vizier_server
@@ -35,6 +36,7 @@ flags.DEFINE_bool('use_envlogger', False, 'Use envlogger to log the data.')
 flags.DEFINE_string('summary_dir', '.', 'Directory to save the summary.')
 flags.DEFINE_string('reward_formulation', 'power', 'Which reward formulation to use?')
 flags.DEFINE_integer('seed', 110, 'random_search_hyperparameter')
+flags.DEFINE_enum('log_format', 'csv', ['csv', 'columnar'], 'Log steps to csv files or to a columnar trajectory store.')
 FLAGS = flags.FLAGS
 
 def log_fitness_to_csv(filename, fitness_dict):
@@ -53,6 +55,19 @@ def log_fitness_to_csv(filename, fitness_dict):
     csvfile = os.path.join(filename, "trajectory.csv")
     df.to_csv(csvfile, index=False, header=False, mode='a')
 
+def log_fitness_to_store(filename, fitness_dict):
+    """Logs fitness history to a columnar trajectory store
+
+    Args:
+        filename (str): path to the log directory
+        fitness_dict (dict): dictionary containing the fitness history
+    """
+    try:
+        get_writer(os.path.join(filename, "trajectory")).append(fitness_dict)
+    except Exception as e:
+        # a logging problem must not abort the search
+        logging.error('Could not log to the columnar trajectory store: %s', e)
+
 def wrap_in_envlogger(env, envlogger_dir):
     """Wraps the environment in envlogger
 
@@ -166,7 +181,10 @@ def main(_):
         if count == FLAGS.num_steps:
             done = True
 
-        log_fitness_to_csv(log_path, fitness_hist)
+        if FLAGS.log_format == "columnar":
+            log_fitness_to_store(log_path, fitness_hist)
+        else:
+            log_fitness_to_csv(log_path, fitness_hist)
         print("Observation: ",obs)
         final_measurement = vz.Measurement({'Reward': reward})
         suggestion = suggestion.to_trial()
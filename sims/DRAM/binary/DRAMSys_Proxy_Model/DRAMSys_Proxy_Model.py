@@ -1,14 +1,35 @@
 import os
 import pickle
 import joblib
+import numpy as np
 import pandas as pd
 from sklearn.preprocessing import OneHotEncoder, LabelEncoder
 from sklearn.metrics import mean_squared_error
 from scipy.special import inv_boxcox
 
+# Artifacts loaded by any DRAMSysProxyModel in this process, keyed by
+# (path, mmap_mode), so that constructing a new model object is free.
+_loaded_artifacts = {}
+
+
+def _load_artifact(path, mmap_mode=None):
+  key = (path, mmap_mode)
+  if key not in _loaded_artifacts:
+    if mmap_mode is not None:
+      # joblib can memory-map the numpy buffers of scalers and tree ensembles
+      _loaded_artifacts[key] = joblib.load(path, mmap_mode=mmap_mode)
+    else:
+      with open(path, 'rb') as f:
+        _loaded_artifacts[key] = pickle.load(f)
+  return _loaded_artifacts[key]
+
+
 class DRAMSysProxyModel:
 
-  def __init__(self) -> None:
+  categorical_variables = ['Arbiter','PagePolicy','RefreshPolicy', 'RespQueue', 'Scheduler','SchedulerBuffer']
+  numerical_variables = ['MaxActiveTransactions', 'RefreshMaxPostponed', 'RefreshMaxPulledin', 'RequestBufferSize']
+
+  def __init__(self, mmap_mode=None) -> None:
     self.model_directory = os.path.join(os.path.dirname(__file__), 'models')
     self.transformer_directory = os.path.join(os.path.dirname(__file__), 'transformers')
     self.energy_model_name = 'energy_model.pkl'
@@ -24,113 +45,128 @@ class DRAMSysProxyModel:
                                     'label_encoder_Scheduler.pkl',
                                     'label_encoder_SchedulerBuffer.pkl']
     self.latency_lambda = 0.0
+    self.mmap_mode = mmap_mode
+    self.loaded = False
 
-  def run_proxy_model(self, actions):
-
-    '''Load models, transforms features, predicts energy/power/latency, 
-        inverse transforms predictions, then returns prediction.
-    
-      Args:
-        energy_model_name (str): file name of energy model 
-        latency_model_name (str): file name of latency model
-        power_model_name (str): file name of power model
-        actions (pd.DataFrame): dataframe of features used to make a prediction
-        numeric_data_transformer_name (str): file name holding numeric transformer data
-        target_data_transformer_name (str): file name holding target transformer data
-        one_hot_encoder_name (str): file name holding one hot encoder transformer data
-        label_encoder_name_list (list): list holding file names holding label encoder
-          transformer for each categorical feature. Must be passed in this order:
-            0.) 'Arbiter' 1.) 'PagePolicy' 2.) 'RefreshPolicy' 3.) 'RespQueue' 4.) 'Scheduler' 5.) 'SchedulerBuffer'
-        model_directory (str): directory name holding model files
-        transformer_directory (str): directory name holding model data transformers
-        latency_lambda (float): boxcox lambda value used to transform latency
-
-      Returns:
-        predicted: pd.DataFrame consisting of Energy, Power, and Latency columns
+  def load(self):
+    '''Loads models and transformers once. Later calls are no-ops.
+       If mmap_mode is set (e.g. 'r') it is passed to joblib.load so that the
+       numpy buffers of the artifacts are memory-mapped instead of copied.
     '''
-    # Set Categorical and Numerical Variables
-    categorical_variables = ['Arbiter','PagePolicy','RefreshPolicy', 'RespQueue', 'Scheduler','SchedulerBuffer']
-    numerical_variables = ['MaxActiveTransactions', 'RefreshMaxPostponed', 'RefreshMaxPulledin', 'RequestBufferSize']	
-
-    # Create path to model
-    energy_path = os.path.join(self.model_directory, self.energy_model_name)
-    power_path = os.path.join(self.model_directory, self.power_model_name)
-    latency_path = os.path.join(self.model_directory, self.latency_model_name)
+    if self.loaded:
+      return self
 
     # Load Models
-    energy_model = pickle.load(open(energy_path, 'rb'))
-    power_model = pickle.load(open(power_path, 'rb'))
-    latency_model = pickle.load(open(latency_path, 'rb'))
+    self.energy_model = _load_artifact(os.path.join(self.model_directory, self.energy_model_name), self.mmap_mode)
+    self.power_model = _load_artifact(os.path.join(self.model_directory, self.power_model_name), self.mmap_mode)
+    self.latency_model = _load_artifact(os.path.join(self.model_directory, self.latency_model_name), self.mmap_mode)
 
     #Categorical Data
     assert (self.one_hot_encoder_name is not None) or (self.label_encoder_name_list is not None), 'Must pass in Categorical Data Encoder File'
+    self.one_hot_encoder, self.label_encoders = None, None
     if self.one_hot_encoder_name is not None:
-      # Load One Hot Encoder
-      encoding_path = os.path.join(self.transformer_directory, self.one_hot_encoder_name)
-      enc = pickle.load(open(encoding_path, 'rb'))
+      self.one_hot_encoder = _load_artifact(os.path.join(self.transformer_directory, self.one_hot_encoder_name), self.mmap_mode)
+    else:
+      self.label_encoders = [_load_artifact(os.path.join(self.transformer_directory, name), self.mmap_mode)
+                             for name in self.label_encoder_name_list]
+
+    # Numerical and target transformers
+    self.numerical_transformer, self.target_transformer = None, None
+    if self.numeric_data_transformer_name is not None:
+      self.numerical_transformer = joblib.load(os.path.join(self.transformer_directory, self.numeric_data_transformer_name),
+                                               mmap_mode=self.mmap_mode)
+    if self.target_data_transformer_name is not None:
+      self.target_transformer = joblib.load(os.path.join(self.transformer_directory, self.target_data_transformer_name),
+                                            mmap_mode=self.mmap_mode)
+
+    self.loaded = True
+    return self
+
+  def to_frame(self, actions):
+    '''Accepts a DataFrame, an action dict or a list of action dicts'''
+    if isinstance(actions, pd.DataFrame):
+      return actions
+    if isinstance(actions, dict):
+      return pd.DataFrame([actions])
+    return pd.DataFrame(list(actions))
+
+  def transform_features(self, actions):
+    '''Encodes a population of actions into the model feature matrix'''
+    actions = self.to_frame(actions)
+
+    if self.one_hot_encoder is not None:
       # One Hot Encode Categorical Variables
-      X_categorical_data = enc.transform(actions[categorical_variables]).toarray()
-      X_categorical_data = pd.DataFrame(X_categorical_data)
-    elif self.label_encoder_name_list is not None: 
-      X_categorical_data = pd.DataFrame()
-      for label_encoder_name, categorical_variable in zip(self.label_encoder_name_list, categorical_variables):
-        # Load Label Encoder
-        encoding_path = os.path.join(self.transformer_directory, label_encoder_name) 
-        enc = pickle.load(open(encoding_path, 'rb'))
-        # Label Encode Categorical Variable
-        encoded_categorical_data = enc.transform(actions[categorical_variable])
-        # Add label encoded column to categorical df
-        X_categorical_data[categorical_variable] = encoded_categorical_data
-
-    # Transform Numerical Data
-    if not self.numeric_data_transformer_name == None:
-      # Get Transformer Path
-      numerical_data_transformer = os.path.join(self.transformer_directory, self.numeric_data_transformer_name)
-      # Load Numerical Transformer
-      standard_scaler_numerical_transformer = joblib.load(numerical_data_transformer)
-      # Transform Numberical Features
-      X_numerical_data = pd.DataFrame(standard_scaler_numerical_transformer.transform(actions[numerical_variables]), columns=[numerical_variables])
+      X_categorical_data = self.one_hot_encoder.transform(actions[self.categorical_variables])
+      if hasattr(X_categorical_data, 'toarray'):
+        X_categorical_data = X_categorical_data.toarray()
     else:
-      X_numerical_data = actions[numerical_variables]
-    
+      # Label Encode each Categorical Variable
+      X_categorical_data = np.column_stack([enc.transform(actions[categorical_variable])
+                                            for enc, categorical_variable in zip(self.label_encoders,
+                                                                                 self.categorical_variables)])
+
+    X_numerical_data = actions[self.numerical_variables].to_numpy(dtype=float)
+    if self.numerical_transformer is not None:
+      X_numerical_data = self.numerical_transformer.transform(X_numerical_data)
+
     # Join Numerical and Categorical Features
-    X = X_numerical_data.join(X_categorical_data)
-
-    # Predict Energy
-    energy = energy_model.predict(X)
-    # Predict Power
-    power = power_model.predict(X)
-    # Predict Latency
-    latency = latency_model.predict(X)
-
-    # Predictions
-    predicted = pd.DataFrame({'Energy': energy, 'Power': power, 'Latency': latency})
-
-    # Inverse Transform Prediction 
-    if not self.target_data_transformer_name == None:
-      # Get Transformer Path
-      target_data_transformer = os.path.join(self.transformer_directory, self.target_data_transformer_name)
-      # Load Numerical Transformer
-      standard_scaler_target_transformer = joblib.load(target_data_transformer)
-      # Transform Numberical Features
-      predicted = standard_scaler_target_transformer.inverse_transform(predicted)
-      predicted = pd.DataFrame(predicted, columns=['Energy', 'Power', 'Latency'])
+    return np.hstack([X_numerical_data, X_categorical_data])
+
+  def predict(self, actions):
+    '''Predicts energy/power/latency for a whole population in one call.
+
+      Args:
+        actions: pd.DataFrame, action dict or list of action dicts
+
+      Returns:
+        predicted: np.ndarray of shape (len(actions), 3) holding Energy, Power, Latency
+    '''
+    self.load()
+    X = self.transform_features(actions)
+
+    predicted = np.column_stack([self.energy_model.predict(X),
+                                 self.power_model.predict(X),
+                                 self.latency_model.predict(X)])
+
+    # Inverse Transform Prediction
+    if self.target_transformer is not None:
+      predicted = self.target_transformer.inverse_transform(predicted)
 
     # Inverse Boxcox Transform Latency
     if not self.latency_lambda == None:
-      predicted['Latency'] = inv_boxcox(predicted['Latency'], self.latency_lambda).tolist()
+      predicted[:, 2] = inv_boxcox(predicted[:, 2], self.latency_lambda)
 
     return predicted
 
+  def run_proxy_model(self, actions):
+
+    '''Transforms features, predicts energy/power/latency, inverse transforms
+        predictions, then returns prediction. Models and transformers are
+        loaded on the first call only.
+
+      Args:
+        actions (pd.DataFrame): dataframe of features used to make a prediction.
+          An action dict or a list of action dicts is also accepted.
+
+      Returns:
+        predicted: pd.DataFrame consisting of Energy, Power, and Latency columns
+    '''
+    return pd.DataFrame(self.predict(actions), columns=['Energy', 'Power', 'Latency'])
+
 # For testing
 if __name__ == '__main__':
+    import time
     example_df_path = os.path.join('data', 'Example_DRAMSys_Proxy_Model_Data.csv')
     df = pd.read_csv(example_df_path)
 
     df_y = df[['Energy','Power','Latency']]
-    proxy_model = DRAMSysProxyModel()
+    proxy_model = DRAMSysProxyModel().load()
+
+    start = time.perf_counter()
     example_y_pred = proxy_model.run_proxy_model(df)
+    elapsed = time.perf_counter() - start
 
+    print('Evaluations per second:', len(df) / elapsed)
     print('Energy Error:', mean_squared_error(df_y['Energy'], example_y_pred['Energy']))
     print('Power Error:', mean_squared_error(df_y['Power'], example_y_pred['Power']))
-    print('Latency Error:', mean_squared_error(df_y['Latency'], example_y_pred['Latency']))
\ No newline at end of file
+    print('Latency Error:', mean_squared_error(df_y['Latency'], example_y_pred['Latency']))
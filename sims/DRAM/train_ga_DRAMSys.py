@@ -8,9 +8,14 @@ import matplotlib.pyplot as plt
 os.sys.path.insert(0, os.path.abspath('../../'))
 
 from sko.GA                   import GA
+from sko.tools                import set_run_mode
+from sko.evaluator            import ProcessPoolEvaluator
+from sko.surrogate            import SurrogateScreen
 from arch_gym.envs.DRAMEnv    import DRAMEnv
 from arch_gym.envs            import dramsys_wrapper
 from arch_gym.envs.envHelpers import helpers
+from arch_gym.envs.eval_cache import EvaluationCache
+from arch_gym.envs.trajectory_store import get_writer
 from absl                     import flags
 from absl                     import app
 from absl                     import logging
@@ -25,6 +30,15 @@ flags.DEFINE_integer('num_agents', 32, 'Number of agents.')
 flags.DEFINE_float('prob_mutation', 0.1, 'Probability of mutation.')
 flags.DEFINE_string('traject_dir','ga_trajectories', 'Directory to save the dataset.')
 flags.DEFINE_string('summary_dir', '.', 'Directory to save the summary.')
+flags.DEFINE_string('cost_model', 'simulator', 'Cost model to evaluate designs with (simulator or proxy_model).')
+flags.DEFINE_string('eval_cache', None, 'Path to a shared evaluation cache (disabled if not set).')
+flags.DEFINE_integer('num_workers', 0, 'Number of parallel simulator workers (0 evaluates serially).')
+flags.DEFINE_float('eval_timeout', None, 'Seconds allowed for one simulation before it is penalized.')
+flags.DEFINE_float('surrogate_top_frac', 0.0, 'Fraction of each generation sent to the simulator after surrogate screening (0 disables screening).')
+flags.DEFINE_integer('surrogate_retrain_every', 10, 'Refit the surrogate after this many new simulations.')
+flags.DEFINE_enum('log_format', 'csv', ['csv', 'columnar'], 'Append evaluations to fitness.csv or to a columnar trajectory store.')
+flags.DEFINE_string('checkpoint', None, 'Path of a GA snapshot, resumed from if it exists (disabled if not set).')
+flags.DEFINE_integer('checkpoint_every', 1, 'Write the GA snapshot every this many generations.')
 
 FLAGS = flags.FLAGS
 
@@ -57,24 +71,46 @@ def generate_run_directories():
 
     return traject_dir, exp_log_dir
     
+def make_dram_env(worker_id=0, scratch_dir=None):
+    '''
+    Builds the (optionally logged) DRAMSys environment. With --num_workers this
+    runs once per worker process, the env is reused for every individual and
+    DRAMSys runs in a workspace under the worker's scratch directory.
+    '''
+    env = dramsys_wrapper.make_dramsys_env(reward_formulation = FLAGS.reward_formulation,
+                                           eval_cache = FLAGS.eval_cache,
+                                           workspace = scratch_dir)
+
+    traject_dir, _ = generate_run_directories()
+    
+    env = wrap_in_envlogger(env, FLAGS.summary_dir)
+    
+    if FLAGS.use_envlogger:
+        if not os.path.exists(traject_dir):
+            os.makedirs(traject_dir, exist_ok=True)
+    return env
+
+
 def dram_optimization_function(p):
     '''
     This function is used to optimize the DRAM parameters. The default objective is to minimize. If you have a reward/fitness formulation
     that is to be maximized, you can simply return -1 * your_reward.
     '''
+    # instantiate the environment for this evaluation
+    return evaluate_dram_design(p, make_dram_env())
+
+
+def evaluate_dram_design(p, env):
+    '''
+    Objective of dram_optimization_function on a given environment. With
+    --num_workers it is called as func(x, state) by the ProcessPoolEvaluator,
+    state being the env make_dram_env built for the worker.
+    '''
     rewards = []
     print("Agents Action", p)
-    # instantiate the environment and the helpers
-    env = dramsys_wrapper.make_dramsys_env(reward_formulation = FLAGS.reward_formulation)
     dram_helper = helpers()
 
-    traject_dir, exp_log_dir = generate_run_directories()
-    
-    env = wrap_in_envlogger(env, FLAGS.summary_dir)
-    
-    if FLAGS.use_envlogger:
-        if not os.path.exists(traject_dir):
-            os.makedirs(traject_dir)
+    _, exp_log_dir = generate_run_directories()
     env.reset()
 
     # decode the actions
@@ -88,24 +124,103 @@ def dram_optimization_function(p):
     fitness_dict["reward"] = reward
     fitness_dict["obs"] = info
 
-    # Convert dictionary to dataframe
-    fitness_df = pd.DataFrame([fitness_dict], columns=["action", "reward", "obs"])
-
     # check if exp_log_dir exists
     if not os.path.exists(exp_log_dir):
-        os.makedirs(exp_log_dir)
+        os.makedirs(exp_log_dir, exist_ok=True)
+
+    if FLAGS.log_format == "columnar":
+        # buffered, flushed in batches (read back with trajectory_store.read_trajectories)
+        log_columnar(exp_log_dir, [action_dict], [info], [reward])
+    else:
+        # Convert dictionary to dataframe
+        fitness_df = pd.DataFrame([fitness_dict], columns=["action", "reward", "obs"])
 
-    # write it to csv file append mode
-    fitness_df.to_csv(os.path.join(exp_log_dir, "fitness.csv"), mode='a', header=False, index=False)
+        # write it to csv file append mode
+        fitness_df.to_csv(os.path.join(exp_log_dir, "fitness.csv"), mode='a', header=False, index=False)
     rewards.append(reward)
     
     return -1 * reward
     
 
+def fitness_record(action, obs, reward):
+    '''
+    One flat row of the columnar fitness log: the decoded action, the
+    Energy/Power/Latency observation and the reward. Simulator and proxy model
+    runs write the same fixed set of columns.
+    '''
+    record = dict(action)
+    record["Energy"], record["Power"], record["Latency"] = (float(v) for v in np.asarray(obs).reshape(-1)[:3])
+    record["reward"] = float(reward)
+    return record
+
+
+def log_columnar(exp_log_dir, actions, observations, rewards):
+    '''
+    Appends one fitness_record per evaluated design to the columnar fitness
+    log. A logging problem is reported but never turns an evaluated design
+    into a failed evaluation.
+    '''
+    try:
+        records = [fitness_record(action, obs, reward)
+                   for action, obs, reward in zip(actions, observations, rewards)]
+        get_writer(os.path.join(exp_log_dir, "fitness")).extend(records)
+    except Exception as e:
+        logging.error('Could not log to the columnar trajectory store: %s', e)
+
+
+proxy_env = None
+
+def dram_batch_optimization_function(X):
+    '''
+    Evaluates a whole GA generation with one vectorized DRAMSys proxy model
+    prediction instead of one env step per individual.
+    '''
+    global proxy_env
+    if proxy_env is None:
+        proxy_env = DRAMEnv(reward_formulation = FLAGS.reward_formulation, cost_model = "proxy_model")
+
+    actions = proxy_env.helpers.action_decoder_ga_batch(X)
+    obs, rewards = proxy_env.evaluate_population(actions)
+
+    fitness_df = actions.copy()
+    fitness_df["Energy"], fitness_df["Power"], fitness_df["Latency"] = obs[:, 0], obs[:, 1], obs[:, 2]
+    fitness_df["reward"] = rewards
+
+    _, exp_log_dir = generate_run_directories()
+    if not os.path.exists(exp_log_dir):
+        os.makedirs(exp_log_dir)
+    if FLAGS.log_format == "columnar":
+        log_columnar(exp_log_dir, actions.to_dict("records"), obs, rewards)
+    else:
+        fitness_df.to_csv(os.path.join(exp_log_dir, "fitness.csv"), mode='a', header=False, index=False)
+
+    return -1 * rewards
+
+
 def main(_):
 
+    if FLAGS.cost_model == "proxy_model":
+        fitness_function = dram_batch_optimization_function
+        set_run_mode(fitness_function, 'vectorization')
+    elif FLAGS.num_workers > 0:
+        # long-lived workers, each building its environment once
+        fitness_function = ProcessPoolEvaluator(evaluate_dram_design,
+                                                n_workers = FLAGS.num_workers,
+                                                setup = make_dram_env,
+                                                timeout = FLAGS.eval_timeout)
+    else:
+        fitness_function = dram_optimization_function
+
+    evaluator = fitness_function
+    if FLAGS.cost_model != "proxy_model" and FLAGS.surrogate_top_frac > 0:
+        # only the most promising / most uncertain designs reach DRAMSys
+        fitness_function = SurrogateScreen(evaluator,
+                                           top_frac = FLAGS.surrogate_top_frac,
+                                           min_samples = FLAGS.num_agents,
+                                           retrain_every = FLAGS.surrogate_retrain_every)
+
     ga = GA(
-        func=dram_optimization_function, 
+        func=fitness_function, 
         n_dim=10, 
         size_pop=FLAGS.num_agents,
         max_iter=FLAGS.num_iter,
@@ -115,8 +230,19 @@ def main(_):
         precision=[1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0] 
     )
 
+    if FLAGS.checkpoint:
+        ga.checkpoint(FLAGS.checkpoint, every = FLAGS.checkpoint_every)
+        if os.path.exists(FLAGS.checkpoint):
+            ga.resume_from(FLAGS.checkpoint)
+
     best_x, best_y = ga.run()
 
+    if isinstance(fitness_function, SurrogateScreen):
+        print("Surrogate screening:", fitness_function.report())
+
+    if isinstance(evaluator, ProcessPoolEvaluator):
+        evaluator.close()
+
     # get directory names
     _, exp_log_dir = generate_run_directories()
 
@@ -132,5 +258,8 @@ def main(_):
     Y_history.min(axis=1).cummin().plot(kind='line')
     plt.savefig(os.path.join(exp_log_dir, "Y_history.png"))
 
+    if FLAGS.eval_cache:
+        print("Evaluation cache:", EvaluationCache(FLAGS.eval_cache).stats())
+
 if __name__ == '__main__':
    app.run(main)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import yaml
+
+# Result of a layer for which the mapper found no valid mapping
+INVALID = (-1.0, -1.0, -1.0)
+
+
+def default_max_workers():
+    # every timeloop-mapper run uses 8 threads
+    return max(1, (os.cpu_count() or 1) // 8)
+
+
+def _hash_file(digest, path):
+    with open(path, "rb") as f:
+        digest.update(f.read())
+
+
+def arch_hash(arch_dir, mapper_dir):
+    '''
+    Content hash of everything the mapper reads besides the layer: the arch
+    YAML, its components and the mapper config. Copies of the same
+    architecture in different directories hash alike.
+    '''
+    digest = hashlib.sha256()
+    _hash_file(digest, os.path.join(arch_dir, "eyeriss_like.yaml"))
+    components_dir = os.path.join(arch_dir, "components")
+    if os.path.isdir(components_dir):
+        for name in sorted(os.listdir(components_dir)):
+            digest.update(name.encode())
+            _hash_file(digest, os.path.join(components_dir, name))
+    mapper_file = os.path.join(mapper_dir, "mapper.yaml")
+    if os.path.exists(mapper_file):
+        _hash_file(digest, mapper_file)
+    return digest.hexdigest()
+
+
+_shape_keys = {}
+
+
+def layer_shape_key(layer_file):
+    '''
+    Canonical form of a layer shape YAML: layers that only differ in file name,
+    key order or formatting get the same key
+    '''
+    stat = os.stat(layer_file)
+    file_key = (os.path.abspath(layer_file), stat.st_mtime_ns, stat.st_size)
+    if file_key not in _shape_keys:
+        with open(layer_file, "r") as f:
+            shape = yaml.safe_load(f)
+        _shape_keys[file_key] = json.dumps(shape, sort_keys=True)
+    return _shape_keys[file_key]
+
+
+class LayerCache():
+    '''
+    Bounded LRU map of (arch hash, layer shape) -> (energy, area, cycles),
+    INVALID for layers without a valid mapping. Shared by all the wrappers of
+    a process, so results carry over between steps and architectures.
+    '''
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.results = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            metrics = self.results.get(key)
+            if metrics is None:
+                self.misses += 1
+                return None
+            self.results.move_to_end(key)
+            self.hits += 1
+            return metrics
+
+    def put(self, key, metrics):
+        with self.lock:
+            self.results[key] = metrics
+            self.results.move_to_end(key)
+            while len(self.results) > self.max_entries:
+                self.results.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+    def get_stats(self):
+        return {"entries": len(self.results), "hits": self.hits, "misses": self.misses}
+
+
+layer_cache = LayerCache()
+
+
+class LayerPlan():
+    '''
+    Layer-level evaluation plan of one workload on one architecture.
+
+    Layers with identical shapes are mapped once, and shapes already mapped
+    on the same architecture (see layer_cache) are not mapped again. todo
+    holds one representative layer file per shape that still has to run.
+    '''
+    def __init__(self, workload_dir, arch_dir, mapper_dir, cache=None):
+        self.cache = layer_cache if cache is None else cache
+        self.arch_hash = arch_hash(arch_dir, mapper_dir)
+        self.layers = sorted(os.listdir(workload_dir))
+        self.shape_keys = {layer: layer_shape_key(os.path.join(workload_dir, layer)) for layer in self.layers}
+
+        self.results = {}
+        self.todo = []
+        for layer in self.layers:
+            key = self.shape_keys[layer]
+            if key in self.results:
+                continue
+            metrics = self.cache.get((self.arch_hash, key))
+            self.results[key] = metrics
+            if metrics is None:
+                self.todo.append(layer)
+
+    def record(self, layer, metrics):
+        '''Result of a layer from todo, None if no valid mapping was found'''
+        metrics = INVALID if metrics is None else tuple(float(m) for m in metrics)
+        key = self.shape_keys[layer]
+        self.results[key] = metrics
+        self.cache.put((self.arch_hash, key), metrics)
+
+    def totals(self):
+        '''Energy and cycles summed over all the layers, INVALID if any layer has no valid mapping'''
+        energy, area, cycles = 0.0, 0.0, 0.0
+        for layer in self.layers:
+            metrics = self.results[self.shape_keys[layer]]
+            if metrics is None or metrics == INVALID:
+                return INVALID
+            energy += metrics[0]
+            area = metrics[1]  # Area does not change based on layer
+            cycles += metrics[2]
+        return energy, area, cycles
+
+
+def run_commands(cmds, max_workers=None):
+    '''Runs the commands, at most max_workers at a time'''
+    with ThreadPoolExecutor(max_workers or default_max_workers()) as pool:
+        return [completed.returncode for completed in pool.map(subprocess.run, cmds)]
+
+
+async def run_commands_async(cmds, max_workers=None):
+    '''Same as run_commands, but awaits the processes instead of blocking'''
+    slots = asyncio.Semaphore(max_workers or default_max_workers())
+
+    async def run(cmd):
+        async with slots:
+            process = await asyncio.create_subprocess_exec(*cmd)
+            return await process.wait()
+
+    return list(await asyncio.gather(*(run(cmd) for cmd in cmds)))
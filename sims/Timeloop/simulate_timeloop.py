@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 # from sims.Timeloop.timeloop_wrapper import TimeloopWrapper
+import contextlib
 import os
 import sys
 
@@ -13,7 +14,7 @@ from absl import logging
 
 
 def simulate_timeloop(script_dir=None, output_dir=None, arch_dir=None, mapper_dir=None, workload_dir=None,
-                      arch_params=None, runtime="docker"):
+                      arch_params=None, runtime="docker", profiler=None, max_workers=None):
     if runtime == "docker":
         from sims.Timeloop.timeloop_wrapper import TimeloopWrapper
 
@@ -23,10 +24,34 @@ def simulate_timeloop(script_dir=None, output_dir=None, arch_dir=None, mapper_di
     else:
         raise ValueError("Runtime should be either docker or singularity")
 
-    timeloop = TimeloopWrapper(script_dir, output_dir, arch_dir, mapper_dir, workload_dir)
+    timeloop = TimeloopWrapper(script_dir, output_dir, arch_dir, mapper_dir, workload_dir, max_workers=max_workers)
     if arch_params is not None:
-        timeloop.update_arch(arch_params)
-    energy, area, cycles = timeloop.launch_timeloop()
+        with profiler.phase("render") if profiler is not None else contextlib.nullcontext():
+            timeloop.update_arch(arch_params)
+    energy, area, cycles = timeloop.launch_timeloop(profiler)
+    print("Energy: " + str(energy))
+    print("Area:   " + str(area))
+    print("Cycles: " + str(cycles))
+    return energy, area, cycles
+
+
+async def simulate_timeloop_async(script_dir=None, output_dir=None, arch_dir=None, mapper_dir=None, workload_dir=None,
+                                  arch_params=None, runtime="docker", profiler=None, max_workers=None):
+    # Same as simulate_timeloop, but awaits timeloop instead of blocking
+    if runtime == "docker":
+        from sims.Timeloop.timeloop_wrapper import TimeloopWrapper
+
+    elif runtime == "singularity":
+        # Run in singularity container.
+        from sims.Timeloop.timeloop_wrapper_singularity import TimeloopWrapper
+    else:
+        raise ValueError("Runtime should be either docker or singularity")
+
+    timeloop = TimeloopWrapper(script_dir, output_dir, arch_dir, mapper_dir, workload_dir, max_workers=max_workers)
+    if arch_params is not None:
+        with profiler.phase("render") if profiler is not None else contextlib.nullcontext():
+            timeloop.update_arch(arch_params)
+    energy, area, cycles = await timeloop.launch_timeloop_async(profiler)
     print("Energy: " + str(energy))
     print("Area:   " + str(area))
     print("Cycles: " + str(cycles))
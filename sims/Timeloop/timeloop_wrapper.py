@@ -1,69 +1,135 @@
 #!/usr/bin/env python3
 
-import subprocess
+import contextlib
 import os
+import re
 import numpy as np
 import yaml
 
+from sims.Timeloop.layer_planner import LayerPlan, run_commands, run_commands_async
+
+
+def _phase(profiler):
+    # phase(name) of an arch_gym step profiler, or a no-op without one
+    if profiler is None:
+        return lambda name: contextlib.nullcontext()
+    return profiler.phase
+
 
 class TimeloopWrapper:
-    def __init__(self, script_dir=None, output_dir=None, arch_dir=None, mapper_dir=None, workload_dir=None):
+    def __init__(self, script_dir=None, output_dir=None, arch_dir=None, mapper_dir=None, workload_dir=None,
+                 max_workers=None):
         self.script_dir = script_dir
         self.output_dir = output_dir
         self.arch_dir = arch_dir
         self.mapper_dir = mapper_dir
         self.workload_dir = workload_dir
+        self.max_workers = max_workers
         return
 
-    def prepare_cmd(self):
-        run_timeloop_file = os.path.join(self.script_dir, 'run_timeloop.sh')
+    def prepare_cmd(self, script_dir=None):
+        run_timeloop_file = os.path.join(script_dir or self.script_dir, 'run_timeloop.sh')
         cmd = ['bash', run_timeloop_file]
         return cmd
 
-    def launch_timeloop(self):
-        energy = np.float64()
-        area = np.float64()
-        cycles = np.float64()
-        for layer in os.listdir(self.workload_dir):
-            self.modify_script(self.output_dir, layer)
-            cmd = self.prepare_cmd()
-            completed = subprocess.run(cmd)
-            mapping_exists = self.valid_mapping()
-            if not mapping_exists:
-                energy, area, cycles = (-1.0, -1.0, -1.0)
-                break
-            metrics = self.obtain_metrics()
-            energy += metrics[0]
-            area = metrics[1]  # Area does not change based on layer
-            cycles += metrics[2]
+    def layer_output_dir(self, layer):
+        # every layer maps in its own directory so that layers can run concurrently
+        layer_dir = os.path.join(self.output_dir, "layers", os.path.splitext(layer)[0])
+        os.makedirs(layer_dir, exist_ok=True)
+        return layer_dir
+
+    def plan_layers(self):
+        # unique layer shapes that are not cached yet, with their commands and output dirs
+        plan = LayerPlan(self.workload_dir, self.arch_dir, self.mapper_dir)
+        runs = []
+        for layer in plan.todo:
+            layer_dir = self.layer_output_dir(layer)
+            self.modify_script(layer_dir, layer, script_path=os.path.join(layer_dir, "run_timeloop.sh"))
+            runs.append((layer, self.prepare_cmd(layer_dir), layer_dir))
+        return plan, runs
+
+    def collect_layers(self, plan, runs):
+        for layer, _, layer_dir in runs:
+            mapping_exists = self.valid_mapping(layer_dir)
+            plan.record(layer, self.obtain_metrics(layer_dir) if mapping_exists else None)
+        return plan.totals()
+
+    def launch_timeloop(self, profiler=None):
+        phase = _phase(profiler)
+        with phase('render'):
+            plan, runs = self.plan_layers()
+        with phase('simulate'):
+            run_commands([cmd for _, cmd, _ in runs], self.max_workers)
+        with phase('parse'):
+            energy, area, cycles = self.collect_layers(plan, runs)
 
         return energy, area, cycles
 
-    def modify_script(self, output_dir, layer):
-        # Update layer and output dir in run_timeloop script
+    async def launch_timeloop_async(self, profiler=None):
+        # Same as launch_timeloop, but awaits the runs instead of blocking
+        phase = _phase(profiler)
+        with phase('render'):
+            plan, runs = self.plan_layers()
+        with phase('simulate'):
+            await run_commands_async([cmd for _, cmd, _ in runs], self.max_workers)
+        with phase('parse'):
+            energy, area, cycles = self.collect_layers(plan, runs)
+
+        return energy, area, cycles
+
+    def modify_script(self, output_dir, layer, script_path=None):
+        # Update layer, output dir and arch/mapper inputs in run_timeloop script
+        # so that every script/output/arch directory set runs independently.
+        # With script_path, the script is written there instead and the mapper
+        # runs inside output_dir, so that its scratch files do not collide
+        # with concurrent runs
         script = "run_timeloop.sh"
+        arch_dir = os.path.abspath(self.arch_dir)
+        mapper_dir = os.path.abspath(self.mapper_dir)
+        isolate = script_path is not None
         file = open(self.script_dir + "/" + script, "r")
         replacement = ""
+        in_mapper_cmd = False
         for line in file:
             line = line.strip()
-            # if 'OUTPUT_DIR=' in line:
-            #     changes = 'OUTPUT_DIR=' + '"./' + output_dir.split('/')[-1] + '"'
-            #     replacement = replacement + changes + "\n"
-            if 'LAYER_SHAPE=' in line:
+            if 'OUTPUT_DIR=' in line:
+                changes = 'OUTPUT_DIR=' + '"' + os.path.abspath(output_dir) + '"'
+                replacement = replacement + changes + "\n"
+            elif 'LAYER_SHAPE=' in line:
                 changes = 'LAYER_SHAPE=' + '"' + self.workload_dir.split('/')[-1] + '/' + layer + '"'
                 replacement = replacement + changes + "\n"
+            elif line.startswith('mv timeloop-mapper.stats.txt'):
+                if not isolate:
+                    replacement = replacement + 'mv timeloop-mapper.stats.txt "$OUTPUT_DIR"' + "\n"
             else:
+                line = re.sub(r'\S*/arch/(eyeriss_like\.yaml|components/)', lambda m: arch_dir + '/' + m.group(1), line)
+                line = re.sub(r'\S*/mapper/mapper\.yaml', lambda m: mapper_dir + '/mapper.yaml', line)
+                if isolate:
+                    if line.startswith('cd '):
+                        line = line + "\n" + 'BASE_DIR="$(pwd)"'
+                    if 'timeloop-mapper' in line:
+                        in_mapper_cmd = True
+                        line = 'cd "$OUTPUT_DIR"' + "\n" + line
+                    if in_mapper_cmd:
+                        # inputs given relative to the design directory
+                        line = " ".join(self.rebase_token(token) for token in line.split(" "))
+                        in_mapper_cmd = line.endswith("\\")
                 replacement = replacement + line + "\n"
 
         file.close()
-        fout = open(self.script_dir + "/" + script, "w")
+        fout = open(script_path or (self.script_dir + "/" + script), "w")
         fout.write(replacement)
         fout.close()
         print(layer)
         return
 
-    def valid_mapping(self):
-        output_path = os.path.join(self.output_dir, "timeloop_simulation_output.txt")
+    def rebase_token(self, token):
+        if "/" not in token or token[0] in "/$>\"'-":
+            return token
+        return '"$BASE_DIR"/' + token
+
+    def valid_mapping(self, output_dir=None):
+        output_path = os.path.join(output_dir or self.output_dir, "timeloop_simulation_output.txt")
         file = open(output_path, "r")
         for line in file:
             line = line.strip()
@@ -71,8 +137,8 @@ class TimeloopWrapper:
                 return True
         return False
 
-    def obtain_metrics(self):
-        file = open(self.output_dir + "/timeloop-mapper.stats.txt", "r")
+    def obtain_metrics(self, output_dir=None):
+        file = open((output_dir or self.output_dir) + "/timeloop-mapper.stats.txt", "r")
         energy = np.float64()
         area = np.float64()
         cycles = np.float64()
@@ -1,55 +1,95 @@
 #!/usr/bin/env python3
 
-import subprocess
+import contextlib
 import os
 import numpy as np
 import yaml
 
+from sims.Timeloop.layer_planner import LayerPlan, run_commands, run_commands_async
+
+
+def _phase(profiler):
+    # phase(name) of an arch_gym step profiler, or a no-op without one
+    if profiler is None:
+        return lambda name: contextlib.nullcontext()
+    return profiler.phase
+
 
 class TimeloopWrapper:
-    def __init__(self, script_dir=None, output_dir=None, arch_dir=None, mapper_dir=None, workload_dir=None):
+    def __init__(self, script_dir=None, output_dir=None, arch_dir=None, mapper_dir=None, workload_dir=None,
+                 max_workers=None):
         self.script_dir   = script_dir
         self.output_dir   = output_dir
         self.arch_dir     = arch_dir
         self.mapper_dir   = mapper_dir
         self.workload_dir = workload_dir
+        self.max_workers  = max_workers
         return
 
 
-    def prepare_cmd(self):
+    def prepare_cmd(self, script_dir=None, output_dir=None):
         eyeriss_dir = ':/home/workspace/src/timeloop-examples/workspace/final-project/example_designs/eyeriss_like/'
-        bind_script = self.script_dir + eyeriss_dir + 'script'                          # Entry point script
-        bind_output = self.output_dir + eyeriss_dir + 'output'                          # Output directory
+        bind_script = (script_dir or self.script_dir) + eyeriss_dir + 'script'          # Entry point script
+        bind_output = (output_dir or self.output_dir) + eyeriss_dir + 'output'          # Output directory
         bind_arch   = self.arch_dir   + eyeriss_dir + 'arch'                            # Arch directory
         bind_mapper = self.mapper_dir + eyeriss_dir + 'mapper'                          # Mapper directory
         cmd = ['singularity', 'run', '--writable-tmpfs', '--bind', 
                 '{},{},{},{}'.format(bind_script, bind_output, bind_arch, bind_mapper),
                'timeloop_4_archgym']
         return cmd
+
+
+    def plan_layers(self):
+        # unique layer shapes that are not cached yet, each run with its own
+        # script and output binds (the tmpfs keeps the container scratch apart)
+        plan = LayerPlan(self.workload_dir, self.arch_dir, self.mapper_dir)
+        runs = []
+        for layer in plan.todo:
+            layer_dir    = os.path.join(self.output_dir, "layers", os.path.splitext(layer)[0])
+            layer_script = os.path.join(layer_dir, "script")
+            layer_output = os.path.join(layer_dir, "output")
+            os.makedirs(layer_script, exist_ok=True)
+            os.makedirs(layer_output, exist_ok=True)
+            self.modify_script(layer_output, layer, script_path=os.path.join(layer_script, "run_timeloop.sh"))
+            runs.append((layer, self.prepare_cmd(layer_script, layer_output), layer_output))
+        return plan, runs
+
+
+    def collect_layers(self, plan, runs):
+        for layer, _, layer_output in runs:
+            mapping_exists = self.valid_mapping(layer_output)
+            plan.record(layer, self.obtain_metrics(layer_output) if mapping_exists else None)
+        return plan.totals()
+
     
-    
-    def launch_timeloop(self):
-        energy = np.float64()
-        area   = np.float64()
-        cycles = np.float64()
-        for layer in os.listdir(self.workload_dir): 
-            self.modify_script(self.output_dir, layer)        
-            cmd = self.prepare_cmd()
-            completed = subprocess.run(cmd)
-            mapping_exists = self.valid_mapping()
-            if not mapping_exists: 
-                energy, area, cycles = (-1.0, -1.0, -1.0)
-                break
-            metrics = self.obtain_metrics()
-            energy += metrics[0]
-            area    = metrics[1]  # Area does not change based on layer
-            cycles += metrics[2]
+    def launch_timeloop(self, profiler=None):
+        phase = _phase(profiler)
+        with phase('render'):
+            plan, runs = self.plan_layers()
+        with phase('simulate'):
+            run_commands([cmd for _, cmd, _ in runs], self.max_workers)
+        with phase('parse'):
+            energy, area, cycles = self.collect_layers(plan, runs)
+            
+        return energy, area, cycles
+
+
+    async def launch_timeloop_async(self, profiler=None):
+        # Same as launch_timeloop, but awaits the runs instead of blocking
+        phase = _phase(profiler)
+        with phase('render'):
+            plan, runs = self.plan_layers()
+        with phase('simulate'):
+            await run_commands_async([cmd for _, cmd, _ in runs], self.max_workers)
+        with phase('parse'):
+            energy, area, cycles = self.collect_layers(plan, runs)
             
         return energy, area, cycles
 
 
-    def modify_script(self, output_dir, layer):
-        # Update layer and output dir in run_timeloop script 
+    def modify_script(self, output_dir, layer, script_path=None):
+        # Update layer and output dir in run_timeloop script, written to
+        # script_path if given
         script = "run_timeloop.sh"
         file = open(self.script_dir + "/" + script, "r")
         replacement = ""
@@ -65,15 +105,15 @@ class TimeloopWrapper:
                 replacement = replacement + line + "\n"
     
         file.close()
-        fout = open(self.script_dir + "/" + script, "w")
+        fout = open(script_path or (self.script_dir + "/" + script), "w")
         fout.write(replacement)
         fout.close()  
         print(layer)
         return 
 
 
-    def valid_mapping(self):
-        file = open(self.output_dir + "/timeloop_simulation_output.txt", "r")
+    def valid_mapping(self, output_dir=None):
+        file = open((output_dir or self.output_dir) + "/timeloop_simulation_output.txt", "r")
         for line in file:
             line = line.strip()
             if "Summary stats for best mapping found by mapper:" in line:
@@ -81,8 +121,8 @@ class TimeloopWrapper:
         return False
 
 
-    def obtain_metrics(self):
-        file = open(self.output_dir + "/timeloop-mapper.stats.txt", "r")
+    def obtain_metrics(self, output_dir=None):
+        file = open((output_dir or self.output_dir) + "/timeloop-mapper.stats.txt", "r")
         energy = np.float64()
         area   = np.float64()
         cycles = np.float64()
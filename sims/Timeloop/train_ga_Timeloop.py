@@ -47,6 +47,8 @@ flags.DEFINE_string('traject_dir','ga_trajectories', 'Directory to save the data
 flags.DEFINE_float('target_energy', 20444.2, 'Target energy value.')
 flags.DEFINE_float('target_area', 1.7255, 'Target area value.')
 flags.DEFINE_float('target_cycles', 6308563, 'Target cycles value.')
+flags.DEFINE_string('checkpoint', None, 'Path of a GA snapshot, resumed from if it exists (disabled if not set).')
+flags.DEFINE_integer('checkpoint_every', 1, 'Write the GA snapshot every this many generations.')
 
 FLAGS = flags.FLAGS
 
@@ -203,6 +205,11 @@ def main(_):
             precision=[1.0 for _ in param_sizes],
             prob_mut=FLAGS.prob_mutation)
 
+    if FLAGS.checkpoint:
+        ga.checkpoint(FLAGS.checkpoint, every=FLAGS.checkpoint_every)
+        if os.path.exists(FLAGS.checkpoint):
+            ga.resume_from(FLAGS.checkpoint)
+
     best_points, best_dist = ga.run()
 
     # Log all experiment meta data 
@@ -22,7 +22,8 @@ class GAMMA(object):
                 slevel_max=2, fixedCluster=0, log_level=2,constraint_class=None,
                 external_mem_cstr=None, use_factor=False,uni_base=True,
                 use_reorder=True, use_growing=True, use_aging=True,
-                reorder_alpha=0.5, growing_alpha=0.5, aging_alpha=0.5
+                reorder_alpha=0.5, growing_alpha=0.5, aging_alpha=0.5,
+                use_memo=True
                 ):
         super(GAMMA,self).__init__()
         self.dimension = dimension
@@ -76,6 +77,17 @@ class GAMMA(object):
         self.growing_alpha = growing_alpha
         self.aging_alpha = aging_alpha
 
+        # results of the individuals evaluated so far, spanning generations
+        self.use_memo = use_memo
+        self.eval_memo = dict()
+        self.memo_stats = []
+
+    def __getstate__(self):
+        # the pool pickles self with every task, the memo stays in the parent
+        state = self.__dict__.copy()
+        state["eval_memo"] = dict()
+        return state
+
     def reset_hw_parm(self, l1_size=None, l2_size=None, num_pe=None, NocBW=None, map_cstr=None, pe_limit=None,area_pebuf_only=None, external_area_model=None, offchipBW=None):
         if l1_size:
             self.l1_size=l1_size if l1_size > 0 else 2**30
@@ -95,6 +107,8 @@ class GAMMA(object):
             self.area_pebuf_only = area_pebuf_only
         if external_area_model:
             self.external_area_model = external_area_model
+        # map_cstr, pe_limit and the area model change the rewards but are not part of the memo key
+        self.eval_memo.clear()
 
     def get_dimension_factors(self, dimension_dict):
         dimension_factors = dict()
@@ -118,6 +132,8 @@ class GAMMA(object):
         self.use_ranking = True if self.fitness_objective[0] == "ranking" else False
         self.dimension_dict = {"K": self.dimension[0], "C": self.dimension[1], "Y": self.dimension[2], "X": self.dimension[3], "R": self.dimension[4],"S": self.dimension[5], "T": self.dimension[6]}
         self.dimension_factors = self.get_dimension_factors(self.dimension_dict)
+        # the memoized rewards are specific to the layer and the objective
+        self.eval_memo.clear()
 
     def create_genome_with_cstr(self):
         indv = self.create_genome()
@@ -699,7 +715,7 @@ class GAMMA(object):
         count_non_valid = 0
         # populations = pool.map(self.thread_fun_correctify_tile_dependency, population)
         # population[:] = populations
-        reward_activ_list = pool.map(self.thread_fun, population)
+        reward_activ_list = self.evaluate_unique(pool, population, cur_gen=cur_gen)
 
         for i in range(len(population)):
             reward, activity_count = reward_activ_list[i]
@@ -750,6 +766,7 @@ class GAMMA(object):
             "dimension": self.dimension,
             "best_reward_pleteau":self.best_reward_pleteau ,
             "best_sol_pleteau":self.best_sol_pleteau ,
+            "memo_stats": self.memo_stats,
             # "stat":stat,
             # "stat_list":self.stat_list
         }
@@ -766,6 +783,44 @@ class GAMMA(object):
         #                                                                             np.abs(best_reward)))
         return chkpt
 
+    def memo_key(self, indv, num_pe=None, l1_size=None, l2_size=None, NocBW=None, offchipBW=None):
+        # canonical hashable form of the individual and the HW it runs on
+        genes = tuple(tuple(v.item() if isinstance(v, np.generic) else v for v in gene) for gene in indv)
+        hw = (num_pe or self.num_pe, l1_size or self.l1_size, l2_size or self.l2_size,
+              NocBW or self.NocBW, offchipBW or self.offchipBW)
+        return genes, hw
+
+    def evaluate_unique(self, pool, population, cur_gen=-1):
+        # only the individuals that were never evaluated before go to maestro,
+        # elites and duplicates from crossover/mutation are answered by the memo
+        if not self.use_memo:
+            return pool.map(self.thread_fun, population)
+        keys = [self.memo_key(indv) for indv in population]
+        unseen = dict()
+        for i, key in enumerate(keys):
+            if key not in self.eval_memo and key not in unseen:
+                unseen[key] = i
+        reward_activ_list = pool.map(self.thread_fun, [population[i] for i in unseen.values()])
+        for key, reward_activ in zip(unseen, reward_activ_list):
+            self.eval_memo[key] = reward_activ
+
+        num_indv = len(population)
+        num_unique = len(set(keys))
+        stat = {
+            "gen": cur_gen + 1,
+            "num_indv": num_indv,
+            "num_unique": num_unique,
+            "num_evaluated": len(unseen),
+            "memo_hits": num_indv - len(unseen),
+            "duplicate_rate": (num_indv - len(unseen)) / num_indv if num_indv else 0,
+            "memo_size": len(self.eval_memo),
+        }
+        self.memo_stats.append(stat)
+        if self.log_level > 2:
+            print("Gen {}: {} individuals, {} unique, {} evaluated, duplicate rate {:.1%}".format(
+                stat["gen"], num_indv, num_unique, stat["num_evaluated"], stat["duplicate_rate"]))
+        return [self.eval_memo[key] for key in keys]
+
     def injection(self, inject_ratio=1.0):
         num_inject = int(self.num_population * inject_ratio)
         pop_inj = [self.create_genome_fixedSL() for _ in range(num_inject)]
@@ -842,14 +897,19 @@ class GAMMA(object):
                     best_runtime, best_throughput, best_energy, best_area, best_l1_size, best_l2_size, best_mac, best_power, best_num_pe = self.get_indiv_info( chkpt["best_sol"])
                     # best_num_pe = chkpt["best_sol"][0][1] if self.num_pe<1 else self.num_pe
                     # print(f"Runtime: {best_runtime}, L1: {best_l1_size}, L2: {best_l2_size}, L1_usage:{best_l1_size/self.l1_size:}, L2_usage:{best_l2_size/self.l2_size:.4f}, PE: {best_num_pe}")
-                    print(f"Gen {g+1}: Reward: {chkpt['best_reward'][0]:.3e}, Runtime: {best_runtime}, Area: {best_area/1e6:.3f}mm2,  PE Area_ratio: {best_num_pe*MAC_AREA_INT8/best_area*100:.1f}%, L1: {best_l1_size}, L2: {best_l2_size},  PE: {best_num_pe}")
+                    print(f"Gen {g+1}: Reward: {chkpt['best_reward'][0]:.3e}, Runtime: {best_runtime}, Area: {best_area/1e6:.3f}mm2,  PE Area_ratio: {best_num_pe*MAC_AREA_INT8/best_area*100:.1f}%, L1: {best_l1_size}, L2: {best_l2_size},  PE: {best_num_pe}{self.memo_stat_str()}")
                 else:
-                    print(f"Gen {g+1}: Reward: {chkpt['best_reward'][0]:.3e}")
+                    print(f"Gen {g+1}: Reward: {chkpt['best_reward'][0]:.3e}{self.memo_stat_str()}")
 
         population = self.sort_population(population)
         pool.close()
         return chkpt, population[:self.num_population]
 
+    def memo_stat_str(self):
+        if not self.use_memo or not self.memo_stats:
+            return ""
+        return f", Duplicates: {self.memo_stats[-1]['duplicate_rate']*100:.1f}%"
+
     def calculate_equivalent_num_pe(self, population):
         for idx in range(len(population)):
             indv = population[idx]
@@ -1138,6 +1198,7 @@ class GAMMA(object):
         self.parents_ratio = parents_ratio
         self.num_elite = int(num_population * elite_ratio)
         self.best_reward_list = []
+        self.memo_stats = []
         self.best_reward = [-float("Inf") for _ in range(len(self.fitness_objective))]
         self.best_activity = None
         self.best_sol = None
@@ -29,6 +29,8 @@ flags.DEFINE_string('summary_dir', 'test', 'Directory to save the summary.')
 flags.DEFINE_string('reward_formulation', 'latency', 'Reward formulation to use')
 flags.DEFINE_string('traject_dir','ga_trajectories', 'Directory to save the dataset.')
 flags.DEFINE_bool('use_envlogger', False, 'Whether to use envlogger.')
+flags.DEFINE_bool('whole_network', False, 'Evaluate every layer of the workload instead of layer_id.')
+flags.DEFINE_integer('num_workers', None, 'Maestro processes per whole network evaluation (default: one per core).')
 
 FLAGS = flags.FLAGS
 
@@ -71,9 +73,20 @@ def wrap_in_envlogger(env, envlogger_dir):
     else:
         return env
 
+_env = None
+
+def get_env():
+    # the env (and with whole_network its maestro process pool) is built once for all the evaluations
+    global _env
+    if _env is None:
+        _env = maestero_wrapper.make_maestro_env(rl_form='random_walker', reward_formulation=FLAGS.reward_formulation,
+                                                 workload=FLAGS.workload, layer_id=FLAGS.layer_id,
+                                                 network=FLAGS.whole_network, num_workers=FLAGS.num_workers)
+    return _env
+
 def Mastero_optimization_function(p):
     
-    env = maestero_wrapper.make_maestro_env(rl_form='random_walker', reward_formulation=FLAGS.reward_formulation)
+    env = get_env()
     maestro_helpers = helpers()
     fitness_hist = {}
 
@@ -25,6 +25,8 @@ flags.DEFINE_string('traject_dir',
             'Directory to save the dataset.')
 flags.DEFINE_string('summary_dir', ".", 'Directory to save the dataset.')
 flags.DEFINE_string('reward_formulation', 'latency', 'Which reward formulation to use?')
+flags.DEFINE_bool('whole_network', False, 'Evaluate every layer of the workload instead of layer 2.')
+flags.DEFINE_integer('num_workers', None, 'Maestro processes per whole network evaluation (default: one per core).')
 FLAGS = flags.FLAGS
 
 
@@ -73,7 +75,9 @@ def wrap_in_envlogger(env, envlogger_dir):
         return env
 
 def main(_):
-    env = maestero_wrapper.make_maestro_env(rl_form='random_walker', reward_formulation=FLAGS.reward_formulation)
+    env = maestero_wrapper.make_maestro_env(rl_form='random_walker', reward_formulation=FLAGS.reward_formulation,
+                                            workload=FLAGS.workload, network=FLAGS.whole_network,
+                                            num_workers=FLAGS.num_workers)
     
     maestro_helper = helpers()
     
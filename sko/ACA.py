@@ -4,15 +4,17 @@
 # @Author  : github.com/guofei9987
 
 import numpy as np
+from .base import SkoBase
+from .tools import func_transformer
 
 
-class ACA_TSP:
+class ACA_TSP(SkoBase):
     def __init__(self, func, n_dim,
                  size_pop=10, max_iter=20,
                  distance_matrix=None,
                  alpha=1, beta=2, rho=0.1,
                  ):
-        self.func = func
+        self.func = func_transformer(func)
         self.n_dim = n_dim  # 城市数量
         self.size_pop = size_pop  # 蚂蚁数量
         self.max_iter = max_iter  # 迭代次数
@@ -23,28 +25,44 @@ class ACA_TSP:
         self.prob_matrix_distance = 1 / (distance_matrix + 1e-10 * np.eye(n_dim, n_dim))  # 避免除零错误
 
         self.Tau = np.ones((n_dim, n_dim))  # 信息素矩阵，每次迭代都会更新
-        self.Table = np.zeros((size_pop, n_dim)).astype(np.int)  # 某一代每个蚂蚁的爬行路径
+        self.Table = np.zeros((size_pop, n_dim), dtype=int)  # 某一代每个蚂蚁的爬行路径
         self.y = None  # 某一代每个蚂蚁的爬行总距离
         self.generation_best_X, self.generation_best_Y = [], []  # 记录各代的最佳情况
         self.x_best_history, self.y_best_history = self.generation_best_X, self.generation_best_Y  # 历史原因，为了保持统一
         self.best_x, self.best_y = None, None
 
+    def build_tours(self, prob_matrix):
+        # 所有蚂蚁同时爬行：每一步按未访问节点的转移概率累积和抽样下一个节点
+        ants = np.arange(self.size_pop)
+        self.Table[:, 0] = 0  # start point，其实可以随机，但没什么区别
+        allowed = np.ones((self.size_pop, self.n_dim), dtype=bool)  # 还没经过的点
+        allowed[:, 0] = False
+        for k in range(self.n_dim - 1):  # 蚂蚁到达的每个节点
+            prob = prob_matrix[self.Table[:, k]] * allowed  # 已经经过的点概率为0
+            cum_prob = prob.cumsum(axis=1)
+            total = cum_prob[:, -1]
+            stuck = ~(total > 0)  # 概率下溢时在未访问的点中均匀选择
+            if stuck.any():
+                cum_prob[stuck] = allowed[stuck].cumsum(axis=1)
+                total = cum_prob[:, -1]
+            r = np.random.rand(self.size_pop) * total
+            next_point = (cum_prob <= r[:, np.newaxis]).sum(axis=1)
+            # 浮点误差可能越过最后一个可选点，回退到该蚂蚁最后一个可选点
+            overflow = (next_point >= self.n_dim) | ~allowed[ants, np.minimum(next_point, self.n_dim - 1)]
+            if overflow.any():
+                next_point[overflow] = self.n_dim - 1 - np.argmax(allowed[overflow, ::-1], axis=1)
+            self.Table[:, k + 1] = next_point
+            allowed[ants, next_point] = False
+        return self.Table
+
     def run(self, max_iter=None):
         self.max_iter = max_iter or self.max_iter
-        for i in range(self.max_iter):  # 对每次迭代
+        for i in self.iter_range(self.max_iter):  # 对每次迭代
             prob_matrix = (self.Tau ** self.alpha) * (self.prob_matrix_distance) ** self.beta  # 转移概率，无须归一化。
-            for j in range(self.size_pop):  # 对每个蚂蚁
-                self.Table[j, 0] = 0  # start point，其实可以随机，但没什么区别
-                for k in range(self.n_dim - 1):  # 蚂蚁到达的每个节点
-                    taboo_set = set(self.Table[j, :k + 1])  # 已经经过的点和当前点，不能再次经过
-                    allow_list = list(set(range(self.n_dim)) - taboo_set)  # 在这些点中做选择
-                    prob = prob_matrix[self.Table[j, k], allow_list]
-                    prob = prob / prob.sum()  # 概率归一化
-                    next_point = np.random.choice(allow_list, size=1, p=prob)[0]
-                    self.Table[j, k + 1] = next_point
+            self.build_tours(prob_matrix)
 
             # 计算距离
-            y = np.array([self.func(i) for i in self.Table])
+            y = np.asarray(self.func(self.Table), dtype=float).reshape(-1)
 
             # 顺便记录历史最好情况
             index_best = y.argmin()
@@ -52,14 +70,11 @@ class ACA_TSP:
             self.generation_best_X.append(x_best)
             self.generation_best_Y.append(y_best)
 
-            # 计算需要新涂抹的信息素
-            delta_tau = np.zeros((self.n_dim, self.n_dim))
-            for j in range(self.size_pop):  # 每个蚂蚁
-                for k in range(self.n_dim - 1):  # 每个节点
-                    n1, n2 = self.Table[j, k], self.Table[j, k + 1]  # 蚂蚁从n1节点爬到n2节点
-                    delta_tau[n1, n2] += 1 / y[j]  # 涂抹的信息素
-                n1, n2 = self.Table[j, self.n_dim - 1], self.Table[j, 0]  # 蚂蚁从最后一个节点爬回到第一个节点
-                delta_tau[n1, n2] += 1 / y[j]  # 涂抹信息素
+            # 计算需要新涂抹的信息素：所有蚂蚁的所有边（含爬回起点的边）一次性累加
+            n1, n2 = self.Table, np.roll(self.Table, -1, axis=1)  # 蚂蚁从n1节点爬到n2节点
+            delta_tau = np.bincount((n1 * self.n_dim + n2).ravel(),
+                                    weights=np.repeat(1 / y, self.n_dim),
+                                    minlength=self.n_dim * self.n_dim).reshape(self.n_dim, self.n_dim)
 
             # 信息素飘散+信息素涂抹
             self.Tau = (1 - self.rho) * self.Tau + delta_tau
@@ -6,6 +6,7 @@
 
 import numpy as np
 from scipy import spatial
+from .base import SkoBase
 
 
 # class ASFA_raw:
@@ -96,7 +97,7 @@ from scipy import spatial
 #         return self.best_X, self.best_Y
 
 # %%
-class AFSA:
+class AFSA(SkoBase):
     def __init__(self, func, n_dim, size_pop=50, max_iter=300,
                  max_try_num=100, step=0.5, visual=0.3,
                  q=0.98, delta=0.5):
@@ -201,7 +202,7 @@ class AFSA:
 
     def run(self, max_iter=None):
         self.max_iter = max_iter or self.max_iter
-        for epoch in range(self.max_iter):
+        for epoch in self.iter_range(self.max_iter):
             for idx_individual in range(self.size_pop):
                 self.swarm(idx_individual)
                 self.follow(idx_individual)
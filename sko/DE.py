@@ -25,8 +25,9 @@ class DE(GeneticAlgorithmBase):
         self.crtbp()
 
     def crtbp(self):
-        # create the population
+        # create the population, its fitness is not known yet
         self.X = np.random.uniform(low=self.lb, high=self.ub, size=(self.size_pop, self.n_dim))
+        self.Y_raw, self.Y = None, None
         return self.X
 
     def chrom2x(self, Chrom):
@@ -67,18 +68,24 @@ class DE(GeneticAlgorithmBase):
     def selection(self):
         '''
         greedy selection
+        only the trial vectors U are evaluated, the fitness of X is carried over
+        from the previous generation (and evaluated once for the first one)
         '''
-        X = self.X.copy()
-        f_X = self.x2y().copy()
+        if self.Y is None:
+            self.x2y()
+        X, f_X, f_X_raw = self.X, self.Y, self.Y_raw
         self.X = U = self.U
         f_U = self.x2y()
 
-        self.X = np.where((f_X < f_U).reshape(-1, 1), X, U)
+        keep = (f_X < f_U).reshape(-1)
+        self.X = np.where(keep.reshape(-1, 1), X, U)
+        self.Y = np.where(keep, f_X, f_U)
+        self.Y_raw = self.Y if not self.has_constraint else np.where(keep, f_X_raw, self.Y_raw)
         return self.X
 
     def run(self, max_iter=None):
         self.max_iter = max_iter or self.max_iter
-        for i in range(self.max_iter):
+        for i in self.iter_range(self.max_iter):
             self.mutation()
             self.crossover()
             self.selection()
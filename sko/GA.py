@@ -75,7 +75,7 @@ class GeneticAlgorithmBase(SkoBase, metaclass=ABCMeta):
 
     def run(self, max_iter=None):
         self.max_iter = max_iter or self.max_iter
-        for i in range(self.max_iter):
+        for i in self.iter_range(self.max_iter):
             print("iter:", i)
             self.X = self.chrom2x(self.Chrom)
             self.Y = self.x2y()
@@ -164,6 +164,17 @@ class GA(GeneticAlgorithmBase):
 
         self.len_chrom = sum(self.Lind)
 
+        # precomputed segment masks for decoding the Gray code of all the variables at once (see chrom2x)
+        self.segment_start = np.concatenate([[0], self.Lind.cumsum()[:-1]]).astype(int)
+        segment_id = np.repeat(np.arange(self.n_dim), self.Lind)
+        # gene k of a segment is bit Lind-1-k of the integer the segment encodes
+        gene_weight = 2 ** (self.Lind[segment_id] - 1 - (np.arange(self.len_chrom) - self.segment_start[segment_id]))
+        self.segment_weight = np.zeros((self.len_chrom, self.n_dim), dtype=np.int64)
+        self.segment_weight[np.arange(self.len_chrom), segment_id] = gene_weight
+        self.segment_max = 2 ** self.Lind.astype(np.int64) - 1
+        # with an integer precision, the variable is lb + k * precision exactly
+        self.int_grid = self.precision % 1 == 0
+
         self.crtbp()
 
     def crtbp(self):
@@ -181,22 +192,24 @@ class GA(GeneticAlgorithmBase):
         return (b * mask).sum(axis=1) / mask.sum()
 
     def chrom2x(self, Chrom):
-        cumsum_len_segment = self.Lind.cumsum()
-        X = np.zeros(shape=(self.size_pop, self.n_dim))
-        for i, j in enumerate(cumsum_len_segment):
-            if i == 0:
-                Chrom_temp = Chrom[:, :cumsum_len_segment[0]]
-            else:
-                Chrom_temp = Chrom[:, cumsum_len_segment[i - 1]:cumsum_len_segment[i]]
-            X[:, i] = self.gray2rv(Chrom_temp)
+        # Gray code to binary is a running xor within the segment. That is the running xor over the whole chromosome,
+        # flipped if the genes before the segment have an odd parity. The integers are exact, so is the flip:
+        # a flipped segment encodes segment_max - (integer of the unflipped one)
+        parity = np.bitwise_xor.accumulate(Chrom, axis=1).astype(np.int64)
+        K = parity @ self.segment_weight
+        flipped = np.zeros(K.shape, dtype=bool)
+        flipped[:, 1:] = parity[:, self.segment_start[1:] - 1] == 1
+        K = np.where(flipped, self.segment_max - K, K)
 
         if self.int_mode:
-            X = self.lb + (self.ub_extend - self.lb) * X
+            X = np.where(self.int_grid, self.lb + K * self.precision,
+                         self.lb + (self.ub_extend - self.lb) * (K / self.segment_max))
             X = np.where(X > self.ub, self.ub, X)
             # the ub may not obey precision, which is ok.
             # for example, if precision=2, lb=0, ub=5, then x can be 5
         else:
-            X = self.lb + (self.ub - self.lb) * X
+            X = np.where(self.int_grid, self.lb + K * self.precision,
+                         self.lb + (self.ub - self.lb) * (K / self.segment_max))
         return X
 
     ranking = ranking.ranking
@@ -223,22 +236,7 @@ class GA(GeneticAlgorithmBase):
             We do not intend to make all operators as tensor,
             because objective function is probably not for pytorch
             '''
-            Chrom = Chrom.cpu().numpy()
-            cumsum_len_segment = self.Lind.cumsum()
-            X = np.zeros(shape=(self.size_pop, self.n_dim))
-            for i, j in enumerate(cumsum_len_segment):
-                if i == 0:
-                    Chrom_temp = Chrom[:, :cumsum_len_segment[0]]
-                else:
-                    Chrom_temp = Chrom[:, cumsum_len_segment[i - 1]:cumsum_len_segment[i]]
-                X[:, i] = self.gray2rv(Chrom_temp)
-
-            if self.int_mode:
-                X = self.lb + (self.ub_extend - self.lb) * X
-                X = np.where(X > self.ub, self.ub, X)
-            else:
-                X = self.lb + (self.ub - self.lb) * X
-            return X
+            return GA.chrom2x(self, Chrom.cpu().numpy())
 
         self.register('mutation', mutation_gpu.mutation). \
             register('crossover', crossover_gpu.crossover_2point_bit). \
@@ -294,31 +292,19 @@ class RCGA(GeneticAlgorithmBase):
         :param self:
         :return self.Chrom:
         '''
-        Chrom, size_pop, len_chrom, Y = self.Chrom, self.size_pop, len(self.Chrom[0]), self.FitV
-        for i in range(0, size_pop, 2):
-
-            if np.random.random() > self.prob_cros:
-                continue
-            for j in range(len_chrom):
-
-                ylow = 0
-                yup = 1
-                y1 = Chrom[i][j]
-                y2 = Chrom[i + 1][j]
-                r = np.random.random()
-                if r <= 0.5:
-                    betaq = (2 * r) ** (1.0 / (1 + 1.0))
-                else:
-                    betaq = (0.5 / (1.0 - r)) ** (1.0 / (1 + 1.0))
-
-                child1 = 0.5 * ((1 + betaq) * y1 + (1 - betaq) * y2)
-                child2 = 0.5 * ((1 - betaq) * y1 + (1 + betaq) * y2)
-
-                child1 = min(max(child1, ylow), yup)
-                child2 = min(max(child2, ylow), yup)
-
-                self.Chrom[i][j] = child1
-                self.Chrom[i + 1][j] = child2
+        Chrom, size_pop = self.Chrom, self.size_pop
+        ylow, yup = 0, 1
+        cros = np.random.random(size_pop // 2) <= self.prob_cros
+        y1, y2 = Chrom[0:size_pop:2][cros], Chrom[1:size_pop:2][cros]
+        r = np.random.random(y1.shape)
+        betaq = np.where(r <= 0.5, (2 * r) ** (1.0 / (1 + 1.0)), (0.5 / (1.0 - r)) ** (1.0 / (1 + 1.0)))
+
+        child1 = 0.5 * ((1 + betaq) * y1 + (1 - betaq) * y2)
+        child2 = 0.5 * ((1 - betaq) * y1 + (1 + betaq) * y2)
+
+        pair = np.nonzero(cros)[0] * 2
+        self.Chrom[pair] = np.clip(child1, ylow, yup)
+        self.Chrom[pair + 1] = np.clip(child2, ylow, yup)
         return self.Chrom
 
     def mutation(self):
@@ -330,28 +316,20 @@ class RCGA(GeneticAlgorithmBase):
         '''
         #
         size_pop, n_dim, Chrom= self.size_pop, self.n_dim, self.Chrom
-        for i in range(size_pop):
-            for j in range(n_dim):
-                r = np.random.random()
-                if r <= self.prob_mut:
-                    y = Chrom[i][j]
-                    ylow = 0
-                    yup = 1
-                    delta1 = 1.0 * (y - ylow) / (yup - ylow)
-                    delta2 = 1.0 * (yup - y) / (yup - ylow)
-                    r = np.random.random()
-                    mut_pow = 1.0 / (1 + 1.0)
-                    if r <= 0.5:
-                        xy = 1.0 - delta1
-                        val = 2.0 * r + (1.0 - 2.0 * r) * (xy ** (1 + 1.0))
-                        deltaq = val ** mut_pow - 1.0
-                    else:
-                        xy = 1.0 - delta2
-                        val = 2.0 * (1.0 - r) + 2.0 * (r - 0.5) * (xy ** (1 + 1.0))
-                        deltaq = 1.0 - val ** mut_pow
-                    y = y + deltaq * (yup - ylow)
-                    y = min(yup, max(y, ylow))
-                    self.Chrom[i][j] = y
+        ylow, yup = 0, 1
+        mut = np.random.random((size_pop, n_dim)) <= self.prob_mut
+        y = Chrom[mut]
+        delta1 = 1.0 * (y - ylow) / (yup - ylow)
+        delta2 = 1.0 * (yup - y) / (yup - ylow)
+        r = np.random.random(y.shape)
+        mut_pow = 1.0 / (1 + 1.0)
+        with np.errstate(invalid='ignore'):
+            # only one of the branches is valid for every gene
+            deltaq = np.where(r <= 0.5,
+                              (2.0 * r + (1.0 - 2.0 * r) * ((1.0 - delta1) ** (1 + 1.0))) ** mut_pow - 1.0,
+                              1.0 - (2.0 * (1.0 - r) + 2.0 * (r - 0.5) * ((1.0 - delta2) ** (1 + 1.0))) ** mut_pow)
+        y = y + deltaq * (yup - ylow)
+        self.Chrom[mut] = np.clip(y, ylow, yup)
         return self.Chrom
 
     ranking = ranking.ranking
@@ -423,7 +401,7 @@ class GA_TSP(GeneticAlgorithmBase):
 
     def run(self, max_iter=None):
         self.max_iter = max_iter or self.max_iter
-        for i in range(self.max_iter):
+        for i in self.iter_range(self.max_iter):
             print(i)
             Chrom_old = self.Chrom.copy()
             self.X = self.chrom2x(self.Chrom)
@@ -177,8 +177,9 @@ class PSO(SkoBase):
         N: int
         '''
         self.max_iter = max_iter or self.max_iter
-        c = 0
-        for iter_num in range(self.max_iter):
+        if not self.resume_iter:
+            self.stay_counter = 0
+        for iter_num in self.iter_range(self.max_iter):
             self.update_V()
             self.recorder()
             self.update_X()
@@ -188,11 +189,11 @@ class PSO(SkoBase):
             if precision is not None:
                 tor_iter = np.amax(self.pbest_y) - np.amin(self.pbest_y)
                 if tor_iter < precision:
-                    c = c + 1
-                    if c > N:
+                    self.stay_counter = self.stay_counter + 1
+                    if self.stay_counter > N:
                         break
                 else:
-                    c = 0
+                    self.stay_counter = 0
             if self.verbose:
                 print('Iter: {}, Best fit: {} at {}'.format(iter_num, self.gbest_y, self.gbest_x))
 
@@ -6,6 +6,7 @@
 import numpy as np
 from .base import SkoBase
 from sko.operators import mutation
+from sko.tools import func_transformer
 
 
 class SimulatedAnnealingBase(SkoBase):
@@ -68,17 +69,21 @@ class SimulatedAnnealingBase(SkoBase):
         return abs(a - b) <= max(rel_tol * max(abs(a), abs(b)), abs_tol)
 
     def run(self):
-        x_current, y_current = self.best_x, self.best_y
-        stay_counter = 0
-        while True:
+        # the current solution and the stay counter are attributes, so that a snapshot resumes with them
+        if not self.resume_iter:
+            self.x_current, self.y_current = self.best_x, self.best_y
+            self.stay_counter = 0
+            self.stop_code = None
+        self.resume_iter = 0
+        while self.stop_code is None:
             for i in range(self.L):
-                x_new = self.get_new_x(x_current)
+                x_new = self.get_new_x(self.x_current)
                 y_new = self.func(x_new)
 
                 # Metropolis
-                df = y_new - y_current
+                df = y_new - self.y_current
                 if df < 0 or np.exp(-df / self.T) > np.random.rand():
-                    x_current, y_current = x_new, y_new
+                    self.x_current, self.y_current = x_new, y_new
                     if y_new < self.best_y:
                         self.best_x, self.best_y = x_new, y_new
 
@@ -89,16 +94,17 @@ class SimulatedAnnealingBase(SkoBase):
 
             # if best_y stay for max_stay_counter times, stop iteration
             if self.isclose(self.best_y_history[-1], self.best_y_history[-2]):
-                stay_counter += 1
+                self.stay_counter += 1
             else:
-                stay_counter = 0
+                self.stay_counter = 0
 
             if self.T < self.T_min:
-                stop_code = 'Cooled to final temperature'
-                break
-            if stay_counter > self.max_stay_counter:
-                stop_code = 'Stay unchanged in the last {stay_counter} iterations'.format(stay_counter=stay_counter)
-                break
+                self.stop_code = 'Cooled to final temperature'
+            elif self.stay_counter > self.max_stay_counter:
+                self.stop_code = 'Stay unchanged in the last {stay_counter} iterations'.format(
+                    stay_counter=self.stay_counter)
+            self.iteration_done(self.iter_cycle)
+        self.flush_func_cache()
 
         return self.best_x, self.best_y
 
@@ -227,3 +233,144 @@ class SA_TSP(SimulatedAnnealingBase):
             x_new = mutation.transpose(x_new)
 
         return x_new
+
+
+class SAParallelTempering(SkoBase):
+    """
+    Parallel tempering (replica exchange) simulated annealing.
+
+    n_chains chains anneal side by side, each at its own temperature of a
+    geometric ladder from T (the annealing temperature) down to
+    T * ladder_ratio. Every step proposes one move per chain and evaluates the
+    whole batch with one call of the objective, so a vectorized objective or a
+    parallel one (set_run_mode, sko.evaluator.ProcessPoolEvaluator) keeps up to
+    n_chains simulations in flight. The Metropolis acceptance is vectorized
+    over the chains. Every swap_every cycles, neighbouring chains exchange
+    their states with probability min(1, exp((y_i - y_j) * (1 / T_i - 1 / T_j))).
+
+    Parameters
+    ----------------
+    func : function
+        The func you want to do optimal, called with one solution (or batches
+        of solutions, depending on its run mode, see sko.tools.func_transformer)
+    x0 : array, shape is n_dim
+        initial solution of every chain
+    n_chains : int
+        number of chains, i.e. solutions evaluated per step
+    ladder_ratio : float between 0 and 1
+        temperature of the coldest chain relative to the hottest one
+    swap_every : int
+        cycles (temperature steps) between two rounds of swaps
+    sa : class
+        the SA variant that proposes moves and cools down (SAFast, SABoltzmann,
+        SACauchy, SA_TSP, ...). T_max, T_min, L, max_stay_counter and kwargs
+        (e.g. lb, ub) are passed to it
+
+    Attributes
+    ----------------------
+    X, Y : current solutions and their values, one row per chain
+    n_swaps, n_swap_attempts : exchanges accepted/tried so far
+
+    Examples
+    -------------
+    ```py
+    evaluator = ProcessPoolEvaluator(fitness, n_workers=8)
+    sa = SAParallelTempering(func=evaluator, x0=x0, n_chains=8, lb=lb, ub=ub, L=50)
+    best_x, best_y = sa.run()
+    ```
+    """
+
+    def __init__(self, func, x0, n_chains=8, ladder_ratio=0.01, swap_every=1, sa=SAFast,
+                 T_max=100, T_min=1e-7, L=300, max_stay_counter=150, **kwargs):
+        assert n_chains >= 1, 'n_chains >= 1'
+        assert 0 < ladder_ratio <= 1, '0 < ladder_ratio <= 1'
+        self.sa = sa(func, x0, T_max, T_min, L, max_stay_counter, **kwargs)
+        self.func = func_transformer(func)
+        self.n_chains = int(n_chains)
+        self.swap_every = swap_every
+        # chain k runs at T * ladder[k], chain 0 is the hottest
+        self.ladder = ladder_ratio ** (np.arange(self.n_chains) / max(self.n_chains - 1, 1))
+
+        self.X = np.array([self.sa.best_x] * self.n_chains)
+        self.Y = np.full(self.n_chains, self.sa.best_y, dtype=float)
+        self.n_swaps, self.n_swap_attempts = 0, 0
+
+    def __getattr__(self, name):
+        # T, best_x, best_y, the histories, ... live in the SA instance
+        if name == 'sa':
+            raise AttributeError(name)
+        return getattr(self.sa, name)
+
+    def get_new_X(self):
+        # one proposal per chain, at the temperature of the chain
+        sa, T = self.sa, self.sa.T
+        try:
+            X_new = []
+            for x, ladder_step in zip(self.X, self.ladder):
+                sa.T = T * ladder_step
+                X_new.append(sa.get_new_x(x))
+        finally:
+            sa.T = T
+        return np.array(X_new)
+
+    def swap_chains(self, T_chains):
+        # alternate between the pairs (0, 1), (2, 3), ... and (1, 2), (3, 4), ...
+        first = (self.sa.iter_cycle // self.swap_every) % 2
+        i = np.arange(first, self.n_chains - 1, 2)
+        if len(i) == 0:
+            return
+        j = i + 1
+        with np.errstate(over='ignore'):
+            swap = np.random.rand(len(i)) < np.exp((self.Y[i] - self.Y[j]) * (1 / T_chains[i] - 1 / T_chains[j]))
+        i, j = i[swap], j[swap]
+        self.X[i], self.X[j] = self.X[j], self.X[i].copy()
+        self.Y[i], self.Y[j] = self.Y[j], self.Y[i].copy()
+        self.n_swap_attempts += len(swap)
+        self.n_swaps += len(i)
+
+    def run(self):
+        sa = self.sa
+        if not self.resume_iter:
+            self.stay_counter = 0
+            self.stop_code = None
+        self.resume_iter = 0
+        while self.stop_code is None:
+            T_chains = sa.T * self.ladder
+            for i in range(sa.L):
+                X_new = self.get_new_X()
+                Y_new = np.asarray(self.func(X_new), dtype=float).reshape(-1)
+
+                # Metropolis, for all the chains at once
+                df = Y_new - self.Y
+                with np.errstate(over='ignore'):
+                    accept = (df < 0) | (np.exp(-df / T_chains) > np.random.rand(self.n_chains))
+                self.X[accept], self.Y[accept] = X_new[accept], Y_new[accept]
+
+                best = Y_new.argmin()
+                if Y_new[best] < sa.best_y:
+                    sa.best_x, sa.best_y = X_new[best].copy(), Y_new[best]
+
+            sa.iter_cycle += 1
+            if self.n_chains > 1 and sa.iter_cycle % self.swap_every == 0:
+                self.swap_chains(T_chains)
+            sa.cool_down()
+            sa.generation_best_Y.append(sa.best_y)
+            sa.generation_best_X.append(sa.best_x)
+
+            # if best_y stay for max_stay_counter times, stop iteration
+            if sa.isclose(sa.best_y_history[-1], sa.best_y_history[-2]):
+                self.stay_counter += 1
+            else:
+                self.stay_counter = 0
+
+            if sa.T < sa.T_min:
+                self.stop_code = 'Cooled to final temperature'
+            elif self.stay_counter > sa.max_stay_counter:
+                self.stop_code = 'Stay unchanged in the last {stay_counter} iterations'.format(
+                    stay_counter=self.stay_counter)
+            self.iteration_done(sa.iter_cycle)
+        self.flush_func_cache()
+
+        return sa.best_x, sa.best_y
+
+    fit = run
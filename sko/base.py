@@ -1,9 +1,17 @@
 from abc import ABCMeta, abstractmethod
+import pickle
 import types
 import warnings
+import numpy as np
+from .tools import dump_atomic
 
 
 class SkoBase(metaclass=ABCMeta):
+    # attributes that are not part of a snapshot: they are given again when the optimizer is built
+    unsaved_attributes = ('func', 'constraint_eq', 'constraint_ueq', 'checkpoint_path', 'checkpoint_every')
+    checkpoint_path, checkpoint_every = None, 1
+    resume_iter = 0  # iterations already done by the run a snapshot was resumed from
+
     def register(self, operator_name, operator, *args, **kwargs):
         '''
         regeister udf to the class
@@ -25,6 +33,99 @@ class SkoBase(metaclass=ABCMeta):
                       , DeprecationWarning)
         return self.run(*args, **kwargs)
 
+    def checkpoint(self, path, every=1):
+        '''
+        write a snapshot of the optimizer to path every `every` iterations of run()
+        :param path: string, snapshot file, replaced atomically at every write
+        :param every: int
+        :return: self
+        '''
+        self.checkpoint_path, self.checkpoint_every = path, int(every)
+        return self
+
+    def state_dict(self):
+        '''
+        picklable snapshot of the optimizer: population, best-so-far, counters and
+        histories. func, the constraints and registered operators are left out.
+        '''
+        state = dict()
+        for name, value in vars(self).items():
+            if name in self.unsaved_attributes or callable(value):
+                continue
+            state[name] = value.state_dict() if isinstance(value, SkoBase) else value
+        return state
+
+    def load_state_dict(self, state):
+        for name, value in state.items():
+            current = vars(self).get(name)
+            if isinstance(current, SkoBase):
+                current.load_state_dict(value)
+            else:
+                setattr(self, name, value)
+        return self
+
+    def save_checkpoint(self, path=None):
+        '''
+        write the state_dict and the numpy RNG state to path (checkpoint_path by default).
+        The snapshot is written to a temporary file which then replaces path, so
+        a crash while writing leaves the previous snapshot intact.
+        '''
+        snapshot = {'optimizer': type(self).__name__,
+                    'state': self.state_dict(),
+                    'random_state': np.random.get_state()}
+        return dump_atomic(snapshot, path or self.checkpoint_path)
+
+    def resume_from(self, path):
+        '''
+        restore a snapshot written by save_checkpoint. The optimizer has to be
+        built with the same func and arguments as the one that wrote it; the
+        next run() then continues where that run stopped, with the same random
+        draws, so it ends with the same result as an uninterrupted run.
+        '''
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+        if snapshot['optimizer'] != type(self).__name__:
+            raise ValueError('{} is a snapshot of {}, not of {}'.format(
+                path, snapshot['optimizer'], type(self).__name__))
+        self.load_state_dict(snapshot['state'])
+        np.random.set_state(snapshot['random_state'])
+        return self
+
+    def flush_func_cache(self):
+        '''
+        save the values func's FuncCache (see tools.set_cache) has not written to its file yet
+        '''
+        cache = getattr(getattr(self, 'func', None), 'cache', None)
+        if cache is not None:
+            cache.flush()
+
+    def iteration_done(self, n_done):
+        '''
+        called by run() after each iteration, writes a snapshot every checkpoint_every iterations
+        '''
+        if self.checkpoint_path is None or n_done % self.checkpoint_every != 0:
+            return
+        self.flush_func_cache()
+        self.resume_iter = n_done
+        try:
+            self.save_checkpoint()
+        finally:
+            self.resume_iter = 0
+
+    def iter_range(self, max_iter):
+        '''
+        range(max_iter) for the loop of run(): it starts after the last iteration
+        of a resumed snapshot, and calls iteration_done after every iteration
+        '''
+        start, self.resume_iter = self.resume_iter, 0
+        try:
+            for i in range(start, max_iter):
+                yield i
+                self.iteration_done(i + 1)
+        finally:
+            # also when run() stops early
+            self.flush_func_cache()
+
 
 class Problem(object):
     pass
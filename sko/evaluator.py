@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import traceback
+import multiprocessing
+from multiprocessing.connection import wait as wait_connections
+
+import numpy as np
+
+
+def _worker_loop(func, setup, worker_id, scratch_dir, task_queue, result_conn):
+    '''
+    body of one long-lived worker: build the warm state once, then evaluate
+    individuals until a None task arrives
+    '''
+    os.makedirs(scratch_dir, exist_ok=True)
+    try:
+        state = setup(worker_id, scratch_dir) if setup is not None else None
+    except Exception:
+        result_conn.send((None, None, traceback.format_exc()))
+        return
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        serial, x = task
+        try:
+            y = func(x, state) if setup is not None else func(x)
+            result_conn.send((serial, float(np.asarray(y).reshape(-1)[0]), None))
+        except Exception:
+            result_conn.send((serial, None, traceback.format_exc()))
+
+
+class _Worker:
+    def __init__(self, worker_id, evaluator):
+        self.worker_id = worker_id
+        self.scratch_dir = os.path.join(evaluator.scratch_root, 'worker_{}'.format(worker_id))
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+        # the task queue and the result pipe are private to the worker: killing it can
+        # only leave them in a broken state, and they are dropped along with it
+        self.task_queue = evaluator.ctx.SimpleQueue()
+        self.result_conn, child_conn = evaluator.ctx.Pipe(duplex=False)
+        self.process = evaluator.ctx.Process(
+            target=_worker_loop,
+            args=(evaluator.func, evaluator.setup, worker_id, self.scratch_dir,
+                  self.task_queue, child_conn),
+            daemon=True)
+        self.process.start()
+        child_conn.close()  # so that result_conn reports EOF once the worker is gone
+        self.idx = None  # index of the individual in flight
+        self.serial = None  # unique id of the task in flight
+        self.deadline = None
+
+    def submit(self, serial, idx, x, timeout):
+        self.serial, self.idx = serial, idx
+        self.deadline = None if timeout is None else time.time() + timeout
+        self.task_queue.put((serial, x))
+
+    def release(self):
+        self.serial, self.idx, self.deadline = None, None, None
+
+    def stop(self):
+        if self.process.is_alive():
+            self.task_queue.put(None)
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.result_conn.close()
+
+    def receive(self):
+        '''
+        (serial, y, error) sent by the worker, serial is None if its setup failed.
+        None if the worker is gone
+        '''
+        try:
+            return self.result_conn.recv()
+        except (EOFError, OSError):
+            return None
+
+
+class ProcessPoolEvaluator:
+    """
+    Evaluate a whole population with a fixed-size pool of long-lived worker processes.
+
+    Each worker calls setup(worker_id, scratch_dir) once and keeps the returned
+    state (typically a warm simulator environment) for its whole lifetime, so
+    expensive environments are not rebuilt for every individual. Every worker
+    gets a private scratch directory.
+
+    Parameters
+    ----------------
+    func : function
+        Objective. Called as func(x) or, when setup is given, func(x, state)
+    n_workers : int
+        Number of worker processes (default: number of cpus)
+    setup : function or None
+        setup(worker_id, scratch_dir) -> state, run once in every worker
+    timeout : float or None
+        Seconds allowed for one evaluation. A worker that exceeds it is killed,
+        restarted and the individual gets `penalty`
+    penalty : float
+        Objective value assigned to individuals that fail or time out
+    max_in_flight : int or None
+        Bound on concurrently running evaluations (default: n_workers)
+    scratch_root : str or None
+        Directory holding the per-worker scratch directories (default: a temporary one)
+    max_setup_failures : int
+        A worker whose setup fails is restarted and its individual resubmitted.
+        After this many setup failures in a row, map raises RuntimeError
+
+    The evaluator is a drop-in `func` for every sko optimizer: it consumes a
+    whole population at once (run mode 'vectorization') and returns a scalar
+    when called with a single individual, as SA, AFSA and ACA_TSP do.
+
+    Examples
+    -------------
+    ```py
+    evaluator = ProcessPoolEvaluator(fitness, n_workers=32, setup=make_env, timeout=600)
+    ga = GA(func=evaluator, n_dim=10, size_pop=32, max_iter=100, lb=lb, ub=ub)
+    best_x, best_y = ga.run()
+    evaluator.close()
+    ```
+    """
+
+    mode = 'vectorization'
+
+    def __init__(self, func, n_workers=None, setup=None, timeout=None, penalty=1e20,
+                 max_in_flight=None, scratch_root=None, max_setup_failures=3):
+        self.func = func
+        self.setup = setup
+        self.n_workers = n_workers or os.cpu_count()
+        self.timeout = timeout
+        self.penalty = penalty
+        self.max_setup_failures = max_setup_failures
+        self.max_in_flight = min(max_in_flight or self.n_workers, self.n_workers)
+
+        self.own_scratch_root = scratch_root is None
+        self.scratch_root = scratch_root or tempfile.mkdtemp(prefix='sko_eval_')
+        os.makedirs(self.scratch_root, exist_ok=True)
+
+        self.ctx = multiprocessing.get_context()
+        self.workers = {}
+        self.serial = 0
+
+        self.n_evaluations = 0
+        self.n_failures = 0
+        self.n_timeouts = 0
+        self.n_setup_failures = 0  # in a row, reset by every evaluation that returns
+
+    def start(self):
+        for worker_id in range(self.n_workers):
+            if worker_id not in self.workers:
+                self.workers[worker_id] = _Worker(worker_id, self)
+        return self
+
+    def _restart(self, worker):
+        worker.kill()
+        self.workers[worker.worker_id] = _Worker(worker.worker_id, self)
+
+    def map(self, X):
+        '''
+        evaluate every row of X, at most max_in_flight at a time
+        :param X: array_like, shape (size_pop, n_dim)
+        :return: numpy.array of shape (size_pop,)
+        '''
+        self.start()
+        X = np.asarray(X)
+        Y = np.full(len(X), self.penalty, dtype=float)
+        pending = list(range(len(X)))[::-1]
+        busy = {}
+
+        while pending or busy:
+            # fill idle workers up to the concurrency bound
+            for worker in list(self.workers.values()):
+                if not pending or len(busy) >= self.max_in_flight:
+                    break
+                if worker.worker_id not in busy:
+                    idx = pending.pop()
+                    self.serial += 1
+                    worker.submit(self.serial, idx, X[idx], self.timeout)
+                    busy[worker.worker_id] = worker
+
+            deadlines = [w.deadline for w in busy.values() if w.deadline is not None]
+            wait = 1.0 if not deadlines else min(1.0, max(0.0, min(deadlines) - time.time()))
+            ready = wait_connections([w.result_conn for w in busy.values()], timeout=wait)
+
+            for worker in [w for w in list(busy.values()) if w.result_conn in ready]:
+                result = worker.receive()
+                if result is None:
+                    print('[ProcessPoolEvaluator] worker {} died'.format(worker.worker_id))
+                    self.n_failures += 1
+                    self.n_evaluations += 1
+                    del busy[worker.worker_id]
+                    self._restart(worker)
+                    continue
+                serial, y, error = result
+                if serial is None:
+                    # setup failed and the worker has exited: the individual goes to another worker
+                    print('[ProcessPoolEvaluator] setup failed in worker {}:\n{}'.format(worker.worker_id, error))
+                    self.n_setup_failures += 1
+                    pending.append(worker.idx)
+                    del busy[worker.worker_id]
+                    self._restart(worker)
+                    if self.n_setup_failures >= self.max_setup_failures:
+                        raise RuntimeError('[ProcessPoolEvaluator] setup failed {} times in a row:\n{}'.format(
+                            self.n_setup_failures, error))
+                    continue
+                if serial != worker.serial:
+                    continue
+                self.n_setup_failures = 0
+                if error is not None:
+                    print('[ProcessPoolEvaluator] evaluation failed:\n{}'.format(error))
+                    self.n_failures += 1
+                else:
+                    Y[worker.idx] = y
+                self.n_evaluations += 1
+                busy.pop(worker.worker_id).release()
+
+            now = time.time()
+            for worker in list(busy.values()):
+                if worker.deadline is not None and now > worker.deadline:
+                    print('[ProcessPoolEvaluator] evaluation {} timed out after {}s'.format(worker.idx, self.timeout))
+                    self.n_timeouts += 1
+                elif not worker.process.is_alive() and not worker.result_conn.poll():
+                    print('[ProcessPoolEvaluator] worker {} died'.format(worker.worker_id))
+                    self.n_failures += 1
+                else:
+                    continue
+                self.n_evaluations += 1
+                del busy[worker.worker_id]
+                self._restart(worker)
+
+        return Y
+
+    def __call__(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            return self.map(X.reshape(1, -1))[0]
+        return self.map(X)
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.stop()
+            worker.result_conn.close()
+        self.workers = {}
+        if self.own_scratch_root:
+            shutil.rmtree(self.scratch_root, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
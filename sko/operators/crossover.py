@@ -3,25 +3,40 @@ import numpy as np
 __all__ = ['crossover_1point', 'crossover_2point', 'crossover_2point_bit', 'crossover_pmx', 'crossover_2point_prob']
 
 
+def _segment_mask(n1, n2, len_chrom):
+    # mask of shape (len(n1), len_chrom), row i is True in [n1[i], n2[i])
+    genes = np.arange(len_chrom)
+    return (genes >= n1[:, None]) & (genes < n2[:, None])
+
+
+def _two_points(size, len_chrom):
+    n = np.random.randint(0, len_chrom, (size, 2))
+    n.sort(axis=1)
+    return n[:, 0], n[:, 1]
+
+
+def _swap_pairs(Chrom, mask):
+    # swap the masked genes of every pair of neighbours (0 with 1, 2 with 3, ...) in place
+    Chrom1, Chrom2 = Chrom[0::2], Chrom[1::2]
+    seg1 = Chrom1[mask]
+    Chrom1[mask] = Chrom2[mask]
+    Chrom2[mask] = seg1
+    return Chrom
+
+
 def crossover_1point(self):
     Chrom, size_pop, len_chrom = self.Chrom, self.size_pop, self.len_chrom
-    for i in range(0, size_pop, 2):
-        n = np.random.randint(0, self.len_chrom)
-        # crossover at the point n
-        seg1, seg2 = self.Chrom[i, n:].copy(), self.Chrom[i + 1, n:].copy()
-        self.Chrom[i, n:], self.Chrom[i + 1, n:] = seg2, seg1
+    n = np.random.randint(0, len_chrom, size_pop // 2)
+    # crossover at the point n
+    _swap_pairs(Chrom, _segment_mask(n, np.full_like(n, len_chrom), len_chrom))
     return self.Chrom
 
 
 def crossover_2point(self):
     Chrom, size_pop, len_chrom = self.Chrom, self.size_pop, self.len_chrom
-    for i in range(0, size_pop, 2):
-        n1, n2 = np.random.randint(0, self.len_chrom, 2)
-        if n1 > n2:
-            n1, n2 = n2, n1
-        # crossover at the points n1 to n2
-        seg1, seg2 = self.Chrom[i, n1:n2].copy(), self.Chrom[i + 1, n1:n2].copy()
-        self.Chrom[i, n1:n2], self.Chrom[i + 1, n1:n2] = seg2, seg1
+    n1, n2 = _two_points(size_pop // 2, len_chrom)
+    # crossover at the points n1 to n2
+    _swap_pairs(Chrom, _segment_mask(n1, n2, len_chrom))
     return self.Chrom
 
 
@@ -36,20 +51,9 @@ def crossover_2point_bit(self):
     # reshape the Chrom to have shape (size_pop, len_chrom)
     Chrom = Chrom.reshape(size_pop, len_chrom)
     Chrom1, Chrom2 = Chrom[:half_size_pop], Chrom[half_size_pop:]
-    mask = np.zeros(shape=(half_size_pop, len_chrom), dtype=int)
-
-
-    for i in range(half_size_pop):
-        n1, n2 = np.random.randint(0, self.len_chrom, 2)
-        if n1 > n2:
-            n1, n2 = n2, n1
-        mask[i, n1:n2] = 1
-    print("[DEBUG][crossover_2point_bit] mask: ", mask.shape)
-    print("[DEBUG][crossover_2point_bit] Chrom1: ", Chrom1.shape)
-    print("[DEBUG][crossover_2point_bit] Chrom2: ", Chrom2.shape)
+    n1, n2 = _two_points(half_size_pop, len_chrom)
+    mask = _segment_mask(n1, n2, len_chrom)
     mask2 = (Chrom1 ^ Chrom2) & mask
-    
-    print("[DEBUG][crossover_2point_bit] mask2: ", mask2.shape)
 
     Chrom1 ^= mask2
     Chrom2 ^= mask2
@@ -61,13 +65,10 @@ def crossover_2point_prob(self, crossover_prob):
     2 points crossover with probability
     '''
     Chrom, size_pop, len_chrom = self.Chrom, self.size_pop, self.len_chrom
-    for i in range(0, size_pop, 2):
-        if np.random.rand() < crossover_prob:
-            n1, n2 = np.random.randint(0, self.len_chrom, 2)
-            if n1 > n2:
-                n1, n2 = n2, n1
-            seg1, seg2 = self.Chrom[i, n1:n2].copy(), self.Chrom[i + 1, n1:n2].copy()
-            self.Chrom[i, n1:n2], self.Chrom[i + 1, n1:n2] = seg2, seg1
+    n1, n2 = _two_points(size_pop // 2, len_chrom)
+    mask = _segment_mask(n1, n2, len_chrom)
+    mask &= (np.random.rand(size_pop // 2) < crossover_prob)[:, None]
+    _swap_pairs(Chrom, mask)
     return self.Chrom
 
 
@@ -84,6 +85,8 @@ def crossover_pmx(self):
     '''
     Executes a partially matched crossover (PMX) on Chrom.
     For more details see [Goldberg1985]_.
+    Every chromosome must be a permutation of range(len_chrom), as in GA_TSP.
+    All the pairs are crossed at once, walking over the gene positions.
 
     :param self:
     :return:
@@ -92,21 +95,25 @@ def crossover_pmx(self):
    salesman problem", 1985.
     '''
     Chrom, size_pop, len_chrom = self.Chrom, self.size_pop, self.len_chrom
-    for i in range(0, size_pop, 2):
-        Chrom1, Chrom2 = self.Chrom[i], self.Chrom[i + 1]
-        cxpoint1, cxpoint2 = np.random.randint(0, self.len_chrom - 1, 2)
-        if cxpoint1 >= cxpoint2:
-            cxpoint1, cxpoint2 = cxpoint2, cxpoint1 + 1
-        # crossover at the point cxpoint1 to cxpoint2
-        pos1_recorder = {value: idx for idx, value in enumerate(Chrom1)}
-        pos2_recorder = {value: idx for idx, value in enumerate(Chrom2)}
-        for j in range(cxpoint1, cxpoint2):
-            value1, value2 = Chrom1[j], Chrom2[j]
-            pos1, pos2 = pos1_recorder[value2], pos2_recorder[value1]
-            Chrom1[j], Chrom1[pos1] = Chrom1[pos1], Chrom1[j]
-            Chrom2[j], Chrom2[pos2] = Chrom2[pos2], Chrom2[j]
-            pos1_recorder[value1], pos1_recorder[value2] = pos1, j
-            pos2_recorder[value1], pos2_recorder[value2] = j, pos2
-
-        self.Chrom[i], self.Chrom[i + 1] = Chrom1, Chrom2
+    Chrom1, Chrom2 = Chrom[0:size_pop:2], Chrom[1:size_pop:2]
+    half_size_pop = Chrom1.shape[0]
+    cxpoint1, cxpoint2 = np.random.randint(0, len_chrom - 1, (2, half_size_pop))
+    swap = cxpoint1 >= cxpoint2
+    cxpoint1, cxpoint2 = np.where(swap, cxpoint2, cxpoint1), np.where(swap, cxpoint1 + 1, cxpoint2)
+
+    # position of every value in every chromosome
+    rows = np.arange(half_size_pop)[:, None]
+    pos1_recorder, pos2_recorder = np.empty_like(Chrom1), np.empty_like(Chrom2)
+    pos1_recorder[rows, Chrom1] = np.arange(len_chrom)
+    pos2_recorder[rows, Chrom2] = np.arange(len_chrom)
+    # crossover at the point cxpoint1 to cxpoint2
+    for j in range(cxpoint1.min(initial=len_chrom), cxpoint2.max(initial=0)):
+        i = np.nonzero((cxpoint1 <= j) & (j < cxpoint2))[0]
+        value1, value2 = Chrom1[i, j], Chrom2[i, j]
+        pos1, pos2 = pos1_recorder[i, value2], pos2_recorder[i, value1]
+        Chrom1[i, j], Chrom1[i, pos1] = value2, value1
+        Chrom2[i, j], Chrom2[i, pos2] = value1, value2
+        pos1_recorder[i, value1], pos1_recorder[i, value2] = pos1, j
+        pos2_recorder[i, value1], pos2_recorder[i, value2] = j, pos2
+
     return self.Chrom
@@ -22,11 +22,11 @@ def mutation_TSP_1(self):
     :param self:
     :return:
     '''
-    for i in range(self.size_pop):
-        for j in range(self.n_dim):
-            if np.random.rand() < self.prob_mut:
-                n = np.random.randint(0, self.len_chrom, 1)
-                self.Chrom[i, j], self.Chrom[i, n] = self.Chrom[i, n], self.Chrom[i, j]
+    Chrom = self.Chrom
+    for j in range(self.n_dim):
+        i = np.nonzero(np.random.rand(self.size_pop) < self.prob_mut)[0]
+        n = np.random.randint(0, self.len_chrom, i.shape[0])
+        Chrom[i, j], Chrom[i, n] = Chrom[i, n], Chrom[i, j]
     return self.Chrom
 
 
@@ -62,20 +62,32 @@ def transpose(individual):
     return individual
 
 
+def _two_points(size, len_chrom):
+    # n1 < n2 for every row, drawn the same way as in swap/reverse
+    n1, n2 = np.random.randint(0, len_chrom - 1, (2, size))
+    swap_ = n1 >= n2
+    return np.where(swap_, n2, n1), np.where(swap_, n1 + 1, n2)
+
+
 def mutation_reverse(self):
     '''
     Reverse
     :param self:
     :return:
     '''
-    for i in range(self.size_pop):
-        if np.random.rand() < self.prob_mut:
-            self.Chrom[i] = reverse(self.Chrom[i])
+    i = np.nonzero(np.random.rand(self.size_pop) < self.prob_mut)[0]
+    len_chrom = self.Chrom.shape[1]
+    n1, n2 = _two_points(i.shape[0], len_chrom)
+    genes = np.arange(len_chrom)
+    # gene k of [n1, n2) comes from n1 + n2 - 1 - k
+    in_segment = (genes >= n1[:, None]) & (genes < n2[:, None])
+    source = np.where(in_segment, (n1 + n2 - 1)[:, None] - genes, genes)
+    self.Chrom[i] = np.take_along_axis(self.Chrom[i], source, axis=1)
     return self.Chrom
 
 
 def mutation_swap(self):
-    for i in range(self.size_pop):
-        if np.random.rand() < self.prob_mut:
-            self.Chrom[i] = swap(self.Chrom[i])
+    i = np.nonzero(np.random.rand(self.size_pop) < self.prob_mut)[0]
+    n1, n2 = _two_points(i.shape[0], self.Chrom.shape[1])
+    self.Chrom[i, n1], self.Chrom[i, n2] = self.Chrom[i, n2], self.Chrom[i, n1]
     return self.Chrom
@@ -1,4 +1,6 @@
 import numpy as np
+
+
 def selection_tournament(self, tourn_size=3):
     '''
     Select the best individual among *tournsize* randomly chosen
@@ -7,12 +9,8 @@ def selection_tournament(self, tourn_size=3):
     :param tourn_size:
     :return:
     '''
-    FitV = self.FitV
-    sel_index = []
-    for i in range(self.size_pop):
-        # aspirants_index = np.random.choice(range(self.size_pop), size=tourn_size)
-        aspirants_index = np.random.randint(self.size_pop, size=tourn_size)
-        sel_index.append(max(aspirants_index, key=lambda i: FitV[i]))
+    aspirants_idx = np.random.randint(self.size_pop, size=(self.size_pop, tourn_size))
+    sel_index = _tournament_winners(self.FitV, aspirants_idx)
     self.Chrom = self.Chrom[sel_index, :]  # next generation
     return self.Chrom
 
@@ -27,13 +25,17 @@ def selection_tournament_faster(self, tourn_size=3):
     :return:
     '''
     aspirants_idx = np.random.randint(self.size_pop, size=(self.size_pop, tourn_size))
-    aspirants_values = self.FitV[aspirants_idx]
-    winner = aspirants_values.argmax(axis=1)  # winner index in every team
-    sel_index = [aspirants_idx[i, j] for i, j in enumerate(winner)]
+    sel_index = _tournament_winners(self.FitV, aspirants_idx)
     self.Chrom = self.Chrom[sel_index, :]
     return self.Chrom
 
 
+def _tournament_winners(FitV, aspirants_idx):
+    # the (first) fittest aspirant of every team
+    winner = FitV[aspirants_idx].argmax(axis=1)  # winner index in every team
+    return np.take_along_axis(aspirants_idx, winner[:, None], axis=1)[:, 0]
+
+
 def selection_roulette_1(self):
     '''
     Select the next generation using roulette
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+
+import numpy as np
+
+
+def _default_model():
+    from sklearn.ensemble import RandomForestRegressor
+    return RandomForestRegressor(n_estimators=50, min_samples_leaf=2)
+
+
+class SurrogateScreen:
+    """
+    Surrogate-assisted pre-screening of a population before the expensive objective.
+
+    Every real objective value is memoized and used to (re)fit a cheap regression
+    model. When a population arrives, the model scores all candidates and only the
+    top-k go to `func`: the ones with the best predicted objective plus, to keep
+    the model honest, the ones it is least certain about. The other candidates get
+    the model prediction as their objective value.
+
+    Parameters
+    ----------------
+    func : function
+        Expensive objective. A func in run mode 'vectorization' (e.g. a
+        ProcessPoolEvaluator) gets all selected candidates in one call
+    model : regressor or None
+        Object with fit(X, y) and predict(X), default a random forest. The
+        uncertainty of a candidate is the spread of the ensemble members
+        (estimators_) or predict(X, return_std=True) for gaussian processes
+    top_k : int or None
+        Candidates per population sent to func
+    top_frac : float
+        Fraction of the population sent to func when top_k is None
+    explore_frac : float
+        Share of the top-k picked by uncertainty instead of predicted value
+    min_samples : int
+        Every candidate is evaluated for real until the model has this many samples
+    retrain_every : int
+        Refit the model once this many new real evaluations came in
+
+    Candidates that were evaluated before are answered from the memo and never
+    sent to func twice. best_x/best_y only track real evaluations, report()
+    counts the objective calls that were avoided.
+
+    Examples
+    -------------
+    ```py
+    screen = SurrogateScreen(evaluator, top_frac=0.25, min_samples=64)
+    ga = GA(func=screen, n_dim=10, size_pop=128, max_iter=100, lb=lb, ub=ub)
+    ga.run()
+    print(screen.report())
+    ```
+    """
+
+    mode = 'vectorization'
+
+    def __init__(self, func, model=None, top_k=None, top_frac=0.25, explore_frac=0.25,
+                 min_samples=20, retrain_every=10):
+        self.func = func
+        self.model = model if model is not None else _default_model()
+        self.top_k = top_k
+        self.top_frac = top_frac
+        self.explore_frac = explore_frac
+        self.min_samples = min_samples
+        self.retrain_every = retrain_every
+
+        self.memo = {}
+        self.X_real, self.Y_real = [], []
+        self.n_since_fit = 0
+        self.fitted = False
+        self.best_x, self.best_y = None, np.inf
+
+        self.n_candidates = 0
+        self.n_evaluations = 0
+        self.n_memo_hits = 0
+        self.n_predicted = 0
+        self.n_fits = 0
+
+    def _evaluate(self, X):
+        if getattr(self.func, 'mode', None) == 'vectorization':
+            return np.asarray(self.func(X), dtype=float).reshape(-1)
+        return np.array([self.func(x) for x in X], dtype=float).reshape(-1)
+
+    def _predict(self, X):
+        '''predicted objective and its uncertainty'''
+        estimators = getattr(self.model, 'estimators_', None)
+        if estimators is not None and np.ndim(estimators) == 1:
+            per_member = np.array([estimator.predict(X) for estimator in estimators])
+            return per_member.mean(axis=0), per_member.std(axis=0)
+        try:
+            mean, std = self.model.predict(X, return_std=True)
+            return np.asarray(mean), np.asarray(std)
+        except TypeError:
+            return np.asarray(self.model.predict(X)), np.zeros(len(X))
+
+    def _select(self, X):
+        '''indices (into X) of the candidates that go to func'''
+        k = self.top_k if self.top_k is not None else math.ceil(self.top_frac * len(X))
+        k = min(max(k, 1), len(X))
+        if k == len(X) or len(self.Y_real) < self.min_samples:
+            return np.arange(len(X))
+        # refit lazily, only when the model is actually consulted
+        if not self.fitted or self.n_since_fit >= self.retrain_every:
+            self._refit()
+        mean, std = self._predict(X)
+        n_explore = int(round(k * self.explore_frac))
+        exploit = np.argsort(mean, kind='stable')[:k - n_explore]
+        rest = np.setdiff1d(np.arange(len(X)), exploit)
+        explore = rest[np.argsort(-std[rest], kind='stable')[:n_explore]]
+        return np.concatenate([exploit, explore])
+
+    def _refit(self):
+        self.model.fit(np.array(self.X_real), np.array(self.Y_real))
+        self.fitted = True
+        self.n_since_fit = 0
+        self.n_fits += 1
+
+    def map(self, X):
+        '''
+        :param X: array_like, shape (size_pop, n_dim)
+        :return: numpy.array of shape (size_pop,), real values for memoized and
+            selected candidates, model predictions for the rest
+        '''
+        X = np.asarray(X, dtype=float)
+        Y = np.empty(len(X))
+        self.n_candidates += len(X)
+
+        # memo hits, and one representative per distinct new candidate
+        keys = [x.tobytes() for x in X]
+        new = {}
+        for i, key in enumerate(keys):
+            if key in self.memo:
+                Y[i] = self.memo[key]
+                self.n_memo_hits += 1
+            else:
+                new.setdefault(key, []).append(i)
+        if not new:
+            return Y
+
+        first = np.array([rows[0] for rows in new.values()])
+        chosen = first[self._select(X[first])]
+        y_chosen = self._evaluate(X[chosen])
+        self.n_evaluations += len(chosen)
+        for i, y in zip(chosen, y_chosen):
+            self.memo[keys[i]] = y
+            self.X_real.append(X[i])
+            self.Y_real.append(y)
+            if y < self.best_y:
+                self.best_x, self.best_y = X[i].copy(), y
+        self.n_since_fit += len(chosen)
+
+        skipped = np.setdiff1d(first, chosen)
+        if len(skipped):
+            Y[skipped] = self._predict(X[skipped])[0]
+            self.n_predicted += len(skipped)
+        for key, rows in new.items():
+            Y[rows] = self.memo.get(key, Y[rows[0]])
+        return Y
+
+    def __call__(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            return self.map(X.reshape(1, -1))[0]
+        return self.map(X)
+
+    def report(self):
+        '''counts of the screening so far'''
+        return {
+            'candidates': self.n_candidates,
+            'evaluations': self.n_evaluations,
+            'memo_hits': self.n_memo_hits,
+            'predicted': self.n_predicted,
+            'calls_avoided': self.n_candidates - self.n_evaluations,
+            'model_fits': self.n_fits,
+            'best_y': self.best_y,
+        }
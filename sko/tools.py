@@ -1,8 +1,12 @@
 import numpy as np
-from functools import lru_cache
+from collections import OrderedDict
 from types import MethodType, FunctionType
 import warnings
 import sys
+import pickle
+import tempfile
+import atexit
+import weakref
 import multiprocessing
 import os
 os.sys.path.insert(0, os.path.abspath('../configs'))
@@ -12,12 +16,18 @@ if sys.platform != 'win32':
     multiprocessing.set_start_method('fork')
 
 
-def set_run_mode(func, mode):
+def set_run_mode(func, mode, n_workers=None):
     '''
 
     :param func:
     :param mode: string
         can be  common, vectorization , parallel, cached
+        (cached is an unbounded memo, see set_cache to bound, quantize or
+        persist it, and to combine it with the other modes)
+    :param n_workers: int, optional
+        size of the pool used by the multithreading / multiprocessing modes
+        (default: number of cpus). For long-lived workers with warm per-worker
+        state, pass a sko.evaluator.ProcessPoolEvaluator as func instead.
     :return:
     '''
     if mode == 'multiprocessing' and sys.platform == 'win32':
@@ -27,9 +37,166 @@ def set_run_mode(func, mode):
         mode = 'multithreading'
         warnings.warn('use multithreading instead of parallel')
     func.__dict__['mode'] = mode
+    if n_workers is not None:
+        func.__dict__['n_workers'] = n_workers
     return
 
 
+def dump_atomic(obj, path):
+    '''
+    pickle obj to path through a temporary file in the same directory, so
+    that a crash while writing leaves the previous content of path intact
+    '''
+    path = os.path.abspath(path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+class FuncCache:
+    '''
+    memo of the values of func, see set_cache
+
+    :param maxsize: int or None
+        most values kept, the least recently used ones are dropped first.
+        None keeps every value
+    :param precision: float, array_like or None
+        x is rounded to multiples of precision before anything else, so that
+        vectors that only differ by float noise share one value
+    :param canonicalize: function or None
+        maps the (rounded) x to the design the objective actually simulates,
+        e.g. continuous knobs to the discrete values of the simulator
+    :param path: string or None
+        pickle file the values are loaded from and saved to
+    :param save_every: int
+        the whole cache is rewritten to path after every `save_every` batches
+        with new values, by the optimizers at each checkpoint and at the end of
+        run(), and when the process exits
+    '''
+
+    def __init__(self, maxsize=None, precision=None, canonicalize=None, path=None, save_every=10):
+        self.maxsize = maxsize
+        self.precision = None if precision is None else np.asarray(precision, dtype=float)
+        self.canonicalize = canonicalize
+        self.path = path
+        self.save_every = save_every
+        self.n_unsaved = 0  # batches with new values since the last save
+        self.values = OrderedDict()
+        self.hits, self.misses = 0, 0
+        if path is not None:
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    self.values.update(pickle.load(f))
+                self.trim()
+            atexit.register(_flush_at_exit, weakref.ref(self))
+
+    def canonical(self, x):
+        '''the design x is evaluated as, and its key'''
+        if self.precision is not None:
+            x = np.round(np.asarray(x, dtype=float) / self.precision) * self.precision
+        if self.canonicalize is not None:
+            x = self.canonicalize(x)
+        x = np.asarray(x)
+        return x, tuple(x.ravel().tolist())
+
+    def trim(self):
+        if self.maxsize is not None:
+            while len(self.values) > self.maxsize:
+                self.values.popitem(last=False)
+
+    def save(self):
+        if self.path is not None:
+            dump_atomic(dict(self.values), self.path)
+        self.n_unsaved = 0
+
+    def flush(self):
+        '''save the values added since the last save, if any'''
+        if self.n_unsaved:
+            self.save()
+
+    def wrap(self, func_transformed):
+        '''
+        func_transformed, the batch version of func given by the run mode,
+        evaluating only the designs of X that are neither cached nor
+        duplicates of an earlier row of X
+        '''
+
+        def func_cached(X):
+            Y = [None] * len(X)
+            new_x, new_keys, new_idx = [], [], dict()  # new_idx: key -> rows of X
+            for i, x in enumerate(X):
+                x, key = self.canonical(x)
+                if key in self.values:
+                    self.values.move_to_end(key)
+                    Y[i] = self.values[key]
+                    self.hits += 1
+                elif key in new_idx:
+                    new_idx[key].append(i)
+                    self.hits += 1
+                else:
+                    new_idx[key] = [i]
+                    new_x.append(x)
+                    new_keys.append(key)
+                    self.misses += 1
+
+            if new_x:
+                new_y = func_transformed(np.array(new_x))
+                for key, y in zip(new_keys, new_y):
+                    self.values[key] = y
+                    for i in new_idx[key]:
+                        Y[i] = y
+                self.trim()
+                self.n_unsaved += 1
+                if self.n_unsaved >= self.save_every:
+                    self.save()
+            return np.array(Y)
+
+        func_cached.cache = self
+        return func_cached
+
+    def cache_info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'maxsize': self.maxsize, 'currsize': len(self.values)}
+
+    def cache_clear(self):
+        self.values.clear()
+        self.hits, self.misses = 0, 0
+
+
+def _flush_at_exit(cache_ref):
+    cache = cache_ref()
+    if cache is not None:
+        cache.flush()
+
+
+def set_cache(func, maxsize=None, precision=None, canonicalize=None, path=None, save_every=10):
+    '''
+    memoize func, whatever its run mode (see set_run_mode): the optimizer
+    only evaluates the designs it has not seen before, duplicates inside a
+    batch included, so the parallel modes only dispatch new designs.
+
+    :param func:
+    :param maxsize: int, optional, bound on the number of cached values
+    :param precision: float or array_like, optional, rounding of x before lookup
+    :param canonicalize: function, optional, maps x to the simulated design
+    :param path: string, optional, file the cache persists to
+    :param save_every: int, optional, batches with new values between two saves to path
+    :return: the FuncCache, its cache_info() gives the hit counts
+    '''
+    cache = FuncCache(maxsize=maxsize, precision=precision, canonicalize=canonicalize, path=path,
+                      save_every=save_every)
+    func.__dict__['cache'] = cache
+    return cache
+
+
 def func_transformer(func):
     '''
     transform this kind of function:
@@ -53,7 +220,16 @@ def func_transformer(func):
     :param func:
     :return:
     '''
+    func_transformed = _func_transformer(func)
+    cache = getattr(func, 'cache', None)
+    if cache is None and getattr(func, 'mode', None) == 'cached':
+        cache = FuncCache()
+    if cache is not None:
+        return cache.wrap(func_transformed)
+    return func_transformed
+
 
+def _func_transformer(func):
     # to support the former version
     if (func.__class__ is FunctionType) and (func.__code__.co_argcount > 1):
         warnings.warn('multi-input might be deprecated in the future, use fun(p) instead')
@@ -85,18 +261,15 @@ def func_transformer(func):
     if mode == 'vectorization':
         return func
     elif mode == 'cached':
-        @lru_cache(maxsize=None)
-        def func_cached(x):
-            return func(x)
-
-        def func_warped(X):
-            return np.array([func_cached(tuple(x)) for x in X])
+        # evaluated one by one, func_transformer adds an unbounded FuncCache
+        def func_transformed(X):
+            return np.array([func(x) for x in X])
 
-        return func_warped
+        return func_transformed
     elif mode == 'multithreading':
         from multiprocessing.dummy import Pool as ThreadPool
 
-        pool = ThreadPool()
+        pool = ThreadPool(getattr(func, 'n_workers', None))
 
         def func_transformed(X):
             return np.array(pool.map(func, X))
@@ -104,10 +277,13 @@ def func_transformer(func):
         return func_transformed
     elif mode == 'multiprocessing':
         from multiprocessing import Pool
-        pool = Pool()
+        pools = []
 
         def func_transformed(X):
-            return np.array(pool.map(func, X))
+            # the pool is bounded and only created once the optimizer evaluates
+            if not pools:
+                pools.append(Pool(getattr(func, 'n_workers', None)))
+            return np.array(pools[0].map(func, X))
 
         return func_transformed
     
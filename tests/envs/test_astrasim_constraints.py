@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from arch_gym.envs.astrasim_constraints import ConstraintSet
+from arch_gym.envs.envHelpers import helpers
+
+DIMENSION = 3
+
+SYSTEM_KNOBS = {'scheduling-policy': [{'FIFO', 'LIFO'}, 'N/A']}
+NETWORK_KNOBS = {
+    'num-npus': [{8, 16, 32, 64}, 'N/A'],
+    'npus-count': [(1, 8, 1), 'TRUE'],
+    'bandwidth': [{12.5, 25.0, 50.0}, 'FALSE'],
+}
+WORKLOAD_KNOBS = {
+    'data-parallel-degree': [(1, 8, 1), 'N/A'],
+    'model-parallel-degree': [(1, 8, 1), 'N/A'],
+}
+
+CONSTRAINTS = [
+    "product network npus-count <= num network num-npus",
+    "mult workload data-parallel-degree workload model-parallel-degree == num network num-npus",
+    "product network bandwidth >= 20000",
+]
+
+
+def random_population(size):
+    # genes: scheduling-policy, num-npus, npus-count (one gene), bandwidth x DIMENSION, the two degrees
+    rng = np.random.default_rng(0)
+    return np.column_stack([
+        rng.integers(0, 2, size),
+        rng.integers(0, 4, size),
+        rng.integers(1, 9, size),
+        rng.integers(0, 3, (size, DIMENSION)),
+        rng.integers(1, 9, size),
+        rng.integers(1, 9, size),
+    ])
+
+
+@pytest.mark.parametrize("constraint", CONSTRAINTS)
+def test_encoded_mask_matches_violated(constraint):
+    constraints = ConstraintSet([constraint])
+    X = random_population(200)
+
+    mask = constraints.encoded_population_mask(X, SYSTEM_KNOBS, NETWORK_KNOBS, WORKLOAD_KNOBS, DIMENSION)
+
+    decoder = helpers()
+    expected = [constraints.feasible(decoder.action_decoder_ga_astraSim(x, SYSTEM_KNOBS, NETWORK_KNOBS,
+                                                                         WORKLOAD_KNOBS, DIMENSION))
+                for x in X]
+    assert mask.tolist() == expected
+    assert 0 < mask.sum() < len(X)
+
+
+def test_per_dimension_knob_is_repeated_for_every_dimension():
+    constraints = ConstraintSet(["product network npus-count <= num network num-npus"])
+    # npus-count 3 on each of the 3 dimensions: 27 npus, more than 16 but fewer than 32
+    X = np.array([[0, 1, 3, 0, 0, 0, 1, 1],
+                  [0, 2, 3, 0, 0, 0, 1, 1]])
+    num_npus = list(NETWORK_KNOBS['num-npus'][0])
+    X[:, 1] = [num_npus.index(16), num_npus.index(32)]
+
+    mask = constraints.encoded_population_mask(X, SYSTEM_KNOBS, NETWORK_KNOBS, WORKLOAD_KNOBS, DIMENSION)
+    assert mask.tolist() == [False, True]
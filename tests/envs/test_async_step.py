@@ -0,0 +1,78 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'arch_gym', 'envs'))
+from async_step import AsyncEnvPool, run_subprocess
+
+
+class SleepyEnv:
+    '''astep sleeps like a simulator would and records how many steps overlap'''
+
+    def __init__(self, index, stats):
+        self.index = index
+        self.stats = stats
+        self.busy = False
+        self.closed = False
+
+    async def astep(self, action):
+        assert not self.busy, "an env must run one simulation at a time"
+        self.busy = True
+        self.stats["in_flight"] += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+        # later actions finish first
+        await asyncio.sleep(0.01 * (10 - action))
+        self.stats["in_flight"] -= 1
+        self.busy = False
+        return [action], -action, False, {"env": self.index}
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def stats():
+    return {"in_flight": 0, "max_in_flight": 0}
+
+
+def test_run_subprocess():
+    returncode, out, err = asyncio.run(run_subprocess(
+        [sys.executable, "-c", "import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"]))
+    assert (returncode, out.strip(), err.strip()) == (3, "out", "err")
+
+
+def test_results_keep_the_order_of_the_actions(stats):
+    pool = AsyncEnvPool.from_factory(lambda i: SleepyEnv(i, stats), 3)
+    try:
+        results = pool.step(list(range(7)))
+    finally:
+        pool.close()
+
+    assert [obs for obs, _, _, _ in results] == [[a] for a in range(7)]
+    assert [reward for _, reward, _, _ in results] == [-a for a in range(7)]
+    assert stats["max_in_flight"] == 3
+    assert all(env.closed for env in pool.envs)
+
+
+def test_step_async_returns_before_the_simulations_finish(stats):
+    pool = AsyncEnvPool([SleepyEnv(0, stats), SleepyEnv(1, stats)])
+    try:
+        pool.step_async([0, 1])
+        with pytest.raises(RuntimeError):
+            pool.step_async([2])
+        assert len(pool.step_wait(timeout=5)) == 2
+        with pytest.raises(RuntimeError):
+            pool.step_wait()
+        # the background loop is reused by the next step
+        assert len(pool.step([2, 3, 4])) == 3
+    finally:
+        pool.close()
+
+
+def test_astep_inside_an_event_loop(stats):
+    pool = AsyncEnvPool([SleepyEnv(0, stats)])
+    results = asyncio.run(pool.astep([1, 2]))
+    assert [info["env"] for _, _, _, info in results] == [0, 0]
+    assert stats["max_in_flight"] == 1
@@ -0,0 +1,82 @@
+import functools
+import os
+import sys
+
+import numpy as np
+import pytest
+
+dm_env = pytest.importorskip("dm_env")
+pytest.importorskip("acme.core")
+from dm_env import specs
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'arch_gym', 'envs'))
+batched_env_wrapper = pytest.importorskip("batched_env_wrapper")
+
+FIRST, MID, LAST = dm_env.StepType.FIRST, dm_env.StepType.MID, dm_env.StepType.LAST
+
+
+class CountingEnv(dm_env.Environment):
+    '''observation: steps taken in the episode, which ends after episode_length steps'''
+
+    def __init__(self, episode_length):
+        self.episode_length = episode_length
+        self.t = 0
+
+    def reset(self):
+        self.t = 0
+        return dm_env.restart(np.array([0.0]))
+
+    def step(self, action):
+        self.t += 1
+        observation = np.array([float(self.t)])
+        reward = float(action[0])
+        if self.t == self.episode_length:
+            return dm_env.termination(reward, observation)
+        return dm_env.transition(reward, observation)
+
+    def observation_spec(self):
+        return specs.Array((1,), float)
+
+    def action_spec(self):
+        return specs.Array((1,), float)
+
+    def reward_spec(self):
+        return specs.Array((), float)
+
+
+@pytest.fixture
+def env():
+    env = batched_env_wrapper.BatchedEnvWrapper(
+        [functools.partial(CountingEnv, 2), functools.partial(CountingEnv, 3)])
+    yield env
+    env.close()
+
+
+def test_replicas_reset_after_their_last_step(env):
+    timestep = env.reset()
+    assert list(timestep.step_type) == [FIRST, FIRST]
+
+    step_types, observations, rewards = [], [], []
+    for _ in range(4):
+        timestep = env.step(np.array([[1.0], [2.0]]))
+        step_types.append(list(timestep.step_type))
+        observations.append(list(timestep.observation[:, 0]))
+        rewards.append(list(timestep.reward))
+
+    assert step_types == [[MID, MID], [LAST, MID], [FIRST, LAST], [MID, FIRST]]
+    assert observations == [[1, 1], [2, 2], [0, 3], [1, 0]]
+    # FIRST steps get a zero reward and a discount of one so that the batch stacks
+    assert rewards == [[1, 2], [1, 2], [0, 2], [1, 0]]
+    assert list(timestep.discount) == [1, 1]
+
+
+def test_unstack_timestep(env):
+    env.reset()
+    env.step(np.array([[1.0], [2.0]]))
+    timestep = env.step(np.array([[1.0], [2.0]]))
+    env.step(np.array([[1.0], [2.0]]))
+
+    last = batched_env_wrapper.unstack_timestep(timestep, 0)
+    assert last.last() and last.reward == 1 and last.observation[0] == 2
+    first = batched_env_wrapper.unstack_timestep(env.step(np.array([[1.0], [2.0]])), 1)
+    assert first.first() and first.reward is None and first.discount is None
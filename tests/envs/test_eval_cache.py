@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pytest
+
+from arch_gym.envs.eval_cache import EvaluationCache
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'arch_gym', 'envs'))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = EvaluationCache(str(tmp_path / "cache.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test_equivalent_actions_share_a_key(cache):
+    key = cache.key("DRAMSys", {"PagePolicy": "Open", "RequestBufferSize": 8.0}, version="v1")
+    assert key == cache.key("DRAMSys", {"RequestBufferSize": np.int64(8), "PagePolicy": "Open"}, version="v1")
+    assert key != cache.key("DRAMSys", {"PagePolicy": "Open", "RequestBufferSize": 8.0}, version="v2")
+    assert key != cache.key("DRAMSys", {"PagePolicy": "Open", "RequestBufferSize": 8.0}, version="v1",
+                            workload="stream.stl")
+
+
+def test_hit_skips_the_simulator(cache):
+    calls = []
+
+    def run():
+        calls.append(1)
+        return np.array([[1.0, 2.0, 3.0]])
+
+    first = cache.evaluate("DRAMSys", {"PagePolicy": "Open"}, run)
+    second = cache.evaluate("DRAMSys", {"PagePolicy": "Open"}, run)
+    assert len(calls) == 1
+    np.testing.assert_array_equal(first, second)
+    assert cache.evaluate("DRAMSys", {"PagePolicy": "Closed"}, lambda: None) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 1)
+
+
+def test_lookups_do_not_take_the_write_lock(cache):
+    cache.put("a", 1)
+    writer = sqlite3.connect(cache.path, timeout=0.1, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+    assert cache.stats()["hits"] == 1
+
+
+def test_hits_count_as_recent_for_eviction(tmp_path):
+    cache = EvaluationCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    cache.close()
+
+
+def test_astrasim_version_ignores_the_rewritten_network_file(tmp_path):
+    AstraSimEnv = pytest.importorskip("AstraSimEnv").AstraSimEnv
+    env = AstraSimEnv.__new__(AstraSimEnv)
+    env.exe_path = str(tmp_path / "run_general.sh")
+    env.network_file = str(tmp_path / "network.json")
+    with open(env.network_file, "w") as f:
+        f.write('{"num-npus": 16}')
+    version = env.sim_version()
+
+    # without a workspace a GA step writes its network over network_file
+    with open(env.network_file, "w") as f:
+        f.write('{"num-npus": 64}')
+    assert env.sim_version() == version
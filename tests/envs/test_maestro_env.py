@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'arch_gym', 'envs'))
+MasteroEnv = pytest.importorskip("MasteroEnv").MasteroEnv
+from step_profiler import make_profiler
+
+
+class FakeMaestroHelpers:
+    '''writes the files maestro would, without running it'''
+
+    def __init__(self):
+        self.runs = []
+
+    def write_maestro(self, indv=None, workload=None, layer_id=0, m_file=None):
+        with open("{}.m".format(m_file), "w") as f:
+            f.write("mapping")
+        return "{}.m".format(m_file)
+
+    def run_maestro(self, exe, m_file, arch_configs):
+        self.runs.append(m_file)
+        with open("{}.csv".format(m_file), "w") as f:
+            f.write("results")
+        return np.ones(4)
+
+
+@pytest.fixture
+def env():
+    env = MasteroEnv.__new__(MasteroEnv)
+    env.helpers = FakeMaestroHelpers()
+    env.profiler = make_profiler(None)
+    env.engine = None
+    env.workload, env.layer_id = "resnet18", 2
+    env._executable = "maestro"
+    return env
+
+
+def test_simulate_removes_only_its_own_files(env, tmp_path):
+    others = [tmp_path / name for name in ("123.m", "123.csv", "results.csv")]
+    for path in others:
+        path.write_text("kept")
+    m_file = str(tmp_path / "456")
+
+    obs = env.simulate([], m_file, {"num_pe": 1})
+
+    assert env.helpers.runs == [m_file]
+    np.testing.assert_array_equal(obs, np.ones(4))
+    assert not os.path.exists(m_file + ".m") and not os.path.exists(m_file + ".csv")
+    assert all(path.read_text() == "kept" for path in others)
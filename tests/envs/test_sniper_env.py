@@ -0,0 +1,97 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'arch_gym', 'envs'))
+SniperEnvModule = pytest.importorskip("SniperEnv")
+SniperEnv = SniperEnvModule.SniperEnv
+wait_for_json = SniperEnvModule.wait_for_json
+
+
+class FakeSniperHelpers:
+    def read_modify_write_sniper_config(self, action, cfg):
+        with open(cfg, "w") as f:
+            f.write("[perf_model/core]\nfrequency = {}\n".format(action["frequency"]))
+        return True
+
+
+@pytest.fixture
+def env(monkeypatch):
+    def no_sleep(seconds):
+        raise AssertionError("SniperEnv must not sleep here")
+
+    def no_subprocess(*args, **kwargs):
+        raise AssertionError("SniperEnv must not spawn processes here")
+
+    monkeypatch.setattr(SniperEnvModule.time, "sleep", no_sleep)
+    monkeypatch.setattr(SniperEnvModule.subprocess, "Popen", no_subprocess)
+    monkeypatch.setattr(SniperEnvModule.subprocess, "call", no_subprocess)
+    monkeypatch.setattr(SniperEnvModule.os, "system", no_subprocess)
+
+    env = SniperEnv.__new__(SniperEnv)
+    env.helpers = FakeSniperHelpers()
+    env.agent_configs = []
+    env.output_dirs = []
+    return env
+
+
+def test_action_to_configs_prepends_the_includes(env, tmp_path):
+    cfg = str(tmp_path / "arch_gym_x86.cfg")
+    assert env.actionToConfigs({"frequency": 2.66}, cfg)
+    with open(cfg) as f:
+        lines = f.read().splitlines()
+    assert lines == ["#include rob", "#include nehalem", "[perf_model/core]", "frequency = 2.66"]
+
+
+def test_reset_multiagent_removes_the_batch(env, tmp_path):
+    for idx in range(2):
+        cfg = tmp_path / "agent_{}.cfg".format(idx)
+        cfg.write_text("")
+        output_dir = tmp_path / "agent_.{}_.gcc".format(idx)
+        (output_dir / "nested").mkdir(parents=True)
+        (output_dir / "nested" / "sim.out").write_text("")
+        env.agent_configs.append(str(cfg))
+        env.output_dirs.append(str(output_dir))
+
+    env.reset_multiagent()
+    assert list(tmp_path.iterdir()) == []
+    assert env.agent_configs == [] and env.output_dirs == []
+
+    # a config that is already gone does not break the next reset
+    env.agent_configs.append(str(tmp_path / "missing.cfg"))
+    env.reset_multiagent()
+
+
+def test_reset_removes_the_logdir(env, tmp_path):
+    env.observation_space = SniperEnvModule.gym.spaces.Box(0, 1, shape=(2,))
+    env.logdir = str(tmp_path / "logs")
+    os.makedirs(os.path.join(env.logdir, "run"))
+    env.reset()
+    assert not os.path.exists(env.logdir)
+    assert env.steps == 0
+
+
+def test_wait_for_json_returns_a_ready_file_without_polling(env, tmp_path):
+    path = tmp_path / "stats.json"
+    path.write_text(json.dumps({"Time": 1}))
+    assert wait_for_json(str(path)) == {"Time": 1}
+
+
+def test_wait_for_json(tmp_path):
+    path = tmp_path / "stats.json"
+    assert wait_for_json(str(path), timeout=0.05) is None
+
+    # a partially written file is retried until it parses
+    path.write_text('{"Time": ')
+    writer = threading.Timer(0.05, path.write_text, args=(json.dumps({"Time": 2}),))
+    writer.start()
+    start = time.monotonic()
+    try:
+        assert wait_for_json(str(path), timeout=5) == {"Time": 2}
+    finally:
+        writer.join()
+    assert time.monotonic() - start < 1
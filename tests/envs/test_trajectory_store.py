@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from arch_gym.envs.trajectory_store import TrajectoryWriter, read_trajectories
+
+
+def record(policy="Open", size=1, obs=(1.0, 2.0, 3.0), reward=0.5):
+    return {"action": {"PagePolicy": policy, "RequestBufferSize": size}, "obs": np.array(obs), "reward": reward}
+
+
+@pytest.mark.parametrize("bad", [
+    record(policy=3),
+    record(size=1.5),
+    record(obs=(1.0, 2.0)),
+    record(reward="high"),
+    {"action": {"PagePolicy": "Open"}, "reward": 0.5},
+])
+def test_bad_record_is_rejected_before_buffering(tmp_path, bad):
+    writer = TrajectoryWriter(str(tmp_path), flush_every=2)
+    writer.append(record())
+    with pytest.raises(ValueError):
+        writer.append(bad)
+    # the store keeps working: later flushes and close succeed
+    writer.append(record(policy="Closed", size=2))
+    writer.append(record(policy="Open", size=3))
+    writer.close()
+
+    frame = read_trajectories(str(tmp_path))
+    assert list(frame["action.PagePolicy"]) == ["Open", "Closed", "Open"]
+    assert list(frame["action.RequestBufferSize"]) == [1, 2, 3]
+    assert list(frame["action.PagePolicy"].cat.categories) == ["Open", "Closed"]
+
+
+def test_rejected_first_record_does_not_fix_the_schema(tmp_path):
+    schema = [{"name": "reward", "dtype": np.dtype(np.float64).str, "shape": []}]
+    writer = TrajectoryWriter(str(tmp_path), schema=schema)
+    with pytest.raises(ValueError):
+        writer.append({"reward": "high", "extra": 1})
+    writer.append({"reward": 1.0, "other": "x"})
+    writer.close()
+
+    assert list(read_trajectories(str(tmp_path)).columns) == ["reward", "other"]
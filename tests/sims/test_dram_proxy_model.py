@@ -0,0 +1,88 @@
+import os
+import pickle
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from arch_gym.envs.envHelpers import helpers
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'sims', 'DRAM', 'binary', 'DRAMSys_Proxy_Model'))
+import DRAMSys_Proxy_Model
+from DRAMSys_Proxy_Model import DRAMSysProxyModel
+
+UPPER = [4, 3, 3, 33, 2, 2, 9, 9, 3, 129]
+
+
+def random_population(size, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, UPPER, size=(size, len(UPPER)), endpoint=False).astype(float)
+
+
+@pytest.fixture
+def proxy_dir(tmp_path, monkeypatch):
+    '''fits small stand-ins for the shipped models and transformers on decoded random designs'''
+    monkeypatch.setattr(DRAMSys_Proxy_Model, '_loaded_artifacts', {})
+    actions = helpers().action_decoder_ga_batch(random_population(200))
+    numerical = actions[DRAMSysProxyModel.numerical_variables].to_numpy(dtype=float)
+    categorical = actions[DRAMSysProxyModel.categorical_variables]
+
+    one_hot_encoder = OneHotEncoder(handle_unknown='ignore').fit(categorical)
+    numerical_transformer = StandardScaler().fit(numerical)
+    X = np.hstack([numerical_transformer.transform(numerical), one_hot_encoder.transform(categorical).toarray()])
+    rng = np.random.default_rng(1)
+
+    (tmp_path / 'models').mkdir()
+    (tmp_path / 'transformers').mkdir()
+    for name in ('energy_model.pkl', 'power_model.pkl', 'latency_model.pkl'):
+        with open(tmp_path / 'models' / name, 'wb') as f:
+            pickle.dump(LinearRegression().fit(X, rng.normal(size=len(X))), f)
+    with open(tmp_path / 'transformers' / 'one_hot_encoder.pkl', 'wb') as f:
+        pickle.dump(one_hot_encoder, f)
+    joblib.dump(numerical_transformer, tmp_path / 'transformers' / 'numeric_data_transformer.pkl')
+    joblib.dump(StandardScaler().fit(rng.normal(size=(50, 3))), tmp_path / 'transformers' / 'target_data_transformer.pkl')
+    return tmp_path
+
+
+def make_model(proxy_dir, **kwargs):
+    model = DRAMSysProxyModel(**kwargs)
+    model.model_directory = str(proxy_dir / 'models')
+    model.transformer_directory = str(proxy_dir / 'transformers')
+    return model
+
+
+def test_batch_decoder_matches_action_decoder():
+    population = random_population(50)
+    decoded = helpers().action_decoder_ga_batch(population)
+    expected = pd.DataFrame([helpers().action_decoder_ga(p) for p in population])
+    pd.testing.assert_frame_equal(decoded, expected, check_dtype=False)
+
+
+def test_population_prediction_matches_per_design(proxy_dir):
+    actions = helpers().action_decoder_ga_batch(random_population(20, seed=2))
+    model = make_model(proxy_dir)
+
+    predicted = model.predict(actions)
+    assert predicted.shape == (20, 3)
+    per_design = np.vstack([model.predict(action) for action in actions.to_dict('records')])
+    np.testing.assert_allclose(predicted, per_design)
+
+    frame = model.run_proxy_model(actions)
+    assert list(frame.columns) == ['Energy', 'Power', 'Latency']
+    np.testing.assert_allclose(frame.to_numpy(), predicted)
+
+
+def test_artifacts_are_loaded_once(proxy_dir, monkeypatch):
+    first = make_model(proxy_dir).load()
+    loads = []
+    monkeypatch.setattr(pickle, 'load', lambda f: loads.append(f.name))
+    second = make_model(proxy_dir).load()
+    assert loads == []
+    assert second.energy_model is first.energy_model
+    assert second.one_hot_encoder is first.one_hot_encoder
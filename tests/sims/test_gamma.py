@@ -0,0 +1,73 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'sims', 'gamma', 'src', 'GAMMA'))
+from gamma import GAMMA
+
+
+class SerialPool:
+    def map(self, func, iterable):
+        return [func(x) for x in iterable]
+
+
+@pytest.fixture
+def gamma():
+    gamma = GAMMA(dimension=[64, 32, 14, 14, 3, 3, 1], fitness=["latency"], log_level=0)
+    gamma.evaluated = []
+
+    def thread_fun(individual):
+        gamma.evaluated.append(individual)
+        return [float(sum(sum(gene) for gene in individual)), 1]
+
+    gamma.thread_fun = thread_fun
+    return gamma
+
+
+def individual(*genes):
+    return [list(gene) for gene in genes]
+
+
+def test_duplicates_are_evaluated_once(gamma):
+    a, b = individual((1, 2), (3, 4)), individual((5, 6))
+    population = [a, b, individual((1, 2), (3, 4))]
+
+    assert gamma.evaluate_unique(SerialPool(), population) == [[10.0, 1], [11.0, 1], [10.0, 1]]
+    assert gamma.evaluated == [a, b]
+
+    # the next generation's elites come from the memo
+    assert gamma.evaluate_unique(SerialPool(), [b, individual((7,))]) == [[11.0, 1], [7.0, 1]]
+    assert gamma.evaluated == [a, b, [[7]]]
+    assert [stat["num_evaluated"] for stat in gamma.memo_stats] == [2, 1]
+    assert [stat["memo_hits"] for stat in gamma.memo_stats] == [1, 1]
+
+
+def test_memo_is_keyed_by_hw(gamma):
+    a = individual((1, 2))
+    gamma.evaluate_unique(SerialPool(), [a])
+    gamma.num_pe = 128
+    gamma.evaluate_unique(SerialPool(), [a])
+    assert len(gamma.evaluated) == 2
+
+
+@pytest.mark.parametrize("reset", [
+    lambda gamma: gamma.reset_hw_parm(pe_limit=512),
+    lambda gamma: gamma.reset_hw_parm(map_cstr="cstr"),
+    lambda gamma: gamma.reset_dimension(dimension=[32, 32, 7, 7, 3, 3, 1]),
+    lambda gamma: gamma.reset_dimension(fitness=["energy"]),
+])
+def test_memo_is_cleared_by_hw_and_layer_changes(gamma, reset):
+    a = individual((1, 2))
+    gamma.evaluate_unique(SerialPool(), [a])
+    reset(gamma)
+    assert gamma.eval_memo == {}
+    gamma.evaluate_unique(SerialPool(), [a])
+    assert len(gamma.evaluated) == 2
+
+
+def test_memo_off(gamma):
+    gamma.use_memo = False
+    a = individual((1, 2))
+    gamma.evaluate_unique(SerialPool(), [a, a])
+    assert len(gamma.evaluated) == 2
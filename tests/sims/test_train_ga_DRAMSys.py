@@ -0,0 +1,73 @@
+import importlib
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('envlogger')
+pytest.importorskip('acme')
+dm_env = pytest.importorskip('dm_env')
+from absl.testing import flagsaver
+from arch_gym.envs.trajectory_store import read_trajectories
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'sims', 'DRAM'))
+
+
+class FakeDRAMEnv:
+    '''stands in for the DRAMSys env: the observation and reward follow the action'''
+
+    def __init__(self, worker_id=0, scratch_dir=None):
+        pass
+
+    def reset(self):
+        return dm_env.restart(np.zeros((1, 3), dtype=np.float32))
+
+    def step(self, action):
+        obs = np.array([[action["RequestBufferSize"], action["MaxActiveTransactions"], 1.0]], dtype=np.float32)
+        return dm_env.transition(reward=float(action["RequestBufferSize"]), observation=obs)
+
+
+@pytest.fixture
+def train(tmp_path, monkeypatch):
+    module = importlib.import_module('train_ga_DRAMSys')
+    if not module.FLAGS.is_parsed():
+        module.FLAGS(['train_ga_DRAMSys'])
+    monkeypatch.setattr(module, 'make_dram_env', FakeDRAMEnv)
+    monkeypatch.chdir(tmp_path)
+    with flagsaver.flagsaver(summary_dir=str(tmp_path), num_iter=2, num_agents=4, num_workers=0):
+        yield module
+
+
+def test_serial_run(train):
+    train.main(None)
+
+    _, exp_log_dir = train.generate_run_directories()
+    fitness = pd.read_csv(os.path.join(exp_log_dir, "fitness.csv"), header=None)
+    assert len(fitness) >= 2 * 4
+    assert os.path.exists(os.path.join(exp_log_dir, "Y_history.csv"))
+
+
+def test_columnar_log(train):
+    with flagsaver.flagsaver(log_format="columnar"):
+        for p in ([0, 1, 2, 3, 0, 1, 2, 3, 1, 64], [1, 0, 0, 5, 1, 0, 4, 4, 0, 32]):
+            assert train.dram_optimization_function(np.array(p, dtype=float)) == -p[3]
+
+    _, exp_log_dir = train.generate_run_directories()
+    root = os.path.join(exp_log_dir, "fitness")
+    train.get_writer(root).flush()
+    fitness = read_trajectories(root)
+    assert list(fitness["Energy"]) == [3, 5]
+    assert list(fitness["Power"]) == [64, 32]
+    assert list(fitness["reward"]) == [3, 5]
+    assert list(fitness["PagePolicy"]) == ["Open", "OpenAdaptive"]
+
+
+def test_logging_failure_keeps_the_fitness(train, monkeypatch):
+    def broken_step(self, action):
+        return dm_env.transition(reward=1.0, observation=np.zeros(1, dtype=np.float32))
+
+    monkeypatch.setattr(FakeDRAMEnv, "step", broken_step)
+    with flagsaver.flagsaver(log_format="columnar"):
+        assert train.dram_optimization_function(np.ones(10)) == -1.0
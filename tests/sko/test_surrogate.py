@@ -0,0 +1,68 @@
+import numpy as np
+
+from sko.GA import GA
+from sko.surrogate import SurrogateScreen
+
+
+def sphere(x):
+    return float(np.sum(np.asarray(x) ** 2))
+
+
+class CountingObjective:
+    def __init__(self):
+        self.evaluated = []
+
+    def __call__(self, x):
+        self.evaluated.append(tuple(x))
+        return sphere(x)
+
+
+class OracleModel:
+    '''predicts the true objective, so the screening choice is known in advance'''
+
+    def fit(self, X, y):
+        self.n_samples = len(X)
+
+    def predict(self, X):
+        return np.array([sphere(x) for x in X])
+
+
+def test_warm_up_then_only_top_k_are_evaluated():
+    func = CountingObjective()
+    screen = SurrogateScreen(func, model=OracleModel(), top_k=2, explore_frac=0, min_samples=10)
+    rng = np.random.default_rng(0)
+
+    Y = screen(rng.uniform(-1, 1, (10, 3)))
+    assert len(func.evaluated) == 10
+    assert screen.n_fits == 0
+
+    X = rng.uniform(-1, 1, (10, 3))
+    Y = screen(X)
+    best_two = np.argsort([sphere(x) for x in X])[:2]
+    assert func.evaluated[10:] == [tuple(X[i]) for i in best_two]
+    np.testing.assert_allclose(Y, [sphere(x) for x in X])
+    assert screen.report()['predicted'] == 8
+    assert screen.n_fits == 1
+
+
+def test_memo_answers_repeated_candidates():
+    func = CountingObjective()
+    screen = SurrogateScreen(func, model=OracleModel(), top_k=4, min_samples=100)
+    X = np.array([[1.0, 2.0], [1.0, 2.0], [3.0, 4.0]])
+
+    np.testing.assert_allclose(screen(X), [5, 5, 25])
+    np.testing.assert_allclose(screen(X[::-1]), [25, 5, 5])
+    assert sorted(func.evaluated) == [(1.0, 2.0), (3.0, 4.0)]
+    assert screen.report()['memo_hits'] == 3
+
+
+def test_ga_with_screening_evaluates_fewer_designs():
+    func = CountingObjective()
+    screen = SurrogateScreen(func, top_frac=0.25, min_samples=20)
+    np.random.seed(0)
+    ga = GA(func=screen, n_dim=3, size_pop=20, max_iter=10, lb=[-2] * 3, ub=[2] * 3, precision=1e-3)
+    ga.run()
+
+    report = screen.report()
+    assert report['evaluations'] == len(func.evaluated) < report['candidates']
+    assert screen.best_y == min(sphere(x) for x in func.evaluated)
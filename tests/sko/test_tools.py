@@ -0,0 +1,61 @@
+import os
+import pickle
+
+import numpy as np
+
+from sko.GA import GA
+from sko.SA import SAParallelTempering
+from sko.tools import set_cache, func_transformer
+
+
+def sphere(x):
+    return float(np.sum(np.asarray(x) ** 2))
+
+
+def saved_values(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def test_cache_saved_every_n_batches(tmp_path):
+    path = str(tmp_path / 'cache.pkl')
+
+    def func(x):
+        return sphere(x)
+
+    cache = set_cache(func, path=path, save_every=3)
+    func_cached = func_transformer(func)
+    for i in range(5):
+        func_cached(np.array([[i, 0.0]]))
+        assert os.path.exists(path) == (i >= 2)
+    assert len(saved_values(path)) == 3
+    func_cached(np.array([[0.0, 0.0]]))  # only hits, nothing new to save
+    assert cache.n_unsaved == 2
+    cache.flush()
+    assert len(saved_values(path)) == 5
+
+
+def test_cache_saved_at_end_of_run(tmp_path):
+    path = str(tmp_path / 'cache.pkl')
+
+    def func(x):
+        return sphere(x)
+
+    cache = set_cache(func, path=path, save_every=1000)
+    ga = GA(func=func, n_dim=2, size_pop=10, max_iter=5, lb=[-1, -1], ub=[1, 1], precision=0.5)
+    ga.run()
+    assert saved_values(path) == dict(cache.values)
+    assert cache.n_unsaved == 0
+
+
+def test_cache_saved_at_end_of_sa_run(tmp_path):
+    path = str(tmp_path / 'cache.pkl')
+
+    def func(x):
+        return sphere(x)
+
+    cache = set_cache(func, path=path, precision=0.1, save_every=1000)
+    sa = SAParallelTempering(func=func, x0=[1, 1], n_chains=4, T_max=1, T_min=1e-2, L=5, lb=[-1, -1], ub=[1, 1])
+    sa.run()
+    assert saved_values(path) == dict(cache.values)
+    assert cache.n_unsaved == 0